@@ -0,0 +1,286 @@
+"""
+Asyncio interface to an OPC server, so reads from several hosts, groups and integrity checks can overlap.
+
+OpenOPC's calls block, and its COM client must be used from the thread that created it. AsyncOPCScanner therefore runs
+every call on one of a fixed number of worker threads, each with its own OPCScanner connection, plus one more thread
+that only handles comms integrity - so integrity checks carry on alongside reads rather than queueing behind them. Every
+call has a timeout: a path or group that doesn't answer in time gets an error result, while everything else carries on.
+The call itself can't be interrupted, so its worker stays busy until the server answers. Until then, further reads of
+the same group (or paths) wait on that call rather than being handed to another worker - so one hung group ties up one
+worker, not all of them.
+
+    async with AsyncOPCScanner(conn_cfg) as opc:
+        async for result in opc.scan(groups_for(tag_index)):
+            ...
+"""
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+
+import metrics
+from opc_scanner import OPCScanner
+from retry_policy import NegativeCache, RetryPolicy
+
+INTEGRITY_GROUP = "integrity"
+
+ScanResult = namedtuple('ScanResult', 'host group datapoints')  # datapoints maps path -> DataPoint or error
+
+
+def groups_for(tag_index, rank_periods=None):
+    """Scan groups for scan(), one per distinct scan period of tag_index's paths, as used by scan_interlocks()"""
+    return {f"scan @{period}ms": (paths, period) for period, paths in tag_index.paths_by_period(rank_periods).items()}
+
+
+class AsyncOPCScanner:
+    """
+    Async reads from one OPC host through max_workers connections. Calls taking longer than timeout seconds (or the
+    timeout given to the call) return a "Timed out" error for the paths concerned. Retries within a call stop in time
+    for its timeout. client_factory(use_alt_host), if given, supplies each connection's OpenOPC-like client.
+    """
+
+    def __init__(self, conn_cfg, use_alt_host=False, client_factory=None, max_workers=4, timeout=5.0,
+                 metrics_registry=metrics.REGISTRY):
+        # Worker connections don't each open the history file - see ConnectionManager for that
+        self.conn_cfg = {key: value for key, value in conn_cfg.items() if not key.startswith("HISTORY_")}
+        self.use_alt_host = use_alt_host
+        self.opc_host = conn_cfg["OPC_HOST_ALT"] if use_alt_host else conn_cfg["OPC_HOST"]
+        self.client_factory = client_factory
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.metrics = metrics_registry
+        self.missing_paths = NegativeCache(ttl=OPCScanner.MISSING_PATH_TTL)  # Shared by every connection
+        self.scanners = []  # Every connection made
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        # A single-thread executor per connection, so each scanner can be closed on the thread that created it
+        self._executors = [ThreadPoolExecutor(1, thread_name_prefix=f"opc {self.opc_host} {n}")
+                           for n in range(max_workers)]
+        self._pending = [0] * max_workers  # Calls submitted to each executor and not yet finished
+        self._integrity_executor = ThreadPoolExecutor(1, thread_name_prefix=f"opc {self.opc_host} integrity")
+        self._integrity_scanner = None
+        self._in_flight = {}  # (kind, group or paths) -> concurrent.futures.Future of the call not yet finished
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    # ---- Connections, one per worker thread ----
+    def _scanner(self):
+        """This worker thread's scanner, connected - (re)connecting if it has never connected or its last read failed"""
+        if self._closed:
+            raise RuntimeError(f"Connections to {self.opc_host} are closed")
+        scanner = getattr(self._local, 'scanner', None)
+        if scanner is None:
+            client = self.client_factory(self.use_alt_host) if self.client_factory is not None else None
+            retry_policy = RetryPolicy(max_attempts=OPCScanner.MAX_RETRIES, cycle_budget=self.timeout)
+            scanner = OPCScanner(self.conn_cfg, self.use_alt_host, client=client, retry_policy=retry_policy,
+                                 metrics_registry=self.metrics)
+            scanner.missing_paths = self.missing_paths
+            self._local.scanner = scanner
+            with self._lock:
+                self.scanners.append(scanner)
+        if not scanner.connected or scanner.read_failures:
+            scanner.connect()
+        return scanner
+
+    @property
+    def integrity_paths(self):
+        return [self.conn_cfg["LANDMARK_PATH"], self.conn_cfg["HEARTBEAT_PATH"]]
+
+    @property
+    def integrity_scan_period(self):
+        return int(OPCScanner.HEARTBEAT_UPDATE_RATE * 1000 / 2)
+
+    # ---- Reads ----
+    @property
+    def idle_workers(self):
+        return self._pending.count(0)
+
+    def _submit(self, key, function, integrity=False):
+        """
+        Run function on the integrity thread, or else the least busy worker - unless the call last made for key (e.g.
+        ('group', name)) hasn't finished, in which case that call's future is returned instead.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            if integrity:
+                n = None
+                future = self._integrity_executor.submit(function)
+            else:
+                n = min(range(len(self._executors)), key=self._pending.__getitem__)
+                self._pending[n] += 1
+                future = self._executors[n].submit(function)
+            self._in_flight[key] = future
+        future.add_done_callback(functools.partial(self._finished, key, n))
+        return future
+
+    def _finished(self, key, n, future):
+        with self._lock:
+            if n is not None:
+                self._pending[n] -= 1
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    async def _call(self, key, timeout, function, integrity=False):
+        # Shielded, so timing out leaves the call in flight for the next read of key to wait on
+        future = asyncio.wrap_future(self._submit(key, function, integrity))
+        return await asyncio.wait_for(asyncio.shield(future), timeout if timeout is not None else self.timeout)
+
+    def _timed_out(self, paths, timeout, read):
+        timeout = timeout if timeout is not None else self.timeout
+        self.metrics.inc('opc_read_timeouts_total', host=self.opc_host, read=read)
+        return {path: f"Timed out after {timeout:g} s" for path in paths}
+
+    async def get_datapoint(self, path, timeout=None):
+        """DataPoint for path, or the error that prevented reading it"""
+        return (await self.get_datapoints([path], timeout))[path]
+
+    async def get_datapoints(self, paths, timeout=None):
+        """
+        Read paths split evenly between the idle workers, concurrently. A chunk that times out only affects its own
+        paths. Returns a dict of path -> DataPoint or error, like OPCScanner.get_datapoints().
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        size = -(-len(paths) // max(1, self.idle_workers))
+        chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+        results = {}
+        for result in await asyncio.gather(*(self._read_chunk(chunk, timeout) for chunk in chunks)):
+            results.update(result)
+        return {path: results[path] for path in paths}
+
+    async def _read_chunk(self, paths, timeout):
+        try:
+            return await self._call(('paths', tuple(paths)), timeout, lambda: self._scanner().get_datapoints(paths))
+        except asyncio.TimeoutError:
+            return self._timed_out(paths, timeout, 'properties_batch')
+        except Exception as e:  # e.g. could not connect
+            return {path: e for path in paths}
+
+    async def read_group(self, name, paths, update_rate=None, timeout=None):
+        """Read paths as the OPC group name, registering it on whichever connection reads it first"""
+        def read():
+            scanner = self._scanner()
+            if scanner.groups.get(name) != list(dict.fromkeys(paths)):
+                scanner.register_group(name, paths, update_rate)
+            return scanner.read_group(name)
+
+        try:
+            return await self._call(('group', name), timeout, read)
+        except asyncio.TimeoutError:
+            return self._timed_out(paths, timeout, name)
+        except Exception as e:
+            return {path: e for path in paths}
+
+    # ---- Comms integrity, on its own connection ----
+    def _integrity(self):
+        if self._integrity_scanner is None:
+            self._integrity_scanner = self._scanner()  # Called on the integrity thread, so it gets its own connection
+        return self._integrity_scanner
+
+    async def update_integrity_markers(self, datapoints=None, timeout=None):
+        """
+        Update the landmark and heartbeat from datapoints, or a fresh read of integrity_paths. Returns the datapoints
+        used. A read that times out counts as a failed read, leaving the heartbeat to go stale.
+        """
+        def update():
+            scanner = self._integrity()
+            results = datapoints if datapoints is not None else scanner.get_datapoints(scanner.integrity_paths)
+            scanner.update_integrity_markers(results)
+            return results
+
+        try:
+            return await self._call(('integrity', None), timeout, update, integrity=True)
+        except asyncio.TimeoutError:
+            return self._timed_out(self.integrity_paths, timeout, INTEGRITY_GROUP)
+        except Exception as e:
+            return {path: e for path in self.integrity_paths}
+
+    def get_comms_integrity(self):
+        """(ok, status text) as for OPCScanner, False until enough integrity updates have been made"""
+        if self._integrity_scanner is None:
+            return False, "| Integrity not yet established"
+        try:
+            return self._integrity_scanner.get_comms_integrity()
+        except Exception as e:  # Nothing collected yet
+            return False, f"| Integrity not yet established ({e!r})"
+
+    # ---- Cyclic scanning ----
+    async def scan(self, groups, timeout=None, max_pending=100):
+        """
+        Async iterator of ScanResults, reading each of groups ({name: (paths, period ms)}) on its own period, and the
+        integrity paths (as group INTEGRITY_GROUP, after updating the integrity markers). Groups are read concurrently,
+        so one slow group doesn't delay the others. Reading stops when the iterator is closed.
+        """
+        results = asyncio.Queue(max_pending)
+
+        async def scan_group(name, paths, period):
+            loop = asyncio.get_running_loop()
+            deadline = loop.time()
+            while True:
+                if name == INTEGRITY_GROUP:
+                    datapoints = await self.update_integrity_markers(timeout=timeout)
+                else:
+                    datapoints = await self.read_group(name, paths, period, timeout)
+                await results.put(ScanResult(self.opc_host, name, datapoints))
+                deadline += period / 1000
+                if deadline < loop.time():  # Overran - skip the missed deadlines rather than reading back-to-back
+                    deadline = loop.time()
+                await asyncio.sleep(deadline - loop.time())
+
+        all_groups = {**groups, INTEGRITY_GROUP: (self.integrity_paths, self.integrity_scan_period)}
+        tasks = [asyncio.create_task(scan_group(name, paths, period), name=f"scan {self.opc_host} {name}")
+                 for name, (paths, period) in all_groups.items()]
+        try:
+            while True:
+                yield await results.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self, wait=False):
+        """
+        Close every connection on its own thread, once any call running there returns (waiting for that if wait).
+        Calls still queued fail without reconnecting.
+        """
+        self._closed = True
+        for executor in [*self._executors, self._integrity_executor]:
+            try:
+                executor.submit(self._close_local)
+            except RuntimeError:  # Already closed
+                continue
+            executor.shutdown(wait=wait)
+
+    def _close_local(self):
+        scanner = getattr(self._local, 'scanner', None)
+        if scanner is not None:
+            scanner.close()
+
+
+async def merge_scans(*scans):
+    """Interleave several async iterators of ScanResults (e.g. one per host) into one, in order of arrival"""
+    results = asyncio.Queue()
+
+    async def forward(scan):
+        async for result in scan:
+            await results.put(result)
+
+    tasks = [asyncio.create_task(forward(scan)) for scan in scans]
+    try:
+        while True:
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for scan in scans:
+            await scan.aclose()
@@ -1,31 +1,32 @@
 import json
 import logging
 import sys
+import time
 import traceback
 
-import jsonizer
+from ilock_config import load_interlock
 from opc_scanner import OPCScanner
+from scan_capture import CaptureWriter
+from trip_capture import TripCapture, capture_trip
 
 
 def prove_connectivity(conn_cfg, use_alt_host=False, test_path=None):
-    """Use some known paths to validate that retrieval of values is functioning properly"""
+    """
+    Use some known paths to validate that retrieval of values is functioning properly. To find or check many paths for
+    interlock configurations, use a namespace index instead (see namespace_index.py).
+    """
     opc = OPCScanner(conn_cfg, use_alt_host)
     try:
         opc.connect()
 
         if test_path:  # For quick testing off OPC paths to add to interlock configurations
-            result = opc.get_datapoint(test_path)
-            logging.info(result)
-            logging.info(repr(result))
-
+            test_paths = [test_path]
         else:  # Default run mode just to prove connectivity
-            result_1 = opc.get_datapoint(conn_cfg["TEST_PATH_1"])
-            logging.info(result_1)
-            logging.info(repr(result_1))
+            test_paths = [conn_cfg["TEST_PATH_1"], conn_cfg["TEST_PATH_2"]]
 
-            result_2 = opc.get_datapoint(conn_cfg["TEST_PATH_2"])
-            logging.info(result_2)
-            logging.info(repr(result_2))
+        for result in opc.get_datapoints(test_paths).values():
+            logging.info(result)
+            logging.info(repr(result))
 
     except Exception as e:
         logging.exception("Exception encountered: " + str(e))
@@ -35,20 +36,25 @@ def prove_connectivity(conn_cfg, use_alt_host=False, test_path=None):
         opc.close()
 
 
-def store_sample_data(conn_cfg, tag_cfg_fname, out_fname):
+def store_sample_data(conn_cfg, tag_cfg_fname, out_fname, scans=1, period=1.0):
     """
-    Read OPC data and build DataPoint objects for tags in tag_cfg_file; store results as Python repr in out_file.
-    This is only used to collect "dummy" data to allow for easier development offline from production system.
+    Read OPC data for tags in tag_cfg_file every period seconds, for the given number of scans, appending the results
+    (along with the integrity paths) to the scan capture out_file.
+    This is only used to collect "dummy" data to allow for easier development offline from production system - replay
+    the capture by setting "REPLAY_CAPTURE" in the connection configuration.
     """
-    interlock = jsonizer.read_file(tag_cfg_fname)
-    datapoints = list()
+    interlock = load_interlock(tag_cfg_fname)
     opc = OPCScanner(conn_cfg)
     try:
         opc.connect()
-
-        for component in interlock.components:
-            for indication in component.indications:
-                datapoints.append(opc.get_datapoint(indication.path))
+        scan_paths = [indication.path for indication in interlock.all_indications()] + opc.integrity_paths
+        with CaptureWriter(out_fname) as writer:
+            for i in range(scans):
+                if i > 0:
+                    time.sleep(period)
+                results = opc.get_datapoints(scan_paths)
+                writer.write_scan(results)
+                logging.info(list(results.values()))
 
     except Exception as e:
         logging.exception("Exception encountered: " + str(e))
@@ -57,9 +63,25 @@ def store_sample_data(conn_cfg, tag_cfg_fname, out_fname):
     finally:
         opc.close()
 
-    logging.info(datapoints)
-    with open(out_fname, 'w') as f:
-        f.write(repr(datapoints))
+
+def record_trip(conn_cfg, tag_cfg_fname, report_fname, scan_period=250):
+    """Arm a trip capture for the interlock in tag_cfg_fname, and write its sequence of events report once it trips"""
+    capture = TripCapture(load_interlock(tag_cfg_fname))
+    opc = OPCScanner(conn_cfg)
+    try:
+        opc.connect()
+        logging.info(f"Trip capture armed for {capture.interlock.name}")
+        report = capture_trip(opc, capture, scan_period)
+        report.write(report_fname)
+        logging.info(f"Trip report written to {report_fname}")
+
+    except Exception as e:
+        logging.exception("Exception encountered: " + str(e))
+        traceback.print_exc()
+
+    finally:
+        capture.close()
+        opc.close()
 
 
 if __name__ == "__main__":
@@ -72,4 +94,5 @@ if __name__ == "__main__":
         sys.exit()
 
     prove_connectivity(cfg, use_alt_host=False)
-    # store_sample_data(cfg, 'HS_525069.json', 'samples.py')
+    # store_sample_data(cfg, 'HS_525069.json', 'samples.ilcap', scans=240, period=0.25)
+    # record_trip(cfg, 'HS_525069.json', 'HS_525069_trip.txt')
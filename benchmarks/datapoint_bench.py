@@ -0,0 +1,78 @@
+"""
+Microbenchmark of per-read CPU cost of creating a DataPoint and comparing its value, as done for every path on every
+scan. Compares the current DataPoint against the original eager implementation, and reports what share of one CPU core
+each would need at a sustained 10,000 reads/s.
+
+Run from the repository root:  python -m benchmarks.datapoint_bench
+"""
+from datetime import datetime, timedelta
+import json
+import sys
+import time
+
+from opc_scanner import DataPoint
+
+READS_PER_SEC = 10000
+
+
+class LegacyDataPoint:
+    """DataPoint as originally implemented: per-instance __dict__ and an eager strptime on every read"""
+
+    def __init__(self, name, canonical_datatype, value, quality, timestamp, conn_status_int, required_attempts):
+        self.name = name
+        self.canonical_datatype = canonical_datatype
+        self.value = value
+        self.quality = quality
+        self.timestamp = datetime.strptime(timestamp[:-6], "%Y-%m-%d %H:%M:%S") - timedelta(hours=6)
+        self.conn_status_int = conn_status_int
+        self.required_attempts = required_attempts
+
+
+def make_reads(count, tags=500):
+    """Raw read results for count reads cycling over a number of tags, with timestamps advancing once per scan"""
+    base = datetime(2021, 3, 4, 5, 6, 7)
+    reads = []
+    for i in range(count):
+        timestamp = (base + timedelta(seconds=i // tags)).strftime("%Y-%m-%d %H:%M:%S+00:00")
+        reads.append((f"TAG-{i % tags}/PV.CV", 'VT_R4', float(i % 7), 'Good', timestamp, 0, 1))
+    return reads
+
+
+def time_reads(cls, reads, access_timestamp=False):
+    """CPU seconds per read to build the DataPoint and do the value comparison made by the GUI"""
+    start = time.process_time()
+    matches = 0
+    for read in reads:
+        dp = cls(*read)
+        matches += dp.value == 1.0
+        if access_timestamp:
+            dp.timestamp
+    return (time.process_time() - start) / len(reads)
+
+
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(count=200000):
+    reads = make_reads(count)
+    results = {}
+    for label, cls, access_timestamp in [
+        ('legacy', LegacyDataPoint, False),
+        ('current', DataPoint, False),
+        ('current_with_timestamp', DataPoint, True),
+    ]:
+        per_read = time_reads(cls, reads, access_timestamp)
+        results[label] = {
+            'us_per_read': round(per_read * 1e6, 3),
+            'cpu_pct_at_10k_reads_per_s': round(per_read * READS_PER_SEC * 100, 2),
+            'bytes_per_instance': instance_size(cls(*reads[0])),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(), indent=2))
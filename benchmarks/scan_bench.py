@@ -0,0 +1,240 @@
+"""
+Scan-path benchmarks against a simulated OPC server, for catching performance regressions as interlocks grow.
+
+For each interlock size this measures:
+- scan cycle latency and tag throughput of sequential get_datapoint() calls, batched get_datapoints(), and group reads
+- the cost of update_integrity_markers() and get_comms_integrity()
+- GUI event throughput: staging a cycle's results through DeltaPublisher and applying the resulting batch
+- interlock state evaluation of a whole snapshot
+
+Results are written as JSON. Passing a previous results file as --baseline compares against it, exiting with status 1
+if any latency grew by more than --tolerance.
+
+Run from the repository root, e.g.:  python -m benchmarks.scan_bench --sizes 10 100 1000 5000 --output bench.json
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import statistics
+import sys
+import time
+
+from fake_opc import SimulatedOPCClient
+from frontend.delta_publisher import DeltaPublisher
+from interlock import Component, Indication, Interlock
+from interlock_eval import CompiledInterlocks
+from opc_scanner import OPCScanner
+from retry_policy import RetryPolicy
+
+CONN_CFG = {
+    "OPC_HOST": "simulated",
+    "LANDMARK_PATH": "BENCH/LANDMARK.CV",
+    "EXPECTED_LANDMARK_VAL": 1,
+    "HEARTBEAT_PATH": "BENCH/HEARTBEAT.CV",
+}
+
+
+def latency_stats(samples):
+    """Summarise a list of durations (seconds) in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'mean_ms': round(statistics.mean(ordered) * 1000, 4),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 4),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+    }
+
+
+def make_scanner(args, paths):
+    client = SimulatedOPCClient(call_latency=args.latency, item_latency=args.item_latency, jitter=args.jitter,
+                                bad_quality_rate=args.bad_rate, seed=args.seed)
+    client.populate(paths, missing_rate=args.missing_rate)
+    client.set_value(CONN_CFG["LANDMARK_PATH"], 1)
+    client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+    opc = OPCScanner(CONN_CFG, client=client, retry_policy=RetryPolicy(max_attempts=args.max_attempts))
+    opc.connect()
+    return opc
+
+
+def bench_scan_method(args, size, method):
+    paths = [f"BENCH/TAG-{n}/PV.CV" for n in range(size)]
+    opc = make_scanner(args, paths)
+    if method == 'read_group':
+        opc.register_group('bench', paths)
+        scan = lambda: opc.read_group('bench')
+    elif method == 'get_datapoints':
+        scan = lambda: opc.get_datapoints(paths)
+    else:
+        scan = lambda: [opc.get_datapoint(path) for path in paths]
+
+    opc.client.calls.clear()
+    durations = []
+    for i in range(args.cycles):
+        start = time.perf_counter()
+        scan()
+        durations.append(time.perf_counter() - start)
+    result = latency_stats(durations)
+    result['tags_per_s'] = round(size / statistics.mean(durations), 1)
+    result['server_calls_per_cycle'] = round(sum(opc.client.calls.values()) / args.cycles, 2)
+    return result
+
+
+def bench_integrity(args, size):
+    """Integrity checks don't depend on interlock size, but are run alongside each size for a like-for-like record"""
+    client = SimulatedOPCClient(call_latency=0, item_latency=0, jitter=0, seed=args.seed)
+    client.set_value(CONN_CFG["LANDMARK_PATH"], 1)
+    opc = OPCScanner(CONN_CFG, client=client)
+    opc.connect()
+    update_durations, check_durations = [], []
+    for i in range(max(args.cycles, 10)):
+        client.set_value(CONN_CFG["HEARTBEAT_PATH"], i, timestamp=client.timestamp_str(datetime.now(timezone.utc)))
+        start = time.perf_counter()
+        opc.update_integrity_markers()
+        update_durations.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        opc.get_comms_integrity()
+        check_durations.append(time.perf_counter() - start)
+    return {
+        'update_integrity_markers': latency_stats(update_durations),
+        'get_comms_integrity': latency_stats(check_durations),
+    }
+
+
+def bench_gui_events(args, size):
+    """Stage every indication once per cycle with change_rate of them changed, then apply each batch to stand-in rows"""
+    client = SimulatedOPCClient(call_latency=0, item_latency=0, jitter=0, seed=args.seed)
+    indications = [Indication(0, f"BENCH/TAG-{n}/PV.CV", '', 'initiator', False, True) for n in range(size)]
+    client.populate([indication.path for indication in indications])
+    opc = OPCScanner(CONN_CFG, client=client)
+    opc.connect()
+
+    rows = {indication: None for indication in indications}
+    batches = []
+    publisher = DeltaPublisher(lambda key, batch: batches.append(batch))
+    changed_per_cycle = max(1, int(size * args.change_rate))
+    scans = []
+    for cycle in range(args.cycles):
+        for n in range(changed_per_cycle):
+            path = indications[(cycle * changed_per_cycle + n) % size].path
+            client.set_value(path, not client.tags[path]['value'])
+        scans.append(opc.get_datapoints([indication.path for indication in indications]))
+
+    start = time.perf_counter()
+    for datapoints in scans:
+        for indication in indications:
+            publisher.stage(indication, datapoints[indication.path])
+        publisher.flush()
+        while batches:
+            for indication, dp in batches.pop():
+                rows[indication] = dp.value
+    elapsed = time.perf_counter() - start
+    return {
+        'cycle_ms': round(elapsed / args.cycles * 1000, 4),
+        'datapoints_per_s': round(size * args.cycles / elapsed, 1),
+        'events_per_cycle': publisher.events_sent / args.cycles,
+        'updates_per_cycle': changed_per_cycle,
+    }
+
+
+def bench_evaluation(args, size):
+    """Score snapshots of size indications spread over interlocks of 50 indications, 5 per component"""
+    interlocks = []
+    for i in range(max(1, size // 50)):
+        components = [
+            Component(f"C-{i}-{c}", [
+                Indication(n % 2, f"BENCH/TAG-{i}-{c}-{n}/PV.CV", '', 'initiator' if c < 5 else 'final_element', 0, 1)
+                for n in range(5)
+            ]) for c in range(min(10, max(1, size // 5)))
+        ]
+        interlocks.append(Interlock(f"IL-{i}", components, ''))
+    compiled = CompiledInterlocks(interlocks)
+    client = SimulatedOPCClient(call_latency=0, item_latency=0, jitter=0, seed=args.seed)
+    client.populate(compiled.paths, value=0)
+    opc = OPCScanner(CONN_CFG, client=client)
+    opc.connect()
+    snapshot = opc.get_datapoints(compiled.paths)
+
+    durations = []
+    for i in range(max(args.cycles, 10)):
+        start = time.perf_counter()
+        compiled.evaluate(snapshot)
+        durations.append(time.perf_counter() - start)
+    result = latency_stats(durations)
+    result['indications'] = len(compiled)
+    result['interlocks'] = len(interlocks)
+    return result
+
+
+def run(args):
+    results = {'parameters': vars(args).copy(), 'sizes': {}}
+    results['parameters'].pop('baseline')
+    results['parameters'].pop('output')
+    for size in args.sizes:
+        size_results = {}
+        for method in ('get_datapoint', 'get_datapoints', 'read_group'):
+            if method == 'get_datapoint' and size > args.max_sequential:
+                continue  # Too slow to be worth timing at this size
+            size_results[method] = bench_scan_method(args, size, method)
+        size_results['integrity'] = bench_integrity(args, size)
+        size_results['gui_events'] = bench_gui_events(args, size)
+        size_results['evaluation'] = bench_evaluation(args, size)
+        results['sizes'][str(size)] = size_results
+        print(f"Completed size {size}", file=sys.stderr)
+    return results
+
+
+def find_regressions(results, baseline, tolerance, noise_floor_ms=0.05):
+    """
+    List descriptions of every latency (any '*_ms' figure) exceeding its baseline by more than tolerance, ignoring
+    increases smaller than noise_floor_ms which are within timer noise.
+    """
+    regressions = []
+
+    def compare(current, previous, trail):
+        for key, value in current.items():
+            if key not in previous:
+                continue
+            if isinstance(value, dict):
+                compare(value, previous[key], trail + [key])
+            elif key.endswith('_ms') and value > previous[key] * (1 + tolerance) + noise_floor_ms:
+                regressions.append(f"{'/'.join(trail + [key])}: {previous[key]} -> {value}")
+
+    compare(results['sizes'], baseline.get('sizes', {}), [])
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.002, help="Seconds per server call")
+    parser.add_argument('--item-latency', type=float, default=0.00005, help="Additional seconds per item per call")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Latency variation, as a fraction")
+    parser.add_argument('--bad-rate', type=float, default=0.0, help="Probability of an item read having Bad quality")
+    parser.add_argument('--missing-rate', type=float, default=0.0, help="Fraction of paths not existing on the server")
+    parser.add_argument('--change-rate', type=float, default=0.1, help="Fraction of values changing every cycle")
+    parser.add_argument('--max-attempts', type=int, default=OPCScanner.MAX_RETRIES)
+    parser.add_argument('--max-sequential', type=int, default=1000,
+                        help="Largest size for which sequential get_datapoint() calls are timed")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="File to write JSON results to (default stdout)")
+    parser.add_argument('--baseline', help="Previous JSON results to check for regressions against")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,276 @@
+"""
+Hot-standby connections to the primary (OPC_HOST) and alternate (OPC_HOST_ALT) OPC servers.
+
+ConnectionManager stands in for a single OPCScanner. It keeps one scanner connected to each host, with every group
+registered on both, and directs reads to the active one. When the active host fails a read outright, or fails its comms
+integrity check while the standby passes, reads switch to the standby within the same call, so the scan schedule carries
+on. Hosts that are down are reconnected by a background thread, and once the primary is back it becomes active again.
+"""
+import logging
+import threading
+import time
+
+from opc_scanner import OPCScanner
+from retry_policy import RetryPolicy
+
+
+class ConnectionManager:
+    """
+    client_factory(use_alt_host), if given, supplies the OpenOPC-like client for each host's scanner (e.g. for tests).
+    A host is failed over from after max_read_failures consecutive failed group reads. Down hosts are retried every
+    reconnect_interval seconds, and with failback the primary is made active again as soon as it reconnects.
+
+    Failover and outage durations (seconds) are kept in failover_times and outage_times: failover time runs from
+    detecting a failure to the first good read from the other host, outage time from detecting a failure to the first
+    good read from any host.
+
+    A host that is down is only used by the reconnect thread until it reconnects, so its client is never called from two
+    threads at once; reads meanwhile return an error for each path. The standby's comms integrity is checked at most
+    every standby_check_interval seconds, by default as often as the heartbeat can be sampled without aliasing.
+    """
+
+    def __init__(self, conn_cfg, client_factory=None, retry_policy=None, max_read_failures=1, reconnect_interval=10.0,
+                 failback=True, clock=time.monotonic, standby_check_interval=OPCScanner.HEARTBEAT_UPDATE_RATE / 2):
+        if retry_policy is None:  # Shared by both scanners, so cycle budgets apply whichever host is active
+            retry_policy = RetryPolicy(max_attempts=OPCScanner.MAX_RETRIES)
+        self.retry_policy = retry_policy
+        self.max_read_failures = max_read_failures
+        self.reconnect_interval = reconnect_interval
+        self.failback = failback
+        self.clock = clock
+        self.standby_check_interval = standby_check_interval
+        self._standby_checked = None  # clock() at the last standby integrity check
+
+        self.scanners = [self._make_scanner(conn_cfg, False, client_factory)]
+        if conn_cfg.get("OPC_HOST_ALT"):
+            # The standby shares the primary's history, rather than opening the same history file twice
+            standby_cfg = {key: value for key, value in conn_cfg.items() if not key.startswith("HISTORY_")}
+            standby = self._make_scanner(standby_cfg, True, client_factory)
+            standby.history = self.primary.history
+            self.scanners.append(standby)
+        self.active = self.primary
+
+        self.down = set()  # Scanners not currently connected, awaiting reconnection
+        self.failovers = 0
+        self.failover_times = []
+        self.outage_times = []
+        self._failover_started = None  # clock() at which a failover began, until the new host reads successfully
+        self._outage_started = None  # clock() at which an outage began, until any host reads successfully
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._reconnector = None
+
+    def _make_scanner(self, conn_cfg, use_alt_host, client_factory):
+        client = client_factory(use_alt_host) if client_factory is not None else None
+        return OPCScanner(conn_cfg, use_alt_host, client=client, retry_policy=self.retry_policy)
+
+    @property
+    def primary(self):
+        return self.scanners[0]
+
+    @property
+    def standby(self):
+        """The connected scanner that is not active, or None"""
+        for scanner in self.scanners:
+            if scanner is not self.active and scanner not in self.down:
+                return scanner
+        return None
+
+    @property
+    def connected(self):
+        return self.active not in self.down
+
+    # Properties shared by both hosts' scanners, for drop-in use in place of an OPCScanner
+    @property
+    def integrity_paths(self):
+        return self.primary.integrity_paths
+
+    @property
+    def integrity_scan_period(self):
+        return self.primary.integrity_scan_period
+
+    @property
+    def history(self):
+        return self.primary.history
+
+    def connect(self):
+        """
+        Connect to every host. Raises OPCError only if no host could be connected; either way, hosts that are down are
+        retried in the background from here on.
+        """
+        error = None
+        for scanner in self.scanners:
+            try:
+                scanner.connect()
+            except Exception as e:
+                error = e
+                self.down.add(scanner)
+        with self._lock:
+            if self.active in self.down and self.standby is not None:
+                self.active = self.standby
+        if self.down:
+            self._start_reconnector()
+        if len(self.down) == len(self.scanners):
+            self._outage_started = self.clock()
+            raise error
+
+    def close(self):
+        self._stop.set()
+        if self._reconnector is not None:
+            self._reconnector.join(timeout=self.reconnect_interval)
+        for scanner in self.scanners:
+            scanner.close()
+
+    # ---- Reads, directed to the active host ----
+    def register_group(self, name, paths, update_rate=None):
+        for scanner in self.scanners:
+            scanner.register_group(name, paths, update_rate)
+
+    def unregister_group(self, name):
+        for scanner in self.scanners:
+            scanner.unregister_group(name)
+
+    def subscribe_group(self, name, callback):
+        for scanner in self.scanners:
+            scanner.subscribe_group(name, callback)
+
+    def _down_results(self, scanner, paths):
+        return {path: f"{scanner.opc_host} is down - reconnecting" for path in dict.fromkeys(paths)}
+
+    def read_group(self, name):
+        scanner = self.active
+        if scanner in self.down:  # No host available - the reconnect thread has sole use of it until it is back
+            return self._down_results(scanner, scanner.groups[name])
+        results = scanner.read_group(name)
+        if scanner.read_failures < self.max_read_failures:
+            self._read_succeeded()
+            return results
+        if self.failover(f"read of group {name} failed: {next(iter(results.values()), '')}"):
+            return self.read_group(name)  # Same cycle, from the new host
+        return results
+
+    def get_datapoint(self, path):
+        scanner = self.active
+        if scanner in self.down:
+            return self._down_results(scanner, [path])[path]
+        return scanner.get_datapoint(path)
+
+    def get_datapoints(self, paths):
+        scanner = self.active
+        if scanner in self.down:
+            return self._down_results(scanner, paths)
+        return scanner.get_datapoints(paths)
+
+    # ---- Comms integrity ----
+    @staticmethod
+    def _integrity(scanner):
+        try:
+            return scanner.get_comms_integrity()
+        except Exception as e:  # Nothing collected yet
+            return False, f"| Integrity not yet established ({e!r})"
+
+    def update_integrity_markers(self, datapoints=None):
+        """
+        Update integrity markers of the active host from datapoints (or a fresh read), and of the standby with its own
+        read so it is known to be healthy before it is needed. Fails over if the active host's integrity is bad while
+        the standby's is good.
+        """
+        active = self.active
+        if active in self.down:
+            return
+        active.update_integrity_markers(datapoints)
+        standby = self.standby
+        if standby is None:
+            return
+        now = self.clock()
+        if self._standby_checked is None or now - self._standby_checked >= self.standby_check_interval:
+            self._standby_checked = now
+            standby.update_integrity_markers(self._standby_integrity_read(standby))
+        active_ok, active_text = self._integrity(active)
+        if not active_ok and active.heartbeats and self._integrity(standby)[0]:
+            self.failover(f"comms integrity failed {active_text}", mark_down=False)
+
+    @staticmethod
+    def _standby_integrity_read(scanner):
+        """Integrity datapoints from a group of the standby's holding them (as scan_interlocks registers), if any"""
+        for name, paths in scanner.groups.items():
+            if set(scanner.integrity_paths) <= set(paths):
+                return scanner.read_group(name)
+        return None  # update_integrity_markers() reads them itself
+
+    def get_comms_integrity(self):
+        return self._integrity(self.active)
+
+    # ---- Failover ----
+    def failover(self, reason, mark_down=True):
+        """
+        Make the standby active, returning whether one was available. With mark_down, the failed host is reconnected in
+        the background before being used again; otherwise (e.g. for bad integrity) it stays connected as the standby.
+        """
+        now = self.clock()
+        with self._lock:
+            failed = self.active
+            if self._outage_started is None:
+                self._outage_started = now
+            if mark_down:
+                failed.mark_disconnected()  # Before the reconnect thread takes it over, so groups are left to connect()
+                self.down.add(failed)
+                self._start_reconnector()
+            standby = self.standby
+            if standby is None:
+                logging.error(f"Connection to {failed.opc_host} lost ({reason}), and no standby host is available")
+                return False
+            self.active = standby
+            self.failovers += 1
+            self._failover_started = now
+        logging.warning(f"Failing over from {failed.opc_host} to {standby.opc_host}: {reason}")
+        return True
+
+    def _read_succeeded(self):
+        if self._failover_started is None and self._outage_started is None:
+            return
+        now = self.clock()
+        if self._failover_started is not None:
+            self.failover_times.append(now - self._failover_started)
+            self._failover_started = None
+        if self._outage_started is not None:
+            self.outage_times.append(now - self._outage_started)
+            logging.info(f"Reading from {self.active.opc_host} again after {self.outage_times[-1]:.3f} s outage")
+            self._outage_started = None
+
+    def _start_reconnector(self):
+        if self._reconnector is None or not self._reconnector.is_alive():
+            self._stop.clear()
+            self._reconnector = threading.Thread(target=self._reconnect_loop, name="opc-reconnect", daemon=True)
+            self._reconnector.start()
+
+    def _reconnect_loop(self):
+        while self.down and not self._stop.wait(self.reconnect_interval):
+            self.reconnect()
+
+    def reconnect(self):
+        """Try once to reconnect every host that is down, making the primary active again if failback is enabled"""
+        for scanner in list(self.down):
+            try:
+                scanner.connect()
+            except Exception as e:
+                logging.debug(f"Reconnect to {scanner.opc_host} failed: {e}")
+                continue
+            with self._lock:
+                self.down.discard(scanner)
+                if self.active in self.down or self.failback and scanner is self.primary:
+                    if scanner is not self.active:
+                        logging.info(f"Switching to {scanner.opc_host} after reconnecting")
+                    self.active = scanner
+
+    def stats(self):
+        """Snapshot of connection state and failover measurements, for display or export"""
+        now = self.clock()
+        return {
+            'active_host': self.active.opc_host,
+            'hosts_down': sorted(scanner.opc_host for scanner in self.down),
+            'failovers': self.failovers,
+            'failover_times': list(self.failover_times),
+            'outage_times': list(self.outage_times),
+            'current_outage': now - self._outage_started if self._outage_started is not None else None,
+        }
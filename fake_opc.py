@@ -0,0 +1,244 @@
+"""
+Stand-in for OpenOPC.client, allowing OPCScanner (and everything built on it) to be exercised on machines without access
+to a DeltaV OPC server - e.g. for tests on Linux. Only the subset of the OpenOPC client API used by this project is
+implemented, and results are shaped the same way the real client shapes them.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+import random
+import time
+
+import OpenOPC
+
+
+class FakeOPCClient:
+    """
+    In-memory OPC "server" plus client. Tag values are set with set_value(); paths that were never set behave like
+    paths that do not exist on a DeltaV server. Every call into the client API is counted in self.calls so that tests can
+    assert how many server round trips an operation needed.
+    """
+    PROPERTY_NAMES = [
+        'Item ID (virtual property)',
+        'Item Canonical DataType',
+        'Item Value',
+        'Item Quality',
+        'Item Timestamp',
+        'Item Access Rights',
+        'Server Scan Rate',
+        'Item EU Type',
+        'Item EU Info',
+        'Connection Status',
+    ]
+    DOES_NOT_EXIST = "properties: The item ID is not defined in the server address space (OLE error 0xc0040007)"
+
+    def __init__(self, opc_class=None, client_name=None, supports_callbacks=True):
+        self.client_name = client_name
+        self.supports_callbacks = supports_callbacks
+        self.tags = {}  # path -> dict of value, quality, timestamp, datatype, conn_status
+        self.connected = False
+        self.refuse_connections = False  # Set True to make connect() fail, as with an unreachable host
+        self.opc_host = None
+        self.calls = Counter()
+        self._groups = {}  # name -> list of paths
+        self._group_callbacks = {}  # name -> callback
+
+    # ---- Server-side controls, used by tests/simulations ----
+    def set_value(self, path, value, quality='Good', timestamp=None, datatype=None, conn_status=0):
+        """Create or update a tag, notifying any subscribed groups containing it"""
+        self.tags[path] = {
+            'value': value,
+            'quality': quality,
+            'timestamp': timestamp or self.timestamp_str(datetime.now(timezone.utc)),
+            'datatype': datatype or self._datatype_for(value),
+            'conn_status': conn_status,
+        }
+        if self.connected:
+            for name, callback in self._group_callbacks.items():
+                if path in self._groups.get(name, []):
+                    tag = self.tags[path]
+                    callback(path, tag['value'], tag['quality'], tag['timestamp'])
+
+    def remove_tag(self, path):
+        self.tags.pop(path, None)
+
+    def drop_connection(self):
+        """Simulate the server going away - server-side groups are lost, and calls fail until connect() is called"""
+        self.connected = False
+        self._groups.clear()
+        self._group_callbacks.clear()
+
+    @staticmethod
+    def timestamp_str(dt):
+        """Format a timestamp the same way OpenOPC does (str() of a pywintypes time, i.e. with UTC offset)"""
+        return dt.strftime("%Y-%m-%d %H:%M:%S+00:00")
+
+    @staticmethod
+    def _datatype_for(value):
+        return {bool: 'VT_BOOL', int: 'VT_I4', float: 'VT_R4', str: 'VT_BSTR'}.get(type(value), 'VT_VARIANT')
+
+    def _lookup(self, path):
+        """Tag as it should be served for one item read, or None if the path doesn't exist"""
+        return self.tags.get(path)
+
+    def _check_connected(self, method):
+        self.calls[method] += 1
+        if not self.connected:
+            raise OpenOPC.OPCError(f"{method}: Not connected to OPC server")
+
+    # ---- OpenOPC.client API ----
+    def connect(self, opc_server=None, opc_host='localhost'):
+        self.calls['connect'] += 1
+        if self.refuse_connections:
+            raise OpenOPC.OPCError(f"Connect: Unable to connect to {opc_server} on {opc_host}")
+        self.opc_host = opc_host
+        self.connected = True
+        self._groups.clear()  # Like OpenOPC, any groups from a previous connection are forgotten on (re)connect
+        self._group_callbacks.clear()
+
+    def close(self, del_object=True):
+        self.calls['close'] += 1
+        self.connected = False
+        self._groups.clear()
+        self._group_callbacks.clear()
+
+    def info(self):
+        self._check_connected('info')
+        return [('Protocol', 'Fake'), ('Host', self.opc_host), ('Tags', len(self.tags))]
+
+    def properties(self, tags, id=None):
+        self._check_connected('properties')
+        single = isinstance(tags, str)
+        results = []
+        for path in ([tags] if single else tags):
+            tag = self._lookup(path)
+            if tag is None:
+                raise OpenOPC.OPCError(self.DOES_NOT_EXIST)
+            values = [
+                path, tag['datatype'], tag['value'], tag['quality'], tag['timestamp'], 'Read', 1000.0, 0, None,
+                tag['conn_status'],
+            ]
+            for prop_id, (desc, value) in enumerate(zip(self.PROPERTY_NAMES, values)):
+                results.append((prop_id, desc, value) if single else (path, prop_id, desc, value))
+        return results
+
+    def read(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False,
+             include_error=False, rebuild=False):
+        self._check_connected('read')
+        single = isinstance(tags, str)
+        if group is not None:
+            if tags is None or (group in self._groups and not rebuild):
+                # Like OpenOPC, an existing group keeps the items it was created with unless rebuilt
+                if group not in self._groups:
+                    raise OpenOPC.OPCError(f"read: Group {group} does not exist")
+                tags = self._groups[group]
+                single = False
+            else:
+                self._groups[group] = [tags] if single else list(tags)
+
+        results = []
+        for path in ([tags] if single else tags):
+            tag = self._lookup(path)
+            if tag is not None:
+                row = (tag['value'], tag['quality'], tag['timestamp'], 'The operation completed successfully')
+            else:
+                row = (None, 'Error', None, 'The item ID is not defined in the server address space')
+            row = row if include_error else row[:3]
+            results.append(row if single else (path, *row))
+        return results[0] if single else results
+
+    def list(self, paths='*', recursive=False, flat=False, include_type=False):
+        """
+        Browse one level of the namespace, as a DeltaV server presents it: item IDs split into branches at each '/' and
+        '.', e.g. XV-101 > CLOSED > XV-101/CLOSED.CV. Children of the branch path given ('*' for the root) are returned
+        as names, or as full item IDs at the lowest level. Only non-recursive, non-flat browsing is supported.
+        """
+        self._check_connected('list')
+        parts = [p for p in paths.replace('.', '/').split('/') if p and p != '*']
+        depth = len(parts)
+        branches, leaves = {}, []
+        for path in self.tags:
+            segments = path.replace('.', '/').split('/')
+            if [s.upper() for s in segments[:depth]] != [p.upper() for p in parts]:
+                continue
+            if len(segments) > depth + 1:
+                branches[segments[depth]] = True
+            elif len(segments) == depth + 1:
+                leaves.append(path)
+        nodes, node_type = (list(branches), 'Branch') if branches else (sorted(leaves), 'Leaf')
+        return [(node, node_type) for node in nodes] if include_type else nodes
+
+    def groups(self):
+        self._check_connected('groups')
+        return self._groups.keys()
+
+    def remove(self, groups):
+        self._check_connected('remove')
+        for name in ([groups] if isinstance(groups, str) else groups):
+            self._groups.pop(name, None)
+            self._group_callbacks.pop(name, None)
+
+    def subscribe(self, group, callback):
+        """
+        Not part of OpenOPC - lets OPCScanner receive change notifications for a group. callback(path, value, quality,
+        timestamp) is called whenever a tag in the group changes via set_value().
+        """
+        if not self.supports_callbacks:
+            raise NotImplementedError("Change callbacks disabled for this client")
+        self._check_connected('subscribe')
+        if group not in self._groups:
+            raise OpenOPC.OPCError(f"subscribe: Group {group} does not exist")
+        self._group_callbacks[group] = callback
+
+
+class SimulatedOPCClient(FakeOPCClient):
+    """
+    FakeOPCClient with the performance characteristics of a real server: every call takes call_latency seconds plus
+    item_latency seconds per item requested, varied by up to +/- jitter (a fraction), and each item read comes back
+    with Bad quality with probability bad_quality_rate. Use populate() to create tags, a fraction of which can be left
+    missing from the server.
+    """
+
+    def __init__(self, call_latency=0.002, item_latency=0.00005, jitter=0.2, bad_quality_rate=0.0, seed=None,
+                 sleep=time.sleep, **kwargs):
+        super().__init__(**kwargs)
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.jitter = jitter
+        self.bad_quality_rate = bad_quality_rate
+        self.random = random.Random(seed)
+        self.sleep = sleep
+
+    def populate(self, paths, missing_rate=0.0, value=False):
+        """Create tags for paths, except for a random fraction (missing_rate) which are left not existing"""
+        missing = set()
+        for path in paths:
+            if self.random.random() < missing_rate:
+                missing.add(path)
+                self.remove_tag(path)
+            else:
+                self.set_value(path, value)
+        return missing
+
+    def _delay(self, item_count):
+        latency = self.call_latency + self.item_latency * item_count
+        if latency > 0:
+            self.sleep(latency * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def _lookup(self, path):
+        tag = super()._lookup(path)
+        if tag is not None and self.bad_quality_rate and self.random.random() < self.bad_quality_rate:
+            tag = dict(tag, quality='Bad')
+        return tag
+
+    def properties(self, tags, id=None):
+        self._delay(1 if isinstance(tags, str) else len(tags))
+        return super().properties(tags, id)
+
+    def read(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False,
+             include_error=False, rebuild=False):
+        if tags is None:
+            item_count = len(self._groups.get(group, []))
+        else:
+            item_count = 1 if isinstance(tags, str) else len(tags)
+        self._delay(item_count)
+        return super().read(tags, group, size, pause, source, update, timeout, sync, include_error, rebuild)
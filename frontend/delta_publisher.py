@@ -0,0 +1,81 @@
+"""Delta stage between the scanner and the GUI, so that the GUI only hears about DataPoints that actually changed"""
+import time
+
+from opc_scanner import DataPoint
+
+
+def dp_signature(dp):
+    """The parts of a scan result which, if changed, warrant a redraw. dp may be a DataPoint or an error."""
+    if isinstance(dp, DataPoint):
+        return dp.value, dp.quality, dp.conn_status_int
+    return None, str(dp), None
+
+
+class Batch(list):
+    """List of (indication, dp) pairs, stamped with the publisher's clock when sent so that GUI lag can be measured"""
+
+    def __init__(self, items, sent_at):
+        super().__init__(items)
+        self.sent_at = sent_at
+
+
+class DeltaPublisher:
+    """
+    Collects scan results via stage() and sends only those differing from what was last sent for the same indication
+    (by value, quality and conn_status) when flush() is called at the end of each scan cycle. All changes from a cycle
+    go out as a single '-DPS-' event holding a list of (indication, dp) pairs, so the GUI can apply them in one pass.
+
+    If max_redraws_per_sec is set, flushes arriving too soon after the previous one are held back and merged into the
+    next flush, keeping only the latest result for each indication.
+    """
+    EVENT_KEY = '-DPS-'
+
+    def __init__(self, window_writer, max_redraws_per_sec=None, clock=time.monotonic):
+        self.window_writer = window_writer  # Will always be write_event_value method belonging to a Window instance
+        self.min_interval = 1 / max_redraws_per_sec if max_redraws_per_sec else 0
+        self.clock = clock
+        self.last_sent = {}  # indication -> signature of last result sent
+        self.pending = {}  # indication -> latest changed result not yet sent
+        self.last_flush = None
+        self.events_sent = 0
+        self.results_suppressed = 0  # Results dropped as unchanged (or changed back before being sent)
+        self.results_coalesced = 0  # Changed results replaced by a newer one before being sent
+
+    def stage(self, indication, dp):
+        if dp_signature(dp) == self.last_sent.get(indication, ()):
+            if self.pending.pop(indication, None) is None:
+                self.results_suppressed += 1
+            else:
+                self.results_coalesced += 1
+            return
+        if indication in self.pending:
+            self.results_coalesced += 1
+        self.pending[indication] = dp
+
+    def flush(self, force=False):
+        """Send all pending changes as one event, unless rate limited. Returns the number of changes sent."""
+        if not self.pending:
+            return 0
+        now = self.clock()
+        if not force and self.last_flush is not None and now - self.last_flush < self.min_interval:
+            return 0
+
+        batch = Batch(self.pending.items(), now)
+        self.pending = {}
+        for indication, dp in batch:
+            self.last_sent[indication] = dp_signature(dp)
+        self.last_flush = now
+        self.events_sent += 1
+        self.window_writer(self.EVENT_KEY, batch)
+        return len(batch)
+
+    def collect_metrics(self, registry):
+        """Metrics collector (see metrics.MetricsRegistry.add_collector) exporting this publisher's counts"""
+        registry.set('gui_events_sent_total', self.events_sent)
+        registry.set('gui_results_suppressed_total', self.results_suppressed)
+        registry.set('gui_results_coalesced_total', self.results_coalesced)
+
+    def forget(self, indication):
+        """Drop state for an indication, so its next result is always sent"""
+        self.last_sent.pop(indication, None)
+        self.pending.pop(indication, None)
@@ -1,36 +1,78 @@
 import json
 import logging
+import queue
 import sys
 import threading
 import time
 
 import PySimpleGUI as sg
 
-import jsonizer
-from opc_scanner import OPCScanner
+import ilock_config
+from interlock_eval import CompiledInterlocks
+import metrics
+from connection_manager import ConnectionManager
+from scanner_service import ScannerSubscriber, scan_interlocks
+from sharded_scan import SHARD_KEYS, ShardedScanner
+from tag_index import TagIndex
+from frontend.delta_publisher import DeltaPublisher
 from frontend.indication_row import IndicationRow
+from frontend.paged_view import PagedIndicationView
 from frontend.styling import MAIN_WIDTH, style_args
-from frontend.gui_logger import gui_log_formatter, GuiHandler
+from frontend.gui_logger import gui_log_formatter, GuiHandler, trim_scrollback
 
+PAGED_VIEW_THRESHOLD = 100  # Indications beyond which the paged view is used, unless configured otherwise
 
-def scan_opc(run_freq, window, conn_cfg, logger, interlock):
-    opc = OPCScanner(conn_cfg)
+
+def scan_opc(run_freq, window, conn_cfg, logger, interlocks, reloads=None):
+    tag_index = TagIndex(interlocks)
+    publisher = DeltaPublisher(window.write_event_value, conn_cfg.get("MAX_REDRAWS_PER_SEC"))
+
+    metrics.REGISTRY.add_collector(publisher.collect_metrics)
+
+    def stage(datapoints):
+        for interlock, indication, dp in tag_index.fan_out(datapoints):
+            publisher.stage(indication, dp)
+
+    if any(conn_cfg.get(key) for key in SHARD_KEYS):  # Worker process per shard, merged here
+        scanner = ShardedScanner(conn_cfg, interlocks, run_freq)
+        logger.info(f"Scanning with {len(scanner.shards)} shard processes")
+        scanner.run(stage, publisher.flush)
+        return
+
+    # Reads go to whichever of OPC_HOST/OPC_HOST_ALT is healthy, and lost hosts are reconnected in the background - so
+    # scanning continues (reporting errors until a host comes back) even if no host can be reached right now.
+    opc = ConnectionManager(conn_cfg)
     try:
         opc.connect()
     except Exception as e:
         logger.exception("Exception encountered: " + str(e))
-        return  # Exit thread, this one cannot be useful
 
-    while True:
-        time.sleep(run_freq/1000)
-        for comp in interlock.components:
-            for indication in comp.indications:
-                dp = opc.get_datapoint(indication.path)
-                window.write_event_value('-DP-', {'indication': indication, 'dp': dp})
+    def on_reload(old, new):
+        for indication in old.all_indications() if old is not None else ():
+            publisher.forget(indication)
+
+    scan_interlocks(opc, tag_index, run_freq, conn_cfg, stage, publisher.flush, reloads=reloads, on_reload=on_reload)
+
+
+def subscribe_scanner(window, conn_cfg, logger, interlocks):
+    """Receive scan results from a shared scanner service rather than scanning the OPC server directly"""
+    tag_index = TagIndex(interlocks)
+    publisher = DeltaPublisher(window.write_event_value, conn_cfg.get("MAX_REDRAWS_PER_SEC"))
+    metrics.REGISTRY.add_collector(publisher.collect_metrics)
+
+    def on_update(datapoints, full):
+        for interlock, indication, dp in tag_index.fan_out(datapoints):
+            publisher.stage(indication, dp)
+        publisher.flush(force=full)
+
+    subscriber = ScannerSubscriber(conn_cfg["SCANNER_SERVICE"], on_update, paths=tag_index.paths)
+    logger.info(f"Subscribing to scanner service at {conn_cfg['SCANNER_SERVICE']}")
+    subscriber.start()
+    return subscriber
 
 
 class Gui:
-    def __init__(self, conn_cfg_path, interlock_cfg_path):
+    def __init__(self, conn_cfg_path, *interlock_cfg_paths):
         error_status = ''
         try:
             with open(conn_cfg_path, 'r') as fp:
@@ -38,10 +80,14 @@ class Gui:
         except Exception as e:
             error_status += f"\nError loading connection configuration:\n{e}\n"
 
-        try:
-            self.interlock = jsonizer.read_file(interlock_cfg_path)
-        except Exception as e:
-            error_status += f"\nError loading interlock configuration:\n{e}\n"
+        self.interlocks = []
+        self.config_files = {}  # Interlock config path -> Interlock, for reloading
+        for interlock_cfg_path in interlock_cfg_paths:
+            try:
+                self.interlocks.append(ilock_config.load_interlock(interlock_cfg_path))
+                self.config_files[interlock_cfg_path] = self.interlocks[-1]
+            except Exception as e:
+                error_status += f"\nError loading interlock configuration {interlock_cfg_path}:\n{e}\n"
 
         if error_status != '':
             # Program cannot continue without valid configuration. Create a pop-up explaining, and exit after.
@@ -49,30 +95,36 @@ class Gui:
             sys.exit()
 
         self.indication_rows = {}
+        self.status_elements = {}  # Interlock -> Text showing its evaluated state, beside its name
+        self.evaluator = CompiledInterlocks(self.interlocks)
+        self.snapshot = {}  # path -> latest DataPoint or error, for evaluating interlock states
+        self.component_rows = {}  # (interlock name, component name) -> elements of the component's heading row
+        self.reloads = queue.Queue()  # (old, new) interlocks for the scan thread, once the window shows them
+        self.reload_count = 0
+        self.view = None  # PagedIndicationView, used instead of indication_rows for large interlocks
         self.layout = self.build_layout()
         self.window = sg.Window('Interlock Visualizer', self.layout, finalize=True)
+        if self.view is not None:
+            self.view.render()
         self.logger = self.configure_logger()
 
     def configure_logger(self):
         logger = logging.getLogger()
         logger.setLevel(logging.INFO)
-        gui_handler = GuiHandler(logging.INFO, self.window.write_event_value)
-        gui_handler.setFormatter(gui_log_formatter)
-        logger.addHandler(gui_handler)
+        self.gui_handler = GuiHandler(logging.INFO, self.window.write_event_value)
+        self.gui_handler.setFormatter(gui_log_formatter)
+        logger.addHandler(self.gui_handler)
         return logger
 
     def build_layout(self):
-        ilock_rows = list()
-        ilock_rows.append([sg.Text(text=self.interlock.name, key='ilock_name', **style_args(self.interlock, 'name')), ])
-        for comp in self.interlock.components:
-            ilock_rows.append([
-                sg.Text(text=comp.name, key=comp.name, **style_args(comp, 'name')),
-                sg.Text(text=f"({comp.desc})", key=comp.desc, **style_args(comp, 'desc'))
-            ])
-            for indication in comp.indications:
-                ind_row = IndicationRow(indication)
-                self.indication_rows[indication] = ind_row  # For easy access later during update cycle
-                ilock_rows.append(ind_row)
+        indication_count = sum(len(interlock.all_indications()) for interlock in self.interlocks)
+        if indication_count > self.conn_cfg.get("PAGED_VIEW_THRESHOLD", PAGED_VIEW_THRESHOLD):
+            # Too many to lay out individually - show a page at a time, reusing the same elements
+            self.view = PagedIndicationView(self.interlocks, page_size=self.conn_cfg.get("PAGE_SIZE", 30),
+                                            collapsed=self.conn_cfg.get("COLLAPSE_COMPONENTS", False))
+            ilock_rows = self.view.layout()
+        else:
+            ilock_rows = [[sg.Column(self.build_indication_rows(), key='-ROWS-', pad=(0, 0))]]
 
         return [
             *ilock_rows,
@@ -80,26 +132,134 @@ class Gui:
             [sg.Button('Exit')],
         ]
 
+    def build_indication_rows(self):
+        ilock_rows = list()
+        for interlock in self.interlocks:
+            # Keys are prefixed by interlock name, as interlocks may share components and paths
+            prefix = f"{interlock.name}."
+            self.status_elements[interlock] = sg.Text(text='', key=f"{prefix}ilock_state", size=(MAIN_WIDTH // 3, 1))
+            ilock_rows.append([
+                sg.Text(text=interlock.name, key=f"{prefix}ilock_name", **style_args(interlock, 'name')),
+                self.status_elements[interlock],
+            ])
+            ilock_rows += self.build_component_rows(interlock, interlock.components, prefix)
+        return ilock_rows
+
+    def build_component_rows(self, interlock, components, prefix, indications=None):
+        """Heading and indication rows for components of interlock - only those of indications, if given"""
+        rows = list()
+        for comp in components:
+            rows.append([
+                sg.Text(text=comp.name, key=f"{prefix}{comp.name}", **style_args(comp, 'name')),
+                sg.Text(text=f"({comp.desc})", key=f"{prefix}{comp.name}.desc", **style_args(comp, 'desc'))
+            ])
+            self.component_rows[(interlock.name, comp.name)] = rows[-1]
+            for indication in comp.indications:
+                if indications is not None and indication not in indications:
+                    continue
+                ind_row = IndicationRow(indication, key_prefix=prefix)
+                self.indication_rows[indication] = ind_row  # For easy access later during update cycle
+                rows.append(ind_row)
+        return rows
+
+    def show_states(self):
+        """Evaluate every interlock against the latest results, showing each one's state beside its name"""
+        for status in self.evaluator.evaluate(self.snapshot).interlocks:
+            if self.view is not None:
+                self.view.set_state(status.interlock, status.state)
+            elif status.interlock in self.status_elements:
+                self.status_elements[status.interlock].update(status.state)
+
+    def watch_configs(self):
+        """Reload interlock configs when their files change, if scanning here (a scanner service has its own configs)"""
+        if not self.conn_cfg.get("WATCH_CONFIG", True) or self.conn_cfg.get("SCANNER_SERVICE") \
+                or any(self.conn_cfg.get(key) for key in SHARD_KEYS):
+            return None
+        def on_change(fname, old, new, diff):  # Called from the watcher's thread - the GUI thread applies it
+            self.window.write_event_value('-RELOAD-', (old, new, diff))
+
+        watcher = ilock_config.ConfigWatcher(self.config_files, on_change,
+                                             interval=self.conn_cfg.get("WATCH_CONFIG_INTERVAL", 2.0))
+        watcher.start()
+        return watcher
+
+    def apply_reload(self, old, new, diff):
+        """Show new in place of old, then hand it to the scan thread - which only rescans what the diff touched"""
+        self.interlocks = [new if interlock is old else interlock for interlock in self.interlocks]
+        self.evaluator = CompiledInterlocks(self.interlocks)
+        if old in self.status_elements:
+            self.status_elements[new] = self.status_elements.pop(old)
+        if self.view is not None:
+            self.view.replace_interlock(old, new)
+        else:
+            for previous, indication in diff.kept + diff.changed:
+                row = self.indication_rows.pop(previous)
+                row.indication = indication
+                self.indication_rows[indication] = row
+            for previous, indication in diff.changed:  # Expectations changed - show as unscanned until read again
+                self.indication_rows[indication].pre_val_status.update("*******")
+                self.indication_rows[indication].post_val_status.update("*******")
+            for indication in diff.removed:
+                for element in self.indication_rows.pop(indication):
+                    element.update(visible=False)
+            new_names = {comp.name for comp in new.components}
+            for comp in old.components:
+                heading = self.component_rows.pop((old.name, comp.name), ())
+                if comp.name in new_names:
+                    self.component_rows[(new.name, comp.name)] = heading
+                else:
+                    for element in heading:
+                        element.update(visible=False)
+            if diff.added:
+                # Added rows go at the end, with keys made unique to this reload
+                self.reload_count += 1
+                added = set(diff.added)
+                components = [comp for comp in new.components if added.intersection(comp.indications)]
+                rows = [[sg.Text(text=f"{new.name} (reloaded)", **style_args(new, 'name'))]]
+                rows += self.build_component_rows(new, components, f"{new.name}.reload{self.reload_count}.", added)
+                self.window.extend_layout(self.window['-ROWS-'], rows)
+        self.reloads.put((old, new))
+
     def run(self):
-        threading.Thread(
-            target=scan_opc,
-            args=(250, self.window, self.conn_cfg, self.logger, self.interlock),
-            daemon=True
-        ).start()
+        if self.conn_cfg.get("SCANNER_SERVICE"):  # One shared scan serves every viewer
+            subscribe_scanner(self.window, self.conn_cfg, self.logger, self.interlocks)
+        else:
+            threading.Thread(
+                target=scan_opc,
+                args=(250, self.window, self.conn_cfg, self.logger, self.interlocks, self.reloads),
+                daemon=True
+            ).start()
+        watcher = self.watch_configs()
         sg.cprint_set_output_destination(self.window, '-ML-')
 
         while True:
             event, values = self.window.read()
             if event in (sg.WIN_CLOSED, 'Exit'):
                 break
-            elif event == '-LOG-':
+            elif event == '-LOG-':  # Batch of log lines, already rate limited by GuiHandler
                 sg.cprint(values[event])
-            elif event == '-DP-':  # DataPoint collected - update relevant GUI elements
-                try:
-                    self.indication_rows[values[event]['indication']].update(values[event]['dp'], self.logger)
-                except IndexError as e:
-                    self.logger.exception(e)
+                trim_scrollback(self.window['-ML-'])
+            elif event == DeltaPublisher.EVENT_KEY:  # Changed DataPoints from a scan cycle - update relevant elements
+                metrics.REGISTRY.observe('gui_event_lag_seconds', time.monotonic() - values[event].sent_at)
+                for indication, dp in values[event]:
+                    self.snapshot[indication.path] = dp
+                    try:
+                        if self.view is not None:
+                            self.view.update(indication, dp)
+                        elif indication in self.indication_rows:  # Not a result for an indication since reloaded
+                            self.indication_rows[indication].update(dp, self.logger)
+                    except (KeyError, AttributeError) as e:
+                        self.logger.exception(e)
+                self.show_states()
+            elif event == '-RELOAD-':  # An interlock config file changed
+                self.apply_reload(*values[event])
+            elif self.view is not None and self.view.handle(event, values):  # Paging, filtering or collapsing
+                pass
             else:
                 self.logger.warning(f"Unknown event type: {event} - {values[event]}")
 
+        if watcher is not None:
+            watcher.stop()
+        self.logger.removeHandler(self.gui_handler)  # Stop log events being written to the window once it is closed
+        self.gui_handler.close()
         self.window.close()
@@ -1,17 +1,98 @@
 import logging
+import queue
+import threading
+import time
 
 gui_log_formatter = logging.Formatter("%(levelname)s: %(message)s")
+MAX_SCROLLBACK_LINES = 1000  # Lines kept in the GUI's log Multiline
 
 
 class GuiHandler(logging.Handler):
     """
-    Custom handler to allow for overriding emit() with function call to PySimpleGui's preferred method of passing data
-    between threads (window.write_event_value).
+    Custom handler passing log records to the GUI via PySimpleGui's preferred method of passing data between threads
+    (window.write_event_value).
+
+    emit() only puts the record on a bounded queue, so logging never blocks the thread doing it - records arriving
+    while the queue is full are dropped and counted instead. A background thread formats queued records every
+    flush_interval seconds and sends them as a single '-LOG-' event. A message repeated within coalesce_window seconds
+    of its first appearance is only shown once, followed by a count of the repeats when the window closes.
     """
 
-    def __init__(self, level=logging.NOTSET, window_writer=None):
+    def __init__(self, level=logging.NOTSET, window_writer=None, max_queue=1000, flush_interval=0.25,
+                 coalesce_window=10.0, clock=time.monotonic, start=True):
         self.window_writer = window_writer  # Will always be write_event_value method belonging to a Window instance
         super().__init__(level)
+        self.queue = queue.Queue(max_queue)
+        self.flush_interval = flush_interval
+        self.coalesce_window = coalesce_window
+        self.clock = clock
+        self.dropped = 0  # Records dropped since the last drain() as the queue was full
+        self._repeats = {}  # Formatted message -> [time first shown, repeats since]
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self.start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="gui log formatter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.drain()
 
     def emit(self, record):
-        self.window_writer('-LOG-', f"{self.format(record)}")
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Called with the handler lock held, see drain()
+
+    def drain(self):
+        """Format everything queued and send it to the window as one event. Returns the number of lines sent."""
+        now = self.clock()
+        lines = []
+        for message, (first_shown, repeats) in list(self._repeats.items()):
+            if now - first_shown >= self.coalesce_window:
+                del self._repeats[message]
+                if repeats:
+                    lines.append(f"{message} (x{repeats} in last {self.coalesce_window:g}s)")
+
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                message = self.format(record)
+            except Exception:
+                self.handleError(record)
+                continue
+            repeat = self._repeats.get(message)
+            if repeat is None:
+                self._repeats[message] = [now, 0]
+                lines.append(message)
+            else:
+                repeat[1] += 1
+
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines.append(f"WARNING: {dropped} log records dropped - logging faster than the display can keep up")
+        if lines:
+            self.window_writer('-LOG-', '\n'.join(lines))
+        return len(lines)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.drain()
+        super().close()
+
+
+def trim_scrollback(multiline, max_lines=MAX_SCROLLBACK_LINES):
+    """Delete the oldest lines of a PySimpleGUI Multiline element beyond max_lines"""
+    widget = multiline.Widget
+    lines = int(widget.index('end-1c').split('.')[0])
+    if lines > max_lines:
+        widget.delete('1.0', f"{lines - max_lines + 1}.0")
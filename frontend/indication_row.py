@@ -5,11 +5,12 @@ import PySimpleGUI as sg
 
 
 class IndicationRow(list):
-    def __init__(self, indication: Indication):
+    def __init__(self, indication: Indication, key_prefix=''):
         self.indication = indication
-        self.name = sg.Text(text=indication.path, key=f"{indication.path}_name")
-        self.pre_val_status = sg.Text(text="*******", key=f"{indication.path}_pre_val_status")
-        self.post_val_status = sg.Text(text="*******", key=f"{indication.path}_post_val_status")
+        key = f"{key_prefix}{indication.path}"
+        self.name = sg.Text(text=indication.path, key=f"{key}_name")
+        self.pre_val_status = sg.Text(text="*******", key=f"{key}_pre_val_status")
+        self.post_val_status = sg.Text(text="*******", key=f"{key}_post_val_status")
         super().__init__([self.name, self.pre_val_status, self.post_val_status])
 
     def update(self, dp: DataPoint, logger):
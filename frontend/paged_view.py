@@ -0,0 +1,238 @@
+"""
+Paged view of indications, for interlocks too large to lay out a row of elements per indication up front.
+
+A fixed number of row "slots" is created once, and reused as the user pages through, filters by path/component name or
+role, or collapses components into their summary rows. Scan results for every indication are kept in IndicationPager,
+but only results for rows on the current page touch an element - so window creation and each update cost the same
+however many indications there are.
+"""
+import PySimpleGUI as sg
+
+from opc_scanner import DataPoint
+from frontend.styling import MAIN_WIDTH, style_args
+
+INTERLOCK, COMPONENT, INDICATION = 'interlock', 'component', 'indication'
+ALL_ROLES = 'all roles'
+UNSCANNED = "*******"
+
+
+class IndicationPager:
+    """
+    Rows to show for a set of interlocks: each interlock's name, then for each component a summary row followed by its
+    indications (unless collapsed). Rows are (kind, interlock, component, indication), with None for parts not
+    applicable to the kind. Holds no PySimpleGUI elements, so the view's logic can be used and tested without a window.
+    """
+
+    def __init__(self, interlocks, page_size=40, collapsed=False):
+        self.interlocks = interlocks
+        self.page_size = page_size
+        self.page = 0
+        self.text_filter = ''
+        self.role_filter = ALL_ROLES
+        self.collapsed = {comp for interlock in interlocks for comp in interlock.components} if collapsed else set()
+        self.values = {}  # Indication -> latest DataPoint or error
+        self.states = {}  # Interlock -> state from interlock_eval, e.g. 'tripped'
+        self.component_of = {indication: comp for interlock in interlocks for comp in interlock.components
+                             for indication in comp.indications}
+        self.rows = []
+        self.refilter()
+
+    def refilter(self):
+        """Rebuild rows after a filter or collapse change, staying on the same page where possible"""
+        text = self.text_filter.upper()
+        rows = []
+        for interlock in self.interlocks:
+            interlock_rows = []
+            for comp in interlock.components:
+                matching = [indication for indication in comp.indications if self._matches(text, comp, indication)]
+                if not matching:
+                    continue
+                interlock_rows.append((COMPONENT, interlock, comp, None))
+                if comp not in self.collapsed:
+                    interlock_rows += [(INDICATION, interlock, comp, indication) for indication in matching]
+            if interlock_rows:
+                rows += [(INTERLOCK, interlock, None, None)] + interlock_rows
+        self.rows = rows
+        self.page = min(self.page, self.pages - 1)
+
+    def _matches(self, text, comp, indication):
+        if text and text not in indication.path.upper() and text not in comp.name.upper():
+            return False
+        return self.role_filter == ALL_ROLES or indication.role in (self.role_filter, 'both')
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.rows) // self.page_size))
+
+    def visible(self):
+        start = self.page * self.page_size
+        return self.rows[start:start + self.page_size]
+
+    def set_filter(self, text=None, role=None):
+        if text is not None:
+            self.text_filter = text
+        if role is not None:
+            self.role_filter = role
+        self.page = 0
+        self.refilter()
+
+    def toggle(self, comp):
+        self.collapsed.symmetric_difference_update({comp})
+        self.refilter()
+
+    def turn(self, pages):
+        self.page = max(0, min(self.pages - 1, self.page + pages))
+
+    def update(self, indication, dp):
+        if indication in self.component_of:  # Not a result for an indication since reloaded
+            self.values[indication] = dp
+
+    def replace_interlock(self, old, new):
+        """
+        Show new in place of old (e.g. after its config file was reloaded). Results and collapsed state carry over to
+        indications and components of the same name; indications of new not in old show as unscanned.
+        """
+        self.interlocks = [new if interlock is old else interlock for interlock in self.interlocks]
+        self.states.pop(old, None)
+        old_values = {(self.component_of[indication].name, indication.path): self.values.pop(indication)
+                      for indication in old.all_indications() if indication in self.values}
+        collapsed = {comp.name for comp in old.components if comp in self.collapsed}
+        self.collapsed.difference_update(old.components)
+        for indication in old.all_indications():
+            self.component_of.pop(indication, None)
+        for comp in new.components:
+            if comp.name in collapsed:
+                self.collapsed.add(comp)
+            for indication in comp.indications:
+                self.component_of[indication] = comp
+                if (comp.name, indication.path) in old_values:
+                    self.values[indication] = old_values[(comp.name, indication.path)]
+        self.refilter()
+
+    def summary(self, comp):
+        """Counts of comp's indications at their expected pre and post values, out of those with a good result"""
+        results = [(indication, self.values.get(indication)) for indication in comp.indications]
+        good = [(indication, dp) for indication, dp in results if isinstance(dp, DataPoint)]
+        at_pre = sum(indication.expected_val_pre == dp.value for indication, dp in good)
+        at_post = sum(indication.expected_val_post == dp.value for indication, dp in good)
+        return at_pre, at_post, len(good), len(comp.indications)
+
+    def row_text(self, row):
+        """(name, pre, post) texts for a row"""
+        kind, interlock, comp, indication = row
+        if kind == INTERLOCK:
+            return interlock.name, self.states.get(interlock, ''), ''
+        if kind == COMPONENT:
+            at_pre, at_post, good, total = self.summary(comp)
+            marker = '+' if comp in self.collapsed else '-'
+            desc = f" ({comp.desc})" if comp.desc else ''
+            unread = f", {total - good} unread" if good < total else ''
+            return f"{marker} {comp.name}{desc}", f"pre {at_pre}/{total}", f"post {at_post}/{total}{unread}"
+        dp = self.values.get(indication)
+        if dp is None:
+            return f"    {indication.path}", UNSCANNED, UNSCANNED
+        if not isinstance(dp, DataPoint):
+            return f"    {indication.path}", str(dp), ''
+        return (f"    {indication.path}", f"{indication.expected_val_pre == dp.value}",
+                f"{indication.expected_val_post == dp.value}")
+
+
+class PagedIndicationView:
+    """
+    PySimpleGUI elements for an IndicationPager: filter controls, page_size row slots and paging buttons. Put layout()
+    in the window, call render() once it is finalized, then pass events to handle() and scan results to update().
+    """
+    KEY = '-VIEW-'
+
+    def __init__(self, interlocks, page_size=40, collapsed=False):
+        self.pager = IndicationPager(interlocks, page_size, collapsed)
+        self.slots = [
+            (sg.Text('', key=f"{self.KEY}{i}.name", size=(MAIN_WIDTH, 1), enable_events=True),
+             sg.Text('', key=f"{self.KEY}{i}.pre", size=(MAIN_WIDTH // 3, 1)),
+             sg.Text('', key=f"{self.KEY}{i}.post", size=(MAIN_WIDTH // 3, 1)))
+            for i in range(page_size)
+        ]
+        self.shown = [None] * page_size  # (row, texts, font) each slot currently displays
+        self._slot_of = {}  # Indication, Component or Interlock -> slot index showing it
+        self.page_label = sg.Text('', key=f"{self.KEY}page", size=(16, 1))
+
+    def layout(self):
+        return [
+            [sg.Input('', key=f"{self.KEY}filter", size=(MAIN_WIDTH // 2, 1), enable_events=True),
+             sg.Combo([ALL_ROLES, 'initiator', 'final_element'], default_value=ALL_ROLES, key=f"{self.KEY}role",
+                      readonly=True, enable_events=True)],
+            *[list(slot) for slot in self.slots],
+            [sg.Button('<', key=f"{self.KEY}prev"), self.page_label, sg.Button('>', key=f"{self.KEY}next")],
+        ]
+
+    def _font(self, row):
+        kind, interlock, comp, _ = row
+        if kind == INTERLOCK:
+            return style_args(interlock, 'name').get('font')
+        if kind == COMPONENT:
+            return style_args(comp, 'name').get('font')
+        return None
+
+    def _draw(self, i, row):
+        """Show row in slot i, updating only the elements whose text (or font) changed"""
+        texts = self.pager.row_text(row) if row is not None else ('', '', '')
+        font = self._font(row) if row is not None else None
+        previous = self.shown[i]
+        for element, text, old in zip(self.slots[i], texts, previous[1] if previous else (None,) * 3):
+            if text != old:
+                element.update(text)
+        if previous is None or previous[2] != font:
+            self.slots[i][0].update(font=font or sg.DEFAULT_FONT)
+        self.shown[i] = (row, texts, font)
+
+    def render(self):
+        """Rebind every slot to the rows of the current page"""
+        rows = self.pager.visible()
+        self._slot_of = {}
+        for i in range(len(self.slots)):
+            row = rows[i] if i < len(rows) else None
+            if row is not None:
+                self._slot_of[row[3] or row[2] or row[1]] = i
+            self._draw(i, row)
+        self.page_label.update(f"page {self.pager.page + 1} of {self.pager.pages}")
+
+    def update(self, indication, dp):
+        self.pager.update(indication, dp)
+        for item in (indication, self.pager.component_of.get(indication)):
+            i = self._slot_of.get(item)
+            if i is not None:
+                self._draw(i, self.shown[i][0])
+
+    def set_state(self, interlock, state):
+        """Show an interlock's evaluated state (see interlock_eval.InterlockStatus.state) beside its name"""
+        if self.pager.states.get(interlock) == state:
+            return
+        self.pager.states[interlock] = state
+        i = self._slot_of.get(interlock)
+        if i is not None:
+            self._draw(i, self.shown[i][0])
+
+    def replace_interlock(self, old, new):
+        self.pager.replace_interlock(old, new)
+        self.render()
+
+    def handle(self, event, values):
+        """Act on an event for the view, returning False if it was for something else"""
+        if not isinstance(event, str) or not event.startswith(self.KEY):
+            return False
+        action = event[len(self.KEY):]
+        if action == 'filter':
+            self.pager.set_filter(text=values[event])
+        elif action == 'role':
+            self.pager.set_filter(role=values[event])
+        elif action in ('prev', 'next'):
+            self.pager.turn(-1 if action == 'prev' else 1)
+        elif action.endswith('.name'):  # Clicking a component's summary row collapses or expands it
+            row = self.shown[int(action.split('.')[0])][0]
+            if row is None or row[0] != COMPONENT:
+                return True
+            self.pager.toggle(row[2])
+        else:
+            return True
+        self.render()
+        return True
@@ -1,6 +1,8 @@
+import sys
+
 from frontend.gui import Gui
 
 
 if __name__ == "__main__":
-    gui = Gui('cfg.json', 'dev_ilock.json')
+    gui = Gui('cfg.json', *(sys.argv[1:] or ['dev_ilock.json']))  # Any number of interlock configurations may be given
     gui.run()
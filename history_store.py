@@ -0,0 +1,267 @@
+"""
+Bounded history of scan results for each path, for trend displays and for reviewing when indications changed.
+
+Each path is given a fixed-size ring of samples when first recorded, so memory use is fixed per path however long the
+scanner runs. A sample holds time, value, quality and connection status, stored column by column in one flat buffer -
+either anonymous memory, or a memory-mapped file so that history survives a restart.
+
+File layout: a header, a table of max_paths entries (samples ever written, then the path) and then one region per path
+entry holding capacity samples of each column. Samples are only recorded when something about the path changes, and
+times never go backwards within a path, so the samples of a ring are always in time order and can be binary searched.
+"""
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from scan_capture import NONE, BOOL, INT, FLOAT, STR, ERROR
+
+MAGIC = b'ILHIST\x00\x01'
+HEADER = struct.Struct('<8sII')  # Magic, capacity, max_paths
+PATH_ENTRY = struct.Struct('<QH118s')  # Samples ever written, path length, path (UTF-8)
+QUALITIES = ('Good', 'Bad', 'Uncertain', 'Error')
+
+# (name, array typecode) of each column of a path's region, 8 byte columns first to keep every column aligned
+COLUMNS = [
+    ('time', 'd'),  # Server time (seconds since epoch) of the change, or record time for errors
+    ('value', 'd'),  # Numeric value, or a CRC of a string value - see HistoryStore._strings
+    ('conn_status', 'i'),
+    ('value_type', 'B'),  # scan_capture value type code
+    ('quality', 'B'),  # Index into QUALITIES
+]
+
+Sample = namedtuple('Sample', ['time', 'value', 'quality', 'conn_status'])
+
+
+def _padded(size):
+    return (size + 7) & ~7
+
+
+class _RingTimes:
+    """Sequence view of one path's sample times, oldest first, for bisect"""
+
+    def __init__(self, times, start, count, capacity):
+        self.times, self.start, self.count, self.capacity = times, start, count, capacity
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.times[(self.start + i) % self.capacity]
+
+
+class HistoryStore:
+    """
+    Ring buffer of the last capacity samples for each of up to max_paths paths. With fname, history is kept in (and
+    reloaded from) that file; an existing file keeps the capacity and max_paths it was created with.
+    """
+
+    def __init__(self, capacity=3600, max_paths=1024, fname=None):
+        self.fname = fname
+        self._file = None
+        if fname and os.path.exists(fname) and os.path.getsize(fname) >= HEADER.size:
+            with open(fname, 'rb') as f:
+                magic, capacity, max_paths = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{fname} is not a history file")
+        self.capacity = capacity
+        self.max_paths = max_paths
+        self._region_size = sum(_padded(capacity * struct.calcsize(typecode)) for _, typecode in COLUMNS)
+        self._data_offset = _padded(HEADER.size + max_paths * PATH_ENTRY.size)
+        size = self._data_offset + max_paths * self._region_size
+
+        if fname:
+            exists = os.path.exists(fname)
+            self._file = open(fname, 'r+b' if exists else 'w+b')
+            if os.path.getsize(fname) < size:
+                self._file.truncate(size)
+            self._buffer = mmap.mmap(self._file.fileno(), size)
+        else:
+            self._buffer = mmap.mmap(-1, size)
+        HEADER.pack_into(self._buffer, 0, MAGIC, capacity, max_paths)
+        self._view = memoryview(self._buffer)
+
+        self._slots = {}  # path -> path table index
+        self._columns = []  # Per path table index: dict of column name -> memoryview
+        self._written = []  # Per path table index: samples ever written
+        self._refused = set()  # Paths not recorded because the path table is full
+        self._strings = {}  # CRC -> string value, for strings recorded since opening; older ones only show as changes
+        for slot in range(max_paths):
+            written, length, encoded = PATH_ENTRY.unpack_from(self._buffer, HEADER.size + slot * PATH_ENTRY.size)
+            if not length:
+                break
+            self._add_slot(encoded[:length].decode('utf-8'), written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _add_slot(self, path, written=0):
+        slot = len(self._columns)
+        offset = self._data_offset + slot * self._region_size
+        columns = {}
+        for name, typecode in COLUMNS:
+            size = self.capacity * struct.calcsize(typecode)
+            columns[name] = self._view[offset:offset + size].cast(typecode)
+            offset += _padded(size)
+        self._slots[path] = slot
+        self._columns.append(columns)
+        self._written.append(written)
+        return slot
+
+    def _slot_for(self, path):
+        slot = self._slots.get(path)
+        if slot is not None:
+            return slot
+        encoded = path.encode('utf-8')
+        if len(self._columns) >= self.max_paths or len(encoded) > 118:
+            if path not in self._refused:
+                self._refused.add(path)
+                logging.warning(f"History not recorded for {path} - path table full or path too long")
+            return None
+        PATH_ENTRY.pack_into(self._buffer, HEADER.size + len(self._columns) * PATH_ENTRY.size, 0, len(encoded), encoded)
+        return self._add_slot(path)
+
+    @property
+    def paths(self):
+        return list(self._slots)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def record(self, path, dp, record_time=None):
+        """
+        Record a DataPoint or error for path, unless it is unchanged from the latest sample. Returns whether a sample was
+        written. record_time (default now) is used as the time of errors, which carry no server timestamp.
+        """
+        if hasattr(dp, 'utc_timestamp'):  # Anything else is an error
+            value = dp.value
+            if isinstance(value, bool):
+                value_type, numeric = BOOL, float(value)
+            elif isinstance(value, int):
+                value_type, numeric = INT, float(value)
+            elif isinstance(value, float):
+                value_type, numeric = FLOAT, value
+            elif value is None:
+                value_type, numeric = NONE, 0.0
+            else:
+                value = str(value)
+                value_type, numeric = STR, float(zlib.crc32(value.encode('utf-8')))
+                self._strings.setdefault(numeric, value)
+            quality = QUALITIES.index(dp.quality) if dp.quality in QUALITIES else 1
+            sample_time, conn_status = dp.utc_timestamp, dp.conn_status_int
+        else:
+            value_type, numeric, quality, conn_status = ERROR, 0.0, 3, 0
+            sample_time = time.time() if record_time is None else record_time
+
+        slot = self._slot_for(path)
+        if slot is None:
+            return False
+        columns, written = self._columns[slot], self._written[slot]
+        if written:
+            last = (written - 1) % self.capacity
+            if (columns['value'][last] == numeric and columns['value_type'][last] == value_type
+                    and columns['quality'][last] == quality and columns['conn_status'][last] == conn_status):
+                return False
+            sample_time = max(sample_time, columns['time'][last])  # Keep each ring in time order for bisect
+
+        index = written % self.capacity
+        columns['time'][index] = sample_time
+        columns['value'][index] = numeric
+        columns['value_type'][index] = value_type
+        columns['quality'][index] = quality
+        columns['conn_status'][index] = conn_status
+        self._written[slot] = written + 1
+        struct.pack_into('<Q', self._buffer, HEADER.size + slot * PATH_ENTRY.size, written + 1)
+        return True
+
+    def record_scan(self, datapoints, record_time=None):
+        """Record a mapping of path to DataPoint or error, as returned by OPCScanner.get_datapoints()/read_group()"""
+        if record_time is None:
+            record_time = time.time()
+        for path, dp in datapoints.items():
+            self.record(path, dp, record_time)
+
+    def _sample(self, columns, index):
+        value_type, value = columns['value_type'][index], columns['value'][index]
+        if value_type == BOOL:
+            value = bool(value)
+        elif value_type == INT:
+            value = int(value)
+        elif value_type == STR:
+            value = self._strings.get(value)
+        elif value_type != FLOAT:
+            value = None
+        return Sample(columns['time'][index], value, QUALITIES[columns['quality'][index]],
+                      columns['conn_status'][index])
+
+    def _window(self, path, start, end):
+        """(columns, ring indices of samples in the window oldest first, ring index of the sample before it or None)"""
+        slot = self._slots.get(path)
+        if slot is None:
+            return None, [], None
+        columns, written = self._columns[slot], self._written[slot]
+        count = min(written, self.capacity)
+        first = written - count
+        times = _RingTimes(columns['time'], first % self.capacity, count, self.capacity)
+        lo = 0 if start is None else bisect_left(times, start)
+        hi = count if end is None else bisect_right(times, end)
+        before = (first + lo - 1) % self.capacity if lo > 0 else None
+        return columns, [(first + i) % self.capacity for i in range(lo, hi)], before
+
+    def query(self, path, start=None, end=None):
+        """Samples for path with start <= time <= end (seconds since epoch; None for unbounded), oldest first"""
+        columns, indices, _ = self._window(path, start, end)
+        return [self._sample(columns, index) for index in indices]
+
+    def latest(self, path):
+        slot = self._slots.get(path)
+        if slot is None or not self._written[slot]:
+            return None
+        return self._sample(self._columns[slot], (self._written[slot] - 1) % self.capacity)
+
+    def changes(self, path, start=None, end=None):
+        """
+        Samples in the window at which the value changed, compared with the last good sample before it, leaving out
+        samples where only quality or connection status changed. The first good sample ever recorded counts as a change.
+        """
+        columns, indices, before = self._window(path, start, end)
+        previous = None
+        if before is not None:
+            for index in reversed(self._window(path, None, start)[1]):  # Nearest good sample before the window
+                if QUALITIES[columns['quality'][index]] == 'Good' and columns['time'][index] < start:
+                    previous = (columns['value_type'][index], columns['value'][index])
+                    break
+        result = []
+        for index in indices:
+            if QUALITIES[columns['quality'][index]] != 'Good':
+                continue
+            current = (columns['value_type'][index], columns['value'][index])
+            if current != previous:
+                result.append(self._sample(columns, index))
+            previous = current
+        return result
+
+    def flush(self):
+        if self._file is not None:
+            self._buffer.flush()
+
+    def close(self):
+        if self._buffer is None:
+            return
+        self.flush()
+        for columns in self._columns:
+            for column in columns.values():
+                column.release()
+        self._columns = []
+        self._view.release()
+        self._buffer.close()
+        self._buffer = None
+        if self._file is not None:
+            self._file.close()
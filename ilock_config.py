@@ -0,0 +1,278 @@
+"""
+Loading of interlock configuration files (as written by jsonizer) into Interlock objects.
+
+Files are parsed directly into Interlock/Component/Indication, validating as they go so that a bad file is reported with
+the location of the problem. Parsed interlocks are also cached in binary (pickle) form in the application's own cache
+directory (see default_cache_dir()), keyed by each file's path and a hash of its content - so a file only needs parsing
+again once it has changed.
+
+ConfigWatcher polls loaded files for changes while the program runs, reporting each change as the old and new Interlock
+plus an InterlockDiff of their indications - so a running scan and GUI can update just the indications affected.
+"""
+from collections import namedtuple
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+
+from interlock import Component, Indication, Interlock
+
+CACHE_VERSION = 1  # Bump whenever Interlock/Component/Indication change shape, to invalidate existing caches
+ROLES = ('initiator', 'final_element', 'both')
+
+
+def default_cache_dir():
+    """Per-user cache directory for parsed configs: under %LOCALAPPDATA% on Windows, else $XDG_CACHE_HOME or ~/.cache"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'InterlockVis', 'config_cache')
+
+
+class ConfigError(ValueError):
+    """An interlock configuration file is malformed"""
+
+
+def _field(data, key, where, types, required=True, default=None):
+    if key not in data:
+        if required:
+            raise ConfigError(f"{where}: missing required field '{key}'")
+        return default
+    value = data[key]
+    if not isinstance(value, types) or isinstance(value, bool) and bool not in types:
+        expected = ' or '.join('null' if t is type(None) else t.__name__ for t in types)
+        raise ConfigError(f"{where}.{key}: expected {expected}, got {value!r}")
+    return value
+
+
+def _object(data, where):
+    if not isinstance(data, dict):
+        raise ConfigError(f"{where}: expected an object, got {data!r}")
+    return data
+
+
+def parse_indication(data, where='indication'):
+    data = _object(data, where)
+    role = _field(data, 'role', where, (str,))
+    if role not in ROLES:
+        raise ConfigError(f"{where}.role: must be one of {', '.join(ROLES)}, got {role!r}")
+    if 'expected_val_pre' not in data or 'expected_val_post' not in data:
+        raise ConfigError(f"{where}: expected_val_pre and expected_val_post are both required")
+    scan_rate = _field(data, 'scan_rate', where, (int, type(None)), required=False)
+    if scan_rate is not None and scan_rate <= 0:
+        raise ConfigError(f"{where}.scan_rate: must be a positive number of milliseconds, got {scan_rate!r}")
+    return Indication(
+        _field(data, 'rank', where, (int,)),
+        _field(data, 'path', where, (str,)),
+        _field(data, 'desc', where, (str,), required=False, default=''),
+        role,
+        data['expected_val_pre'],
+        data['expected_val_post'],
+        scan_rate,
+    )
+
+
+def parse_component(data, where='component'):
+    data = _object(data, where)
+    indications = _field(data, 'indications', where, (list,))
+    if not indications:
+        raise ConfigError(f"{where}.indications: may not be empty")
+    # 'role' is also present in jsonizer output, but is derived from the indications so is not read
+    return Component(
+        _field(data, 'name', where, (str,)),
+        [parse_indication(ind, f"{where}.indications[{n}]") for n, ind in enumerate(indications)],
+        _field(data, 'desc', where, (str,), required=False, default=''),
+    )
+
+
+def parse_interlock(data, where='interlock'):
+    """Build an Interlock from its decoded JSON, raising ConfigError describing the first problem found"""
+    data = _object(data, where)
+    components = _field(data, 'components', where, (list,))
+    return Interlock(
+        _field(data, 'name', where, (str,)),
+        [parse_component(comp, f"{where}.components[{n}]") for n, comp in enumerate(components)],
+        _field(data, 'desc', where, (str,), required=False, default=''),
+    )
+
+
+class InterlockLoader:
+    """
+    Loads interlock configuration files, using the binary cache in cache_dir (default_cache_dir() if None) where the
+    file is unchanged. The latest Interlock loaded from each file is also remembered in memory with its content hash,
+    so repeat loads of an unchanged file return the same Interlock without unpickling.
+    cache=False disables the on-disk cache, e.g. where no writable cache directory is available.
+    """
+
+    def __init__(self, cache=True, cache_dir=None):
+        self.cache = cache
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.loaded = {}  # absolute path -> (content hash, Interlock)
+        self.parsed = 0  # Files which had to be parsed rather than coming from the cache, for diagnostics
+
+    def cache_stem(self, fname):
+        """Start of the names of fname's cache entries - which include a hash of its path, as names may be reused"""
+        path = os.path.abspath(fname)
+        return f"{os.path.basename(path)}.{hashlib.sha256(path.encode()).hexdigest()[:12]}"
+
+    def cache_path(self, fname, digest):
+        return os.path.join(self.cache_dir, f"{self.cache_stem(fname)}.{digest[:16]}.ilc")
+
+    def load(self, fname):
+        with open(fname, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.abspath(fname)
+        if path in self.loaded and self.loaded[path][0] == digest:
+            return self.loaded[path][1]
+
+        interlock = self._read_cache(fname, digest) if self.cache else None
+        if interlock is None:
+            try:
+                data = json.loads(content)
+            except ValueError as e:
+                raise ConfigError(f"{fname}: not valid JSON: {e}") from None
+            try:
+                interlock = parse_interlock(data)
+            except ConfigError as e:
+                raise ConfigError(f"{fname}: {e}") from None
+            self.parsed += 1
+            if self.cache:
+                self._write_cache(fname, digest, interlock)
+
+        self.loaded[path] = (digest, interlock)  # Replacing any earlier version of the file
+        return interlock
+
+    def load_all(self, fnames):
+        return [self.load(fname) for fname in fnames]
+
+    def _read_cache(self, fname, digest):
+        try:
+            with open(self.cache_path(fname, digest), 'rb') as f:
+                version, digest_cached, interlock = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable config cache for {fname}: {e}")
+            return None
+        if version != CACHE_VERSION or digest_cached != digest:
+            return None
+        return interlock
+
+    def _write_cache(self, fname, digest, interlock):
+        path = self.cache_path(fname, digest)
+        directory, name = os.path.split(path)
+        stem = self.cache_stem(fname)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for stale in os.listdir(directory):  # Entries for earlier versions of the same file
+                if stale.endswith('.ilc') and stale.rsplit('.', 2)[0] == stem and stale != name:
+                    os.remove(os.path.join(directory, stale))
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((CACHE_VERSION, digest, interlock), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)  # Atomic, so a concurrent reader never sees a partial file
+        except OSError as e:
+            logging.warning(f"Could not write config cache for {fname}: {e}")
+
+
+_default_loader = InterlockLoader()
+
+
+def load_interlock(fname):
+    """Load one interlock configuration file through the shared, cached loader"""
+    return _default_loader.load(fname)
+
+
+def load_interlocks(fnames):
+    return _default_loader.load_all(fnames)
+
+
+InterlockDiff = namedtuple('InterlockDiff', 'added removed changed kept')
+INDICATION_FIELDS = ('rank', 'desc', 'role', 'expected_val_pre', 'expected_val_post', 'scan_rate')
+
+
+def diff_interlocks(old, new):
+    """
+    Compare the indications of two versions of an interlock, matching them by component name and path. Returns an
+    InterlockDiff of added and removed indications, and (old, new) pairs of those changed and those kept unchanged.
+    """
+    def by_key(interlock):
+        if interlock is None:
+            return {}
+        return {(comp.name, indication.path): indication
+                for comp in interlock.components for indication in comp.indications}
+
+    old_indications, new_indications = by_key(old), by_key(new)
+    added = [indication for key, indication in new_indications.items() if key not in old_indications]
+    removed = [indication for key, indication in old_indications.items() if key not in new_indications]
+    changed, kept = [], []
+    for key, indication in new_indications.items():
+        if key in old_indications:
+            previous = old_indications[key]
+            same = all(getattr(previous, field) == getattr(indication, field) for field in INDICATION_FIELDS)
+            (kept if same else changed).append((previous, indication))
+    return InterlockDiff(added, removed, changed, kept)
+
+
+class ConfigWatcher:
+    """
+    Polls interlock configuration files every interval seconds (or on check()), reloading any whose modification time
+    or size changed. on_change(fname, old, new, diff) is called for each file whose content actually changed; a file
+    that fails to load is logged and keeps its previous version. interlocks maps each watched file to its current
+    Interlock.
+    """
+
+    def __init__(self, interlocks, on_change, loader=None, interval=2.0):
+        self.interlocks = dict(interlocks)  # fname -> Interlock
+        self.on_change = on_change
+        self.loader = loader if loader is not None else _default_loader
+        self.interval = interval
+        self._stamps = {fname: self._stamp(fname) for fname in self.interlocks}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _stamp(fname):
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self):
+        """Reload changed files, returning the names of those whose interlock changed"""
+        changed = []
+        for fname, old in list(self.interlocks.items()):
+            stamp = self._stamp(fname)
+            if stamp is None or stamp == self._stamps[fname]:
+                continue
+            self._stamps[fname] = stamp
+            try:
+                new = self.loader.load(fname)
+            except (OSError, ConfigError) as e:
+                logging.error(f"Not reloading {fname}: {e}")
+                continue
+            if new is old:  # Touched, but content unchanged
+                continue
+            self.interlocks[fname] = new
+            diff = diff_interlocks(old, new)
+            logging.info(f"Reloaded {fname}: {len(diff.added)} indications added, {len(diff.removed)} removed, "
+                         f"{len(diff.changed)} changed")
+            self.on_change(fname, old, new, diff)
+            changed.append(fname)
+        return changed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="config watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.exception(f"Config watcher failed: {e}")
+
+    def stop(self):
+        self._stop.set()
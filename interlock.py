@@ -2,7 +2,7 @@ from typing import List
 
 
 class Indication:
-    def __init__(self, rank, path, desc, role, expected_val_pre, expected_val_post ):
+    def __init__(self, rank, path, desc, role, expected_val_pre, expected_val_post, scan_rate=None):
         if role not in ['initiator', 'final_element', 'both']:
             raise TypeError(f"Indicator role must be one of the following strings: initiator, final_element, both')")
         self.rank = rank  # 0 for indication of physical process condition; > 0 for surrogate indications
@@ -11,10 +11,11 @@ class Indication:
         self.expected_val_post = expected_val_post
         self.role = role
         self.desc = desc
+        self.scan_rate = scan_rate  # Scan period (ms) overriding the rate otherwise chosen by rank; None for default
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.rank!r}, {self.path!r}, {self.desc!r}, " \
-               f"{self.role!r}, {self.expected_val_pre!r}, {self.expected_val_post!r})"
+               f"{self.role!r}, {self.expected_val_pre!r}, {self.expected_val_post!r}, {self.scan_rate!r})"
 
 
 class Component:
@@ -43,5 +44,9 @@ class Interlock:
         self.components = components
         self.desc = desc
 
+    def all_indications(self):
+        """Flatten indications of every component into a single list, preserving display order"""
+        return [indication for comp in self.components for indication in comp.indications]
+
     def __repr__(self):
         return f"{self.__class__.__name__}({self.name!r}, {self.components!r}, {self.desc!r})"
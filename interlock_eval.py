@@ -0,0 +1,171 @@
+"""
+Evaluation of interlock state ("ready / tripped / proven") from a snapshot of scan results.
+
+Interlocks are compiled once into flat, index-aligned lists of paths, expected values, roles and ranks, with each
+component and interlock occupying a contiguous segment. Scoring a snapshot is then a handful of whole-list passes using
+map() with operator functions, which iterate in C rather than the interpreter, and per-segment reductions are done with
+prefix sums rather than slicing - so very little of the work happens in interpreted loops.
+
+This does not reach the sub-millisecond target set for it: 5,000 indications in 50 interlocks take around 2.5 ms to
+evaluate. Each of the dozen or so passes still creates and compares 5,000 Python objects, which costs 0.1-0.3 ms a pass
+even in C, and only a library working on unboxed arrays (e.g. numpy, which is not a dependency) would get much below
+that. It is fast enough for the GUI, which evaluates once per DeltaPublisher batch - at most once per scan cycle.
+
+States:
+- An indication is at_pre/at_post when it read with good quality and equals expected_val_pre/expected_val_post.
+- A component or interlock is ready when all of its indications are at_pre.
+- A component or interlock is tripped when any of its initiating indications (role 'initiator' or 'both') is at_post.
+- A component is proven when all of its indications are at_post. An interlock is proven when it is tripped and all of
+  its final element indications (role 'final_element' or 'both') are at_post.
+"""
+from array import array
+from itertools import accumulate, repeat
+from operator import and_, eq, itemgetter, sub
+
+ROLES = ('initiator', 'final_element', 'both')
+INITIATOR, FINAL_ELEMENT, BOTH = range(3)
+
+
+class InterlockStatus:
+    """Interlock-level results, with a summary for each Component.role present"""
+    __slots__ = ('interlock', 'ready', 'tripped', 'proven', 'roles')
+
+    def __init__(self, interlock, ready, tripped, proven, roles):
+        self.interlock = interlock
+        self.ready = ready
+        self.tripped = tripped
+        self.proven = proven
+        self.roles = roles  # role -> {'ready': bool, 'tripped': bool, 'proven': bool}
+
+    @property
+    def state(self):
+        """The furthest state reached, for display: 'proven', 'tripped', 'ready' or 'not ready'"""
+        return 'proven' if self.proven else 'tripped' if self.tripped else 'ready' if self.ready else 'not ready'
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.interlock.name!r}, ready={self.ready!r}, " \
+               f"tripped={self.tripped!r}, proven={self.proven!r})"
+
+
+class Evaluation:
+    """
+    Results of scoring one snapshot. Per-indication lists are aligned with CompiledInterlocks.indications; components
+    holds (component, ready, tripped, proven) tuples aligned with CompiledInterlocks.components. role summaries in
+    InterlockStatus.roles are taken over all indications of the components having that role.
+    """
+
+    def __init__(self, compiled, valid, at_pre, at_post, components, interlocks):
+        self.compiled = compiled
+        self.valid = valid
+        self.at_pre = at_pre
+        self.at_post = at_post
+        self.components = components
+        self.interlocks = interlocks  # [InterlockStatus], aligned with CompiledInterlocks.interlocks
+
+    def indication_states(self):
+        """Yield (indication, state) pairs, state being one of 'pre', 'post', 'other' or 'unknown' (bad read)"""
+        for indication, valid, pre, post in zip(self.compiled.indications, self.valid, self.at_pre, self.at_post):
+            yield indication, 'pre' if pre else 'post' if post else 'other' if valid else 'unknown'
+
+
+def _prefix_sums(flags):
+    """Running count of true flags, such that the count within [start, end) is prefix[end] - prefix[start]"""
+    prefix = [0]
+    prefix.extend(accumulate(flags))
+    return prefix
+
+
+def _segment_counts(prefix, starts, ends):
+    return list(map(sub, map(prefix.__getitem__, ends), map(prefix.__getitem__, starts)))
+
+
+class CompiledInterlocks:
+    """One or more interlocks flattened for fast repeated evaluation"""
+
+    def __init__(self, interlocks):
+        self.interlocks = list(interlocks)
+        self.indications = []
+        self.components = []
+        self.component_starts, self.component_ends = array('L'), array('L')  # Segments of indication lists
+        self.interlock_starts, self.interlock_ends = array('L'), array('L')
+        self.role_groups = []  # Per interlock: [(role, getter of that role's indications' entries from a list)]
+        for interlock in self.interlocks:
+            self.interlock_starts.append(len(self.indications))
+            role_indices = {}
+            for comp in interlock.components:
+                self.component_starts.append(len(self.indications))
+                role_indices.setdefault(comp.role, []).extend(
+                    range(len(self.indications), len(self.indications) + len(comp.indications))
+                )
+                self.indications.extend(comp.indications)
+                self.components.append(comp)
+                self.component_ends.append(len(self.indications))
+            self.interlock_ends.append(len(self.indications))
+            # itemgetter always returns a tuple when given 2+ indices, so single indices are padded with a duplicate
+            self.role_groups.append([
+                (role, itemgetter(*indices) if len(indices) > 1 else itemgetter(indices[0], indices[0]))
+                for role, indices in role_indices.items()
+            ])
+
+        self.paths = [indication.path for indication in self.indications]
+        self.expected_pre = [indication.expected_val_pre for indication in self.indications]
+        self.expected_post = [indication.expected_val_post for indication in self.indications]
+        self.ranks = array('i', [indication.rank for indication in self.indications])
+        self.roles = array('b', [ROLES.index(indication.role) for indication in self.indications])
+        self.initiating = [role != FINAL_ELEMENT for role in self.roles]
+        self.finishing = [role != INITIATOR for role in self.roles]
+        self.component_sizes = list(map(sub, self.component_ends, self.component_starts))
+        self.interlock_sizes = list(map(sub, self.interlock_ends, self.interlock_starts))
+        self.interlock_finishing = _segment_counts(_prefix_sums(self.finishing), self.interlock_starts,
+                                                   self.interlock_ends)
+
+    def __len__(self):
+        return len(self.indications)
+
+    def evaluate(self, snapshot):
+        """Score a snapshot given as a mapping of path to DataPoint or error (e.g. from OPCScanner.read_group())"""
+        results = list(map(snapshot.get, self.paths))
+        count = len(results)
+        # Errors and missing paths have no quality/value attributes, so come out as None and hence invalid
+        valid = list(map(eq, map(getattr, results, repeat('quality', count), repeat(None, count)), repeat('Good')))
+        values = list(map(getattr, results, repeat('value', count), repeat(None, count)))
+        return self.evaluate_values(values, valid)
+
+    def evaluate_values(self, values, valid=None):
+        """Score a list of raw values aligned with self.paths. valid marks values that are trustworthy (default all)"""
+        at_pre = list(map(eq, values, self.expected_pre))
+        at_post = list(map(eq, values, self.expected_post))
+        if valid is None:
+            valid = [True] * len(values)
+        elif not all(valid):
+            at_pre = list(map(and_, at_pre, valid))
+            at_post = list(map(and_, at_post, valid))
+        pre_sums = _prefix_sums(at_pre)
+        post_sums = _prefix_sums(at_post)
+        tripping = list(map(and_, at_post, self.initiating))
+        tripping_sums = _prefix_sums(tripping)
+        finished_sums = _prefix_sums(map(and_, at_post, self.finishing))
+
+        starts, ends = self.component_starts, self.component_ends
+        components = list(zip(
+            self.components,
+            map(eq, _segment_counts(pre_sums, starts, ends), self.component_sizes),
+            map(bool, _segment_counts(tripping_sums, starts, ends)),
+            map(eq, _segment_counts(post_sums, starts, ends), self.component_sizes),
+        ))
+
+        starts, ends = self.interlock_starts, self.interlock_ends
+        interlocks = []
+        for interlock, pre_count, size, trips, finished, finishing, role_groups in zip(
+                self.interlocks, _segment_counts(pre_sums, starts, ends), self.interlock_sizes,
+                _segment_counts(tripping_sums, starts, ends), _segment_counts(finished_sums, starts, ends),
+                self.interlock_finishing, self.role_groups):
+            roles = {
+                role: {'ready': all(getter(at_pre)), 'tripped': any(getter(tripping)), 'proven': all(getter(at_post))}
+                for role, getter in role_groups
+            }
+            interlocks.append(InterlockStatus(
+                interlock, pre_count == size, trips > 0, trips > 0 and finished == finishing, roles
+            ))
+
+        return Evaluation(self, valid, at_pre, at_post, components, interlocks)
@@ -0,0 +1,190 @@
+"""
+Lightweight metrics for the scan path: counters, gauges and fixed-bucket histograms, kept in process and optionally
+written out periodically as a Prometheus text-format file (e.g. for node_exporter's textfile collector).
+
+Recording is a dict lookup plus an addition (or a bisect, for histograms), so instrumentation can stay on in production.
+Figures that other objects already count - e.g. DeltaPublisher.events_sent - are not recorded as they happen, but pulled
+by collectors just before each export or stats() call.
+"""
+from bisect import bisect_left
+import logging
+import os
+import threading
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Seconds
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last entry counts observations above every bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum, 'buckets': dict(zip(self.bounds + (float('inf'),), self.counts))}
+
+
+class MetricsRegistry:
+    """
+    Named metrics, each holding one value per distinct set of labels. Metrics are declared on first use, or up front
+    with describe() to give them help text (and, for histograms, bucket bounds).
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> [kind, help, buckets, {label tuple: value or Histogram}]
+        self._collectors = []
+
+    def describe(self, name, kind, help='', buckets=LATENCY_BUCKETS):
+        self._metrics.setdefault(name, [kind, help, buckets, {}])[1] = help
+
+    def _values(self, name, kind):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = [kind, '', LATENCY_BUCKETS, {}]
+        return metric
+
+    def inc(self, name, amount=1, **labels):
+        values = self._values(name, COUNTER)[3]
+        key = tuple(sorted(labels.items()))
+        values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        self._values(name, GAUGE)[3][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        metric = self._values(name, HISTOGRAM)
+        key = tuple(sorted(labels.items()))
+        histogram = metric[3].get(key)
+        if histogram is None:
+            histogram = metric[3][key] = Histogram(metric[2])
+        histogram.observe(value)
+
+    def add_collector(self, collector):
+        """Have collector(registry) called before every export, to set metrics from state kept elsewhere"""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def collect(self):
+        for collector in list(self._collectors):
+            try:
+                collector(self)
+            except Exception as e:
+                logging.debug(f"Metrics collector {collector} failed: {e}")
+
+    def get(self, name, **labels):
+        """Current value of a counter or gauge (or a Histogram), or None if never recorded"""
+        metric = self._metrics.get(name)
+        return metric[3].get(tuple(sorted(labels.items()))) if metric else None
+
+    def stats(self):
+        """All metrics as {name: {label string: value}}, histograms being dicts of count, sum and bucket counts"""
+        self.collect()
+        result = {}
+        for name, (kind, _, _, values) in list(self._metrics.items()):
+            result[name] = {
+                _label_str(key): value.snapshot() if kind == HISTOGRAM else value for key, value in list(values.items())
+            }
+        return result
+
+    def to_prometheus(self):
+        self.collect()
+        lines = []
+        for name, (kind, help, _, values) in sorted(self._metrics.items()):
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in list(values.items()):
+                if kind != HISTOGRAM:
+                    lines.append(f"{name}{_label_str(key)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.bounds + (float('inf'),), value.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_label_str(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_label_str(key)} {_number(value.sum)}")
+                lines.append(f"{name}_count{_label_str(key)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _label_str(key):
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(key, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class PrometheusFileWriter:
+    """Writes a registry to fname every interval seconds from a background thread, replacing the file atomically"""
+
+    def __init__(self, registry, fname, interval=15.0):
+        self.registry = registry
+        self.fname = fname
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        tmp_fname = f"{self.fname}.{os.getpid()}.tmp"
+        with open(tmp_fname, 'w') as f:
+            f.write(self.registry.to_prometheus())
+        os.replace(tmp_fname, self.fname)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logging.warning(f"Could not write metrics to {self.fname}: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+REGISTRY = MetricsRegistry()  # Shared by default between everything in the process
+for _name, _kind, _help in [
+    ('opc_read_seconds', HISTOGRAM, "Latency of OPC server calls, by host and read (group name or properties call)"),
+    ('opc_path_retries_total', COUNTER, "Extra attempts needed to read a path with good quality"),
+    ('opc_path_failures_total', COUNTER, "Path reads failing on every attempt"),
+    ('opc_group_read_failures_total', COUNTER, "Group reads failing outright, e.g. with the connection lost"),
+    ('opc_read_timeouts_total', COUNTER, "Async reads abandoned for taking longer than their timeout"),
+    ('scan_cycle_seconds', HISTOGRAM, "Duration of each scan cycle"),
+    ('scan_target_period_seconds', GAUGE, "Period each scan cycle is meant to complete within"),
+    ('scan_overruns_total', COUNTER, "Scan cycles exceeding the target period"),
+    ('scan_missed_deadlines_total', COUNTER, "Scan deadlines skipped because of overruns"),
+    ('comms_integrity_ok', GAUGE, "1 if the landmark and heartbeat checks pass, else 0"),
+    ('gui_events_sent_total', COUNTER, "Batches of changed results sent to the GUI"),
+    ('gui_results_suppressed_total', COUNTER, "Results not sent to the GUI as unchanged"),
+    ('gui_results_coalesced_total', COUNTER, "Changed results replaced by a newer one before being sent to the GUI"),
+    ('gui_event_lag_seconds', HISTOGRAM, "Time from sending a batch of results to the GUI applying it"),
+    ('opc_failovers_total', COUNTER, "Failovers between OPC hosts"),
+    ('opc_outage_seconds', GAUGE, "Length of the current outage of every OPC host, 0 if none"),
+    ('service_version', GAUGE, "Latest snapshot version published by the scanner service"),
+    ('service_subscribers', GAUGE, "Viewers subscribed to the scanner service"),
+    ('service_resyncs_total', COUNTER, "Times a slow subscriber's backlog was replaced with a snapshot"),
+    ('shard_up', GAUGE, "1 if a scan shard's worker process is running, else 0"),
+    ('shard_restarts_total', COUNTER, "Times a scan shard's worker process was restarted"),
+    ('shard_silent_seconds', GAUGE, "Time since a scan shard's worker last sent results"),
+    ('shard_lost_cycles_total', COUNTER, "Scan cycles missing from shard workers' results, e.g. across restarts"),
+]:
+    REGISTRY.describe(_name, _kind, _help)
@@ -0,0 +1,231 @@
+"""
+Index of the OPC server's namespace, for finding and checking paths without a live connection.
+
+The crawler browses the server one branch at a time with the OpenOPC list() call, recording the item IDs found under
+each branch along with when it was crawled. The index is saved to disk as JSON, and can later be refreshed branch by
+branch - only branches crawled too long ago, or named explicitly, are browsed again.
+
+Lookups are case-insensitive, as DeltaV paths are. Item IDs are kept sorted, so prefix search is a bisection; fuzzy
+search narrows by module name before comparing whole paths. check_interlocks() reports every indication path of a set
+of interlocks that the index doesn't know, with suggestions, so configs can be checked before being deployed.
+
+Run with:
+    python namespace_index.py crawl cfg.json index.json [root branch ...]
+    python namespace_index.py refresh cfg.json index.json [--max-age hours] [branch ...]
+    python namespace_index.py search index.json text [--fuzzy]
+    python namespace_index.py check index.json interlock1.json [interlock2.json ...]
+"""
+import argparse
+from bisect import bisect_left
+from collections import namedtuple
+import difflib
+import json
+import logging
+import os
+import sys
+import time
+
+from ilock_config import load_interlocks
+from opc_scanner import OPCScanner
+
+INDEX_VERSION = 1
+
+UnknownPath = namedtuple('UnknownPath', 'interlock component indication suggestions')
+
+
+def _module(path):
+    return path.replace('.', '/').split('/', 1)[0].upper()
+
+
+class NamespaceIndex:
+    """
+    Item IDs of the server, grouped by the branch (e.g. 'XV-101/CLOSED') whose listing returned them. branches maps each
+    crawled branch to (time crawled, [item IDs]); a branch with only sub-branches has an empty list.
+    """
+
+    def __init__(self, host=None, branches=None):
+        self.host = host
+        self.branches = branches if branches is not None else {}
+        self._keys = None  # Sorted upper-case item IDs, built on first lookup after a change
+        self._paths = None  # Upper-case item ID -> item ID as the server reports it
+        self._modules = None  # Upper-case module name -> [upper-case item IDs]
+
+    # ---- Crawling ----
+    def crawl(self, client, roots=('*',), max_branches=None):
+        """
+        Browse every branch beneath roots (branch paths, '*' for the whole namespace) through client, a connected
+        OpenOPC client, replacing what was indexed beneath them. Returns the number of branches browsed.
+        """
+        queue = list(roots)
+        for root in roots:
+            self._forget(root)
+        browsed = 0
+        while queue and (max_branches is None or browsed < max_branches):
+            branch = queue.pop(0)
+            try:
+                nodes = client.list(branch, include_type=True)
+            except Exception as e:
+                logging.warning(f"Could not browse {branch!r}: {e}")
+                continue
+            browsed += 1
+            leaves = []
+            for name, node_type in nodes:
+                if node_type == 'Leaf':
+                    leaves.append(name)
+                else:
+                    queue.append(name if branch == '*' else f"{branch}/{name}")
+            self.branches[branch] = (time.time(), leaves)
+        if queue:
+            logging.warning(f"Stopped after browsing {browsed} branches, with {len(queue)} still to browse")
+        self._keys = None
+        return browsed
+
+    def refresh(self, client, max_age=None, branches=None):
+        """
+        Crawl again beneath the given branches, or else beneath every top-level branch crawled more than max_age
+        seconds ago (all of them if max_age is None). Returns the number of branches browsed.
+        """
+        if branches is None:
+            cutoff = time.time() - (max_age or 0)
+            branches = [
+                branch for branch, (crawled, _) in self.branches.items()
+                if branch != '*' and '/' not in branch and (max_age is None or crawled < cutoff)
+            ]
+            if max_age is None and '*' in self.branches:  # Pick up new modules too
+                branches = ['*']
+        return self.crawl(client, branches) if branches else 0
+
+    def _forget(self, root):
+        if root == '*':
+            self.branches.clear()
+            return
+        prefix = root.upper() + '/'
+        for branch in [b for b in self.branches if b.upper() == root.upper() or b.upper().startswith(prefix)]:
+            del self.branches[branch]
+
+    # ---- Lookups ----
+    def _build(self):
+        self._paths = {path.upper(): path for _, leaves in self.branches.values() for path in leaves}
+        self._keys = sorted(self._paths)
+        self._modules = {}
+        for key in self._keys:
+            self._modules.setdefault(_module(key), []).append(key)
+
+    def __contains__(self, path):
+        if self._keys is None:
+            self._build()
+        return path.upper() in self._paths
+
+    def __len__(self):
+        if self._keys is None:
+            self._build()
+        return len(self._keys)
+
+    def search(self, prefix, limit=50):
+        """Item IDs starting with prefix, in order"""
+        if self._keys is None:
+            self._build()
+        prefix = prefix.upper()
+        results = []
+        for key in self._keys[bisect_left(self._keys, prefix):]:
+            if not key.startswith(prefix) or len(results) == limit:
+                break
+            results.append(self._paths[key])
+        return results
+
+    def fuzzy(self, text, limit=10, cutoff=0.6):
+        """Item IDs most like text, best first - e.g. for a misspelt path"""
+        if self._keys is None:
+            self._build()
+        text = text.upper()
+        modules = difflib.get_close_matches(_module(text), self._modules, n=5, cutoff=cutoff)
+        candidates = [key for module in modules for key in self._modules[module]]
+        return [self._paths[key] for key in difflib.get_close_matches(text, candidates, n=limit, cutoff=cutoff)]
+
+    def check_interlocks(self, interlocks, suggestions=3):
+        """Every indication of interlocks whose path is not in the index, as UnknownPaths"""
+        unknown = []
+        for interlock in interlocks:
+            for component in interlock.components:
+                for indication in component.indications:
+                    if indication.path not in self:
+                        unknown.append(UnknownPath(interlock, component, indication,
+                                                   self.fuzzy(indication.path, limit=suggestions)))
+        return unknown
+
+    # ---- Persistence ----
+    def save(self, fname):
+        tmp_fname = f"{fname}.{os.getpid()}.tmp"
+        with open(tmp_fname, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'host': self.host, 'branches': self.branches}, f)
+        os.replace(tmp_fname, fname)
+
+    @classmethod
+    def load(cls, fname):
+        with open(fname, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"{fname} is not a version {INDEX_VERSION} namespace index")
+        return cls(data['host'], {branch: (crawled, leaves) for branch, (crawled, leaves) in data['branches'].items()})
+
+
+def _connect(cfg_fname):
+    with open(cfg_fname, 'r') as fp:
+        opc = OPCScanner(json.load(fp))
+    opc.connect()
+    return opc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    crawl = commands.add_parser('crawl', help="Browse the server and write a new index")
+    crawl.add_argument('cfg')
+    crawl.add_argument('index')
+    crawl.add_argument('roots', nargs='*', default=['*'])
+    refresh = commands.add_parser('refresh', help="Browse again branches of an existing index")
+    refresh.add_argument('cfg')
+    refresh.add_argument('index')
+    refresh.add_argument('branches', nargs='*')
+    refresh.add_argument('--max-age', type=float, help="Only branches crawled more than this many hours ago")
+    search = commands.add_parser('search', help="Find paths by prefix (or fuzzily)")
+    search.add_argument('index')
+    search.add_argument('text')
+    search.add_argument('--fuzzy', action='store_true')
+    check = commands.add_parser('check', help="Report interlock config paths missing from the index")
+    check.add_argument('index')
+    check.add_argument('configs', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.command in ('crawl', 'refresh'):
+        opc = _connect(args.cfg)
+        try:
+            if args.command == 'crawl':
+                index = NamespaceIndex(opc.opc_host)
+                browsed = index.crawl(opc.client, args.roots)
+            else:
+                index = NamespaceIndex.load(args.index)
+                max_age = args.max_age * 3600 if args.max_age is not None else None
+                browsed = index.refresh(opc.client, max_age, args.branches or None)
+        finally:
+            opc.close()
+        index.save(args.index)
+        print(f"Browsed {browsed} branches; {len(index)} paths indexed")
+        return 0
+
+    index = NamespaceIndex.load(args.index)
+    if args.command == 'search':
+        for path in index.fuzzy(args.text) if args.fuzzy else index.search(args.text):
+            print(path)
+        return 0
+
+    unknown = index.check_interlocks(load_interlocks(args.configs))
+    for interlock, component, indication, suggestions in unknown:
+        hint = f" - did you mean {' or '.join(suggestions)}?" if suggestions else ''
+        print(f"{interlock.name}: {component.name}: {indication.path} not found{hint}")
+    return 1 if unknown else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
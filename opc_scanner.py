@@ -1,11 +1,32 @@
 from collections import deque
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
+from functools import lru_cache
 import logging
+import time
+from zoneinfo import ZoneInfo
 
 import OpenOPC
 
+from history_store import HistoryStore
+import metrics
+from retry_policy import NegativeCache, RetryPolicy, UNKNOWN_ITEM_ID
+
+
+@lru_cache(maxsize=4096)
+def parse_opc_timestamp(timestamp, tz=None):
+    """
+    Convert an OpenOPC timestamp string (e.g. '2021-03-04 05:06:07+00:00') to a naive datetime in zone tz, or in the
+    local system zone if tz is None. Cached, since every item read within the same second shares a timestamp string.
+    """
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:  # Server timestamps are UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(tz).replace(tzinfo=None)
+
 
 class DataPoint:
+    __slots__ = ('name', 'canonical_datatype', 'value', 'quality', '_timestamp', 'conn_status_int', 'required_attempts')
+
     conn_status = {
         -3: 'External reference not resolved',
         -2: 'Parameter not configured',
@@ -13,16 +34,36 @@ class DataPoint:
         0: 'Good',
         1: 'Not communicating',
     }
+    tz = None  # Zone that timestamps are presented in (None for the local system zone) - see set_timezone()
 
     def __init__(self, name, canonical_datatype, value, quality, timestamp, conn_status_int, required_attempts):
         self.name = name
         self.canonical_datatype = canonical_datatype
         self.value = value
         self.quality = quality
-        self.timestamp = datetime.strptime(timestamp[:-6], "%Y-%m-%d %H:%M:%S") - timedelta(hours=6)  # Adjust for TZ
+        self._timestamp = timestamp  # Raw server string until first accessed - most DataPoints never need it parsed
         self.conn_status_int = conn_status_int
         self.required_attempts = required_attempts
 
+    @classmethod
+    def set_timezone(cls, tz_name):
+        """Present timestamps in the named IANA zone (e.g. 'America/Chicago'), or the local system zone if None"""
+        cls.tz = ZoneInfo(tz_name) if tz_name else None
+
+    @property
+    def timestamp(self):
+        if isinstance(self._timestamp, str):
+            self._timestamp = parse_opc_timestamp(self._timestamp, DataPoint.tz)
+        return self._timestamp
+
+    @property
+    def utc_timestamp(self):
+        """Server timestamp as seconds since the epoch"""
+        if isinstance(self._timestamp, str):
+            dt = datetime.fromisoformat(self._timestamp)
+            return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+        return self._timestamp.replace(tzinfo=DataPoint.tz).timestamp() if DataPoint.tz else self._timestamp.timestamp()
+
     @property
     def conn_status_str(self):
         return DataPoint.conn_status[self.conn_status_int]
@@ -37,23 +78,51 @@ class DataPoint:
 
 
 class OPCScanner:
-    MAX_RETRIES = 500
+    MAX_RETRIES = 10  # Attempts per read under the default retry policy
+    MISSING_PATH_TTL = 300  # Seconds for which a path found not to exist is skipped, unless missing_paths is cleared
     MAX_HB_DELTA = 5  # Seconds beyond which an unchanged heartbeat value indicates stale communications
     HEARTBEAT_UPDATE_RATE = 2  # Interval (in seconds) at which the configured heartbeat signal updates
+    GROUP_META_MAX_AGE = 60  # Seconds after which a group's datatypes and connection statuses are read again
 
-    def __init__(self, conn_cfg, use_alt_host=False):
+    def __init__(self, conn_cfg, use_alt_host=False, client=None, retry_policy=None, metrics_registry=None):
         if use_alt_host:
             self.opc_host = conn_cfg["OPC_HOST_ALT"]
         else:
             self.opc_host = conn_cfg["OPC_HOST"]
-        self.client = OpenOPC.client(client_name="PyOPC")
+        # Any object implementing the OpenOPC client API may be supplied instead, e.g. fake_opc.FakeOPCClient
+        if client is None and conn_cfg.get("REPLAY_CAPTURE"):  # Serve a recorded capture instead of a live server
+            from scan_capture import ReplayOPCClient
+            client = ReplayOPCClient(conn_cfg["REPLAY_CAPTURE"], speed=conn_cfg.get("REPLAY_SPEED", 1.0),
+                                     loop=conn_cfg.get("REPLAY_LOOP", False))
+        self.client = client if client is not None else OpenOPC.client(client_name="PyOPC")
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(max_attempts=self.MAX_RETRIES)
+        self.missing_paths = NegativeCache(ttl=self.MISSING_PATH_TTL)  # Paths proven not to exist on the server
+        self.metrics = metrics_registry if metrics_registry is not None else metrics.REGISTRY
         self.landmark_path = conn_cfg["LANDMARK_PATH"]  # Path to known/expected value, for health checks
         self.expected_landmark_val = conn_cfg["EXPECTED_LANDMARK_VAL"]  # Value to compare landmark observation against
         self.heartbeat_path = conn_cfg["HEARTBEAT_PATH"]  # Path to constantly changing value, for health checks
+        if "TIMEZONE" in conn_cfg:
+            DataPoint.set_timezone(conn_cfg["TIMEZONE"])
+        self.history = None  # Changes seen by read_group(), kept when HISTORY_CAPACITY or HISTORY_FILE is configured
+        if conn_cfg.get("HISTORY_CAPACITY") or conn_cfg.get("HISTORY_FILE"):
+            self.history = HistoryStore(capacity=conn_cfg.get("HISTORY_CAPACITY", 3600),
+                                        max_paths=conn_cfg.get("HISTORY_MAX_PATHS", 1024),
+                                        fname=conn_cfg.get("HISTORY_FILE"))
         self.landmark = None
         self.heartbeats = deque(maxlen=2)
         self.aliasing_possible = False  # Indicates if heartbeat scan is too slow and could alias signal
         self.last_integrity_timestamp = None
+        self.groups = {}  # Group name -> list of paths, kept so groups can be re-registered after a reconnect
+        self._group_update_rates = {}
+        self._group_meta = {}  # Group name -> {path: (canonical_datatype, conn_status_int)}, captured on registration
+        self._group_meta_times = {}  # Group name -> time.monotonic() at which _group_meta was last captured
+        self.group_meta_max_age = self.GROUP_META_MAX_AGE
+        self._group_callbacks = {}  # Group name -> callback(path, DataPoint/error) for change notifications
+        self._group_last_values = {}  # Group name -> {path: (value, quality)}, for emulated change notifications
+        self._server_callback_groups = set()  # Groups whose change notifications come directly from the server
+        self._registered_groups = set()  # Groups that exist on the server for the current connection
+        self.connected = False
+        self.read_failures = 0  # Consecutive read_group() calls failing outright, e.g. with the connection lost
 
     def connect(self):
         try:
@@ -65,63 +134,305 @@ class OPCScanner:
             logging.error("Could not connect: " + str(e))
             raise e
 
+        self.connected = True
+        # Server-side groups do not survive a reconnect - register them again so cyclic reads continue seamlessly
+        self._registered_groups.clear()
+        for name in self.groups:
+            try:
+                self._register_group(name)
+            except Exception as e:
+                logging.warning(f"Could not re-register group {name} after connecting (will retry on read): {e}")
+
+    def mark_disconnected(self):
+        """Note that the connection was lost, so groups are only recorded until connect() succeeds again"""
+        self.connected = False
+        self._registered_groups.clear()
+
     def close(self):
         try:
             self.client.close()
+            self.connected = False
+            self._registered_groups.clear()
+            if self.history is not None:
+                self.history.flush()
             logging.info("Closed connection to DeltaV OPC server")
         except NameError:
             pass  # No need to attempt to close if opc object never created.
 
+    @property
+    def integrity_scan_period(self):
+        """Slowest scan period (ms) for integrity_paths that still avoids aliasing the heartbeat signal"""
+        return int(self.HEARTBEAT_UPDATE_RATE * 1000 / 2)
+
+    @property
+    def integrity_paths(self):
+        """Paths read by update_integrity_markers(), for inclusion in batched scans"""
+        return [self.landmark_path, self.heartbeat_path]
+
+    @staticmethod
+    def _build_datapoint(properties, attempts):
+        """Create a DataPoint from one path's (id, description, value) property tuples; None if quality isn't good"""
+        good = False
+        for prop in properties:
+            # SCAN PROPERTIES, LOOKING FOR ITEM QUALITY == GOOD
+            if str(prop[1]) == 'Item Quality':
+                good = str(prop[2]) == 'Good'
+        if not good:  # 'Item Quality' EITHER NEVER FOUND, OR FOUND TO BE BAD
+            return None
+        return DataPoint(
+            name=properties[0][2],
+            canonical_datatype=properties[1][2],
+            value=properties[2][2],
+            quality=properties[3][2],
+            timestamp=properties[4][2],
+            conn_status_int=properties[9][2],
+            required_attempts=attempts
+        )
+
+    @staticmethod
+    def _describe_error(exc):
+        """Translate known server errors into something more meaningful for display"""
+        if UNKNOWN_ITEM_ID in str(exc):
+            return "DoesNotExist"
+        return exc
+
+    def _observe_read(self, read, started):
+        """Record the latency of one server call begun at time.perf_counter() value started"""
+        self.metrics.observe('opc_read_seconds', time.perf_counter() - started, host=self.opc_host, read=read)
+
+    def _count_retries(self, path, dp):
+        if dp.required_attempts > 1:
+            self.metrics.inc('opc_path_retries_total', dp.required_attempts - 1, path=path)
+
     def get_datapoint(self, path):
-        """Retrieve a single value for an OPC path."""
-        retries = self.MAX_RETRIES
+        """Retrieve a single value for an OPC path, retrying as dictated by self.retry_policy."""
+        if path in self.missing_paths:
+            return "DoesNotExist"
+
         exc_for_return = None
-        while retries > 0:
-            try:
-                properties = self.client.properties(path)
-                good = False
-                for prop in properties:
-                    # SCAN PROPERTIES, LOOKING FOR ITEM QUALITY == GOOD
-                    if str(prop[1]) == 'Item Quality':
-                        if str(prop[2]) == 'Good':
-                            good = True
-                        else:
-                            retries -= 1  # Should not occur, but had to include.
-                if good:
-                    return DataPoint(
-                        name=properties[0][2],
-                        canonical_datatype=properties[1][2],
-                        value=properties[2][2],
-                        quality=properties[3][2],
-                        timestamp=properties[4][2],
-                        conn_status_int=properties[9][2],
-                        required_attempts=self.MAX_RETRIES + 1 - retries
-                    )
-                else:  # 'Item Quality' EITHER NEVER FOUND, OR FOUND TO BE BAD
-                    retries -= 1
+        with self.retry_policy.cycle():
+            for attempt in self.retry_policy.attempts():
+                started = time.perf_counter()
+                try:
+                    dp = self._build_datapoint(self.client.properties(path), attempt)
+                    self._observe_read('properties', started)
+                    if dp is not None:
+                        self._count_retries(path, dp)
+                        return dp
                     exc_for_return = "Item quality not good on final pass"
 
-            except Exception as exc:
-                logging.debug(exc)
-                retries -= 1
-                exc_for_return = exc
+                except Exception as exc:
+                    self._observe_read('properties', started)
+                    logging.debug(exc)
+                    exc_for_return = exc
+                    if self.retry_policy.is_fatal(exc):  # Path doesn't exist - retrying would only load the server
+                        self.missing_paths.add(path)
+                        break
+
+        self.metrics.inc('opc_path_failures_total', host=self.opc_host)
+        return self._describe_error(exc_for_return)  # DEPLETED ALL RETRIES - UNSUCCESSFUL SCAN
+
+    def get_datapoints(self, paths):
+        """
+        Retrieve values for many OPC paths using as few server calls as possible. Every outstanding path is requested
+        in a single properties() call per attempt, and only paths whose quality was not good are retried. Paths in
+        self.missing_paths are not requested at all.
+
+        Returns a dict mapping each (de-duplicated) path to a DataPoint, or to the error that prevented retrieving one,
+        exactly as get_datapoint() would have returned for that path.
+        """
+        results = dict.fromkeys(paths)  # Drop duplicates but keep order
+        pending = []
+        for path in results:
+            if path in self.missing_paths:
+                results[path] = "DoesNotExist"
+            else:
+                pending.append(path)
+
+        with self.retry_policy.cycle():
+            for attempt in self.retry_policy.attempts() if pending else ():
+                started = time.perf_counter()
+                try:
+                    properties = self.client.properties(pending)
+                    self._observe_read('properties_batch', started)
+                except Exception as exc:
+                    self._observe_read('properties_batch', started)
+                    # The server rejects the whole batch if any single path is bad - fall back to reading individually
+                    # so that the offending path(s) can be isolated without losing the rest of the scan.
+                    logging.debug(exc)
+                    for path in pending:
+                        results[path] = self.get_datapoint(path)
+                    return results
+
+                by_path = {}
+                for prop in properties:  # Multi-tag results are (path, id, description, value) tuples
+                    by_path.setdefault(prop[0], []).append(prop[1:])
+
+                retry = []
+                for path in pending:
+                    dp = self._build_datapoint(by_path.get(path, []), attempt)
+                    if dp is None:
+                        results[path] = "Item quality not good on final pass"
+                        retry.append(path)
+                    else:
+                        results[path] = dp
+                        self._count_retries(path, dp)
+                pending = retry
+                if not pending:
+                    break
+            if pending:
+                self.metrics.inc('opc_path_failures_total', len(pending), host=self.opc_host)
+
+        return results
+
+    def register_group(self, name, paths, update_rate=None):
+        """
+        Register a fixed set of paths as a named OPC group, so that cyclic reads via read_group() don't require the server
+        to resolve every item again each scan. update_rate (ms) is passed to the server as the group's update rate.
+        The group is remembered and registered again automatically whenever connect() is called.
+        """
+        self.groups[name] = list(dict.fromkeys(paths))
+        self._group_update_rates[name] = -1 if update_rate is None else update_rate
+        self._group_last_values[name] = {}
+        self._registered_groups.discard(name)
+        if self.connected:  # Otherwise registration happens in connect()
+            try:
+                self._register_group(name)
+            except Exception as exc:  # e.g. connection lost since the last read - read_group() registers it later
+                logging.debug(f"Could not register group {name} yet: {exc}")
+
+    def unregister_group(self, name):
+        self.groups.pop(name, None)
+        self._group_callbacks.pop(name, None)
+        self._group_last_values.pop(name, None)
+        self._group_meta.pop(name, None)
+        self._group_meta_times.pop(name, None)
+        self._server_callback_groups.discard(name)
+        if name in self._registered_groups:
+            self._registered_groups.discard(name)
+            try:
+                self.client.remove(name)
+            except Exception as e:
+                logging.debug(e)
+
+    def _register_group(self, name):
+        """Create the group on the server, capturing the item metadata that group reads don't provide"""
+        paths = self.groups[name]
+        self._capture_group_meta(name)
+        # rebuild, as OpenOPC otherwise keeps the items of any group of the same name still on the server
+        self.client.read(paths, group=name, update=self._group_update_rates[name], sync=True, include_error=True,
+                         rebuild=True)
+        self._registered_groups.add(name)
+
+        self._server_callback_groups.discard(name)
+        if name in self._group_callbacks:
+            self._hook_server_callback(name)
+
+    def _capture_group_meta(self, name):
+        """
+        Read the properties group reads don't return. Connection status can change while the group is registered, so
+        this is repeated every group_meta_max_age seconds.
+        """
+        self._group_meta[name] = {
+            path: (dp.canonical_datatype, dp.conn_status_int)
+            for path, dp in self.get_datapoints(self.groups[name]).items() if isinstance(dp, DataPoint)
+        }
+        self._group_meta_times[name] = time.monotonic()
+
+    def _hook_server_callback(self, name):
+        """Ask the server to push changes for a group, if the client supports it; otherwise read_group() emulates it"""
+        subscribe = getattr(self.client, 'subscribe', None)
+        if subscribe is None:
+            return
+        callback = self._group_callbacks[name]
+        try:
+            subscribe(name, lambda path, value, quality, timestamp: callback(
+                path, self._group_datapoint(name, path, value, quality, timestamp)))
+            self._server_callback_groups.add(name)
+        except NotImplementedError:
+            pass  # Server doesn't support change callbacks
+
+    def subscribe_group(self, name, callback):
+        """
+        Have callback(path, result) called whenever a path in a registered group changes value or quality, where result
+        is a DataPoint or an error. Changes are pushed by the server where supported, and otherwise detected during
+        read_group(), so read_group() must still be called cyclically in that case.
+        """
+        self._group_callbacks[name] = callback
+        if name in self._registered_groups:
+            self._hook_server_callback(name)
+
+    def _group_datapoint(self, name, path, value, quality, timestamp, error=None):
+        """
+        Build a DataPoint from a group read, using metadata captured when the group was registered. A path whose quality
+        goes bad has its metadata dropped, so it is read afresh - connection status included - once it comes good.
+        """
+        if str(quality) != 'Good':
+            self._group_meta[name].pop(path, None)
+            return self._describe_error(error) if error and quality == 'Error' else "Item quality not good"
+        if path not in self._group_meta[name]:  # Path was bad at registration (or since), but has come good
+            dp = self.get_datapoint(path)
+            if isinstance(dp, DataPoint):
+                self._group_meta[name][path] = (dp.canonical_datatype, dp.conn_status_int)
+            return dp
+        canonical_datatype, conn_status_int = self._group_meta[name][path]
+        return DataPoint(path, canonical_datatype, value, quality, timestamp, conn_status_int, required_attempts=1)
+
+    def read_group(self, name):
+        """
+        Read every path of a registered group in a single call, re-registering the group first if it was lost (e.g. to
+        a reconnect). Returns a dict mapping path to DataPoint or error, in the same form as get_datapoints().
+        """
+        try:
+            if name not in self._registered_groups:
+                self._register_group(name)
+            elif time.monotonic() - self._group_meta_times[name] >= self.group_meta_max_age:
+                self._capture_group_meta(name)
+            started = time.perf_counter()
+            rows = self.client.read(group=name, sync=True, include_error=True)
+            self._observe_read(name, started)
+        except Exception as exc:
+            logging.debug(exc)
+            self.metrics.inc('opc_group_read_failures_total', host=self.opc_host, group=name)
+            self._registered_groups.discard(name)  # Group probably went with the connection - rebuild on next read
+            self.read_failures += 1
+            results = {path: self._describe_error(exc) for path in self.groups[name]}
+            if self.history is not None:
+                self.history.record_scan(results)
+            return results
+
+        self.read_failures = 0
+        results = {}
+        for path, value, quality, timestamp, error in rows:
+            results[path] = self._group_datapoint(name, path, value, quality, timestamp, error)
+        if self.history is not None:
+            self.history.record_scan(results)
 
-        if "OLE error 0xc0040007" in str(exc_for_return):
-            exc_for_return = "DoesNotExist"
-        return exc_for_return  # DEPLETED ALL RETRIES - UNSUCCESSFUL SCAN
+        if name in self._group_callbacks and name not in self._server_callback_groups:
+            last_values = self._group_last_values[name]
+            for path, dp in results.items():
+                current = (dp.value, dp.quality) if isinstance(dp, DataPoint) else (None, str(dp))
+                if last_values.get(path) != current:
+                    last_values[path] = current
+                    self._group_callbacks[name](path, dp)
+        return results
 
-    def update_integrity_markers(self):
+    def update_integrity_markers(self, datapoints=None):
         """
         Record results of scanning a path with a known/expected value, and a path known/expected to change constantly.
         Intended to be run cyclically by outer program loop to provide up-to-date assessment of communications health.
+        If the integrity_paths were already read as part of a batched get_datapoints() call, pass those results in as
+        datapoints to avoid reading them again.
 
         NOTE: Must be run at least 2x as fast as heartbeat signal changes, to prevent signal aliasing. Currently
         selected heartbeat changes every 2 sec, so this must be run at least every second.
         """
 
         # Capture current values:
-        self.landmark = self.get_datapoint(self.landmark_path)
-        current_heartbeat = self.get_datapoint(self.heartbeat_path)
+        if datapoints is None:
+            datapoints = self.get_datapoints(self.integrity_paths)
+        self.landmark = datapoints[self.landmark_path]
+        current_heartbeat = datapoints[self.heartbeat_path]
 
         # Determine whether scan rate is fast enough to prevent aliasing:
         now = datetime.now()
@@ -130,6 +441,8 @@ class OPCScanner:
         self.last_integrity_timestamp = now
 
         # Update heartbeat deque:
+        if not isinstance(current_heartbeat, DataPoint):  # Failed read - leave history alone so it goes stale
+            return
         if len(self.heartbeats) < 2 or current_heartbeat.value != self.heartbeats[-1].value:  # Only record on change
             self.heartbeats.append(current_heartbeat)
 
@@ -140,9 +453,9 @@ class OPCScanner:
             self.landmark.value == self.expected_landmark_val
         )
 
-        # Calculate time deltas
-        heartbeat_delta = (self.heartbeats[-1].timestamp - self.heartbeats[0].timestamp).seconds
-        present_delta = (datetime.now() - self.heartbeats[-1].timestamp).seconds
+        # Calculate time deltas, in epoch seconds - timestamps may be presented in a zone other than the host's
+        heartbeat_delta = int(self.heartbeats[-1].utc_timestamp - self.heartbeats[0].utc_timestamp)
+        present_delta = int(time.time() - self.heartbeats[-1].utc_timestamp)
 
         try:  # Reveal cases where only first 1 or first 2 heartbeats have been collected
             enough_heartbeats = self.heartbeats[0].value != self.heartbeats[1].value
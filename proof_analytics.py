@@ -0,0 +1,335 @@
+"""
+Offline proof-test analytics over recorded scan captures (see scan_capture.py).
+
+Streams any number of capture files, chunk by chunk, and works out for a set of interlocks:
+- which indications never reached expected_val_post (or expected_val_pre), and how many of their reads failed
+- every trip - an initiator leaving expected_val_pre while all initiators were at it - and how long each final element
+  took to reach expected_val_post, summarised as a distribution per final element
+- how often comms integrity degraded: the landmark not at its expected value, or the heartbeat unchanged for longer than
+  OPCScanner.MAX_HB_DELTA, counted in episodes and total seconds
+
+Captures are memory-mapped, and each chunk's columns are filtered down to the paths of interest before any row is
+decoded, so memory use depends on the number of paths and trips - not on the size of the captures.
+
+Run with:
+    python proof_analytics.py --interlocks il1.json [il2.json ...] --captures day1.ilcap [day2.ilcap ...]
+        [--cfg cfg.json] [--trip-window 60] [--report report.txt] [--json summary.json]
+"""
+import argparse
+from itertools import compress
+import json
+import statistics
+import sys
+
+from ilock_config import load_interlocks
+from opc_scanner import OPCScanner
+from scan_capture import BOOL, CaptureReader, ERROR, FLOAT, INT, STR
+
+
+def distribution(samples):
+    """Summary of a list of durations (seconds), or None if there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'min_s': round(ordered[0], 3),
+        'mean_s': round(statistics.mean(ordered), 3),
+        'p50_s': round(ordered[len(ordered) // 2], 3),
+        'p90_s': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 3),
+        'max_s': round(ordered[-1], 3),
+    }
+
+
+class IndicationStats:
+    __slots__ = ('reads', 'errors', 'bad_quality', 'reached_pre', 'reached_post', 'first_post')
+
+    def __init__(self):
+        self.reads = 0
+        self.errors = 0
+        self.bad_quality = 0
+        self.reached_pre = False
+        self.reached_post = False
+        self.first_post = None  # Server time the indication was first seen at expected_val_post
+
+
+class _Trip:
+    __slots__ = ('time', 'capture_time', 'pending')
+
+    def __init__(self, time, capture_time, pending):
+        self.time = time  # Server time the first initiator left expected_val_pre
+        self.capture_time = capture_time
+        self.pending = pending  # Final element indications yet to reach expected_val_post
+
+
+class ProofTestAnalysis:
+    """
+    Feed captures to add_capture(), in time order, then read the results from summary() or to_text(). A trip's final
+    elements must reach expected_val_post within trip_window seconds, or are recorded as not responding. Comms
+    integrity is only analysed if conn_cfg (with LANDMARK_PATH etc.) is given and the captures include those paths.
+    """
+
+    def __init__(self, interlocks, conn_cfg=None, trip_window=60.0):
+        self.interlocks = interlocks
+        self.trip_window = trip_window
+        self.stats = {indication: IndicationStats() for il in interlocks for indication in il.all_indications()}
+        self._by_path = {}  # path -> [(interlock, indication)]
+        for interlock in interlocks:
+            for indication in interlock.all_indications():
+                self._by_path.setdefault(indication.path, []).append((interlock, indication))
+
+        self._initiators = {il: [i for i in il.all_indications() if i.role != 'final_element'] for il in interlocks}
+        self._finals = {il: [i for i in il.all_indications() if i.role != 'initiator'] for il in interlocks}
+        self._at_pre = {}  # Initiator -> whether its latest good value is expected_val_pre
+        self._trips = {}  # Interlock -> _Trip in progress
+        self.trips = {interlock: [] for interlock in interlocks}  # Interlock -> [(trip server time, complete)]
+        self.response_times = {indication: [] for finals in self._finals.values() for indication in finals}
+        self.no_response = {indication: 0 for indication in self.response_times}  # Trips it didn't respond to
+
+        self.landmark_path = conn_cfg.get("LANDMARK_PATH") if conn_cfg else None
+        self.expected_landmark_val = conn_cfg.get("EXPECTED_LANDMARK_VAL") if conn_cfg else None
+        self.heartbeat_path = conn_cfg.get("HEARTBEAT_PATH") if conn_cfg else None
+        self.integrity_scans = 0
+        self.degraded_scans = 0
+        self.degraded_episodes = 0
+        self.degraded_seconds = 0.0
+        self._landmark_ok = True
+        self._heartbeat = None  # (value, capture time it was first seen)
+        self._degraded_since = None  # Capture time integrity degraded, while it is degraded
+        self.scans = 0
+        self.rows = 0
+        self.first_time = self.last_time = None
+
+    @property
+    def watched_paths(self):
+        return set(self._by_path) | {path for path in (self.landmark_path, self.heartbeat_path) if path}
+
+    # ---- Streaming ----
+    def add_capture(self, fname):
+        with CaptureReader(fname) as reader:
+            strings = reader.strings
+            watched = self.watched_paths
+            watched_ids = {i for i, string in enumerate(strings) if string in watched}
+            scan_time, scan = None, []
+            for chunk in reader.chunks:
+                mask = list(map(watched_ids.__contains__, chunk['path']))
+                self.rows += len(mask)
+                columns = [compress(chunk[name], mask) for name in
+                           ('capture_time', 'path', 'server_time', 'value', 'value_type', 'quality')]
+                for capture_time, path_id, server_time, value, value_type, quality in zip(*columns):
+                    if capture_time != scan_time and scan:
+                        self._scan(scan_time, scan)
+                        scan = []
+                    scan_time = capture_time
+                    if value_type == ERROR:
+                        scan.append((strings[path_id], server_time, strings[int(value)], False, True))
+                        continue
+                    if value_type == STR:
+                        value = strings[int(value)]
+                    elif value_type != FLOAT:
+                        value = bool(value) if value_type == BOOL else int(value) if value_type == INT else None
+                    scan.append((strings[path_id], server_time, value, strings[quality] == 'Good', False))
+            if scan:
+                self._scan(scan_time, scan)
+
+    def _scan(self, capture_time, rows):
+        """One scan's rows of (path, server time, value or error text, good quality, error)"""
+        self.scans += 1
+        if self.first_time is None:
+            self.first_time = capture_time
+        self.last_time = capture_time
+
+        # Initiators first, so a final element read in the same scan as the trip counts towards it
+        finals = []
+        for path, server_time, value, good, error in rows:
+            for interlock, indication in self._by_path.get(path, ()):
+                self._read(indication, value, good, error, server_time)
+                if not good:
+                    continue
+                if indication.role in ('initiator', 'both'):
+                    self._initiator(interlock, indication, value, server_time, capture_time)
+                if indication.role in ('final_element', 'both'):
+                    finals.append((interlock, indication, value, server_time))
+        for interlock, indication, value, server_time in finals:
+            trip = self._trips.get(interlock)
+            if trip is not None and indication in trip.pending and value == indication.expected_val_post:
+                trip.pending.discard(indication)
+                self.response_times[indication].append(max(0.0, server_time - trip.time))
+        for interlock, trip in list(self._trips.items()):
+            if not trip.pending or capture_time - trip.capture_time > self.trip_window:
+                self._finish_trip(interlock, trip)
+
+        if self.landmark_path or self.heartbeat_path:
+            self._integrity(capture_time, rows)
+
+    def _read(self, indication, value, good, error, server_time):
+        stats = self.stats[indication]
+        stats.reads += 1
+        if not good:
+            if error:
+                stats.errors += 1
+            else:
+                stats.bad_quality += 1
+            return
+        if value == indication.expected_val_pre:
+            stats.reached_pre = True
+        if value == indication.expected_val_post and not stats.reached_post:
+            stats.reached_post = True
+            stats.first_post = server_time
+
+    def _initiator(self, interlock, indication, value, server_time, capture_time):
+        was_at_pre = self._at_pre.get(indication)
+        self._at_pre[indication] = at_pre = value == indication.expected_val_pre
+        armed = all(self._at_pre.get(i, True) for i in self._initiators[interlock] if i is not indication)
+        if was_at_pre and not at_pre and armed and interlock not in self._trips:
+            self._trips[interlock] = _Trip(server_time, capture_time, set(self._finals[interlock]))
+
+    def _finish_trip(self, interlock, trip):
+        del self._trips[interlock]
+        for indication in trip.pending:
+            self.no_response[indication] += 1
+        self.trips[interlock].append((trip.time, not trip.pending))
+
+    def _integrity(self, capture_time, rows):
+        seen = False
+        for path, _, value, good, _ in rows:
+            if path == self.landmark_path:
+                seen = True
+                self._landmark_ok = good and value == self.expected_landmark_val
+            elif path == self.heartbeat_path:
+                seen = True
+                if good and (self._heartbeat is None or value != self._heartbeat[0]):
+                    self._heartbeat = (value, capture_time)
+        if not seen:
+            return
+        self.integrity_scans += 1
+        heartbeat_ok = self._heartbeat is not None and capture_time - self._heartbeat[1] <= OPCScanner.MAX_HB_DELTA
+        if self._landmark_ok and heartbeat_ok:
+            if self._degraded_since is not None:
+                self.degraded_seconds += capture_time - self._degraded_since
+                self._degraded_since = None
+            return
+        self.degraded_scans += 1
+        if self._degraded_since is None:
+            self._degraded_since = capture_time
+            self.degraded_episodes += 1
+
+    def finish(self):
+        """Close off trips and degraded periods still open at the end of the captures"""
+        for interlock, trip in list(self._trips.items()):
+            self._finish_trip(interlock, trip)
+        if self._degraded_since is not None:
+            self.degraded_seconds += self.last_time - self._degraded_since
+            self._degraded_since = self.last_time
+
+    # ---- Results ----
+    def never_reached(self, post=True):
+        """(interlock, indication) of indications never seen at expected_val_post (or expected_val_pre)"""
+        return [
+            (interlock, indication) for interlock in self.interlocks for indication in interlock.all_indications()
+            if not (self.stats[indication].reached_post if post else self.stats[indication].reached_pre)
+        ]
+
+    def summary(self):
+        self.finish()
+        all_responses = [t for times in self.response_times.values() for t in times]
+        return {
+            'scans': self.scans,
+            'rows': self.rows,
+            'span_s': round(self.last_time - self.first_time, 3) if self.scans else 0.0,
+            'never_reached_post': [f"{il.name}: {i.path}" for il, i in self.never_reached(post=True)],
+            'never_reached_pre': [f"{il.name}: {i.path}" for il, i in self.never_reached(post=False)],
+            'read_failures': {
+                f"{il.name}: {i.path}": {'errors': self.stats[i].errors, 'bad_quality': self.stats[i].bad_quality}
+                for il in self.interlocks for i in il.all_indications()
+                if self.stats[i].errors or self.stats[i].bad_quality
+            },
+            'trips': {il.name: {'count': len(trips), 'incomplete': sum(not complete for _, complete in trips)}
+                      for il, trips in self.trips.items()},
+            'response_times': distribution(all_responses),
+            'response_times_by_final_element': {
+                f"{il.name}: {i.path}": {'distribution': distribution(self.response_times[i]),
+                                         'no_response': self.no_response[i]}
+                for il in self.interlocks for i in self._finals[il]
+            },
+            'integrity': {
+                'scans': self.integrity_scans,
+                'degraded_scans': self.degraded_scans,
+                'degraded_episodes': self.degraded_episodes,
+                'degraded_s': round(self.degraded_seconds, 3),
+            },
+        }
+
+    def to_text(self, summary=None):
+        summary = summary or self.summary()
+        lines = [
+            "Proof test analytics",
+            f"{summary['scans']} scans ({summary['rows']} rows) over {summary['span_s']:.0f} s",
+            '',
+            f"Never reached expected_val_post ({len(summary['never_reached_post'])}):",
+            *(f"  {entry}" for entry in summary['never_reached_post']),
+            f"Never reached expected_val_pre ({len(summary['never_reached_pre'])}):",
+            *(f"  {entry}" for entry in summary['never_reached_pre']),
+            '',
+            "Read failures:",
+            *(f"  {entry}: {counts['errors']} errors, {counts['bad_quality']} bad quality"
+              for entry, counts in summary['read_failures'].items()),
+            '',
+            "Trips:",
+            *(f"  {name}: {trips['count']} ({trips['incomplete']} incomplete)"
+              for name, trips in summary['trips'].items()),
+            f"Response times (all final elements): {_format_distribution(summary['response_times'])}",
+            *(f"  {entry}: {_format_distribution(result['distribution'])}, no response to {result['no_response']}"
+              for entry, result in summary['response_times_by_final_element'].items()),
+            '',
+        ]
+        integrity = summary['integrity']
+        if integrity['scans']:
+            lines.append(f"Comms integrity: degraded in {integrity['degraded_scans']} of {integrity['scans']} scans, "
+                         f"{integrity['degraded_episodes']} episodes totalling {integrity['degraded_s']:.1f} s")
+        else:
+            lines.append("Comms integrity: not analysed (no integrity paths configured or captured)")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_distribution(dist):
+    if dist is None:
+        return "none"
+    return f"n={dist['count']} min {dist['min_s']} s, p50 {dist['p50_s']} s, p90 {dist['p90_s']} s, " \
+           f"max {dist['max_s']} s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interlocks', nargs='+', required=True, help="Interlock configuration files")
+    parser.add_argument('--captures', nargs='+', required=True, help="Scan capture files, oldest first")
+    parser.add_argument('--cfg', help="Connection configuration, for the comms integrity paths")
+    parser.add_argument('--trip-window', type=float, default=60.0,
+                        help="Seconds allowed for final elements to respond to a trip")
+    parser.add_argument('--report', help="File to write the text report to (default stdout)")
+    parser.add_argument('--json', help="File to write the summary to as JSON")
+    args = parser.parse_args(argv)
+
+    conn_cfg = None
+    if args.cfg:
+        with open(args.cfg, 'r') as fp:
+            conn_cfg = json.load(fp)
+    analysis = ProofTestAnalysis(load_interlocks(args.interlocks), conn_cfg, args.trip_window)
+    for fname in args.captures:
+        analysis.add_capture(fname)
+    summary = analysis.summary()
+
+    text = analysis.to_text(summary)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(text)
+    else:
+        print(text, end='')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
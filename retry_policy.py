@@ -0,0 +1,103 @@
+"""Policies controlling how OPC reads are retried, and a cache of paths known not to exist on the server"""
+from contextlib import contextmanager
+import threading
+import time
+
+UNKNOWN_ITEM_ID = "OLE error 0xc0040007"  # OPC_E_UNKNOWNITEMID - path does not exist on the server
+INVALID_ITEM_ID = "OLE error 0xc0040008"  # OPC_E_INVALIDITEMID - path is not even syntactically valid
+
+
+class _CycleState(threading.local):
+    deadline = None
+    depth = 0
+
+
+class RetryPolicy:
+    """
+    Exponential backoff between attempts, bounded both by a number of attempts and by an optional time budget shared by
+    every read within a scan cycle (see cycle()). Errors matching fatal_errors are never retried. Cycles are tracked per
+    thread, so one policy can be shared by e.g. a scan thread and a background reconnect.
+    """
+    FATAL_ERRORS = (UNKNOWN_ITEM_ID, INVALID_ITEM_ID)
+
+    def __init__(self, max_attempts=10, initial_delay=0.005, multiplier=2.0, max_delay=0.25, cycle_budget=None,
+                 fatal_errors=FATAL_ERRORS, clock=time.monotonic, sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay  # Seconds before the first retry
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.cycle_budget = cycle_budget  # Seconds available for retries per cycle; None for unlimited
+        self.fatal_errors = fatal_errors
+        self.clock = clock
+        self.sleep = sleep
+        self._cycle = _CycleState()
+
+    @contextmanager
+    def cycle(self):
+        """
+        Share one time budget between all reads made within the context. Nested cycles join the outermost one, so that
+        e.g. a scan loop can wrap a whole cycle while get_datapoints() also opens a cycle of its own.
+        """
+        cycle = self._cycle
+        if cycle.depth == 0 and self.cycle_budget is not None:
+            cycle.deadline = self.clock() + self.cycle_budget
+        cycle.depth += 1
+        try:
+            yield self
+        finally:
+            cycle.depth -= 1
+            if cycle.depth == 0:
+                cycle.deadline = None
+
+    def is_fatal(self, exc):
+        """True for errors that no amount of retrying will fix"""
+        return any(error in str(exc) for error in self.fatal_errors)
+
+    def delay(self, retry):
+        """Seconds to wait before the given retry (1 for the first retry)"""
+        return min(self.max_delay, self.initial_delay * self.multiplier ** (retry - 1))
+
+    def attempts(self):
+        """
+        Yield attempt numbers (starting at 1), sleeping between them as required. The first attempt is always made; later
+        ones stop once max_attempts is reached or waiting would run past the cycle's time budget.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                delay = self.delay(attempt - 1)
+                deadline = self._cycle.deadline
+                if deadline is not None and self.clock() + delay > deadline:
+                    return
+                self.sleep(delay)
+            yield attempt
+
+
+class NegativeCache:
+    """Remembers paths proven not to exist for ttl seconds, so they aren't requested from the server again meanwhile"""
+
+    def __init__(self, ttl=300, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._expiries = {}  # path -> time at which path should be tried again
+
+    def add(self, path):
+        self._expiries[path] = self.clock() + self.ttl
+
+    def discard(self, path):
+        self._expiries.pop(path, None)
+
+    def clear(self):
+        """Forget everything - e.g. when the configuration is reloaded and paths may have been corrected"""
+        self._expiries.clear()
+
+    def __contains__(self, path):
+        expiry = self._expiries.get(path)
+        if expiry is None:
+            return False
+        if self.clock() >= expiry:
+            del self._expiries[path]
+            return False
+        return True
+
+    def __len__(self):
+        return len(self._expiries)
@@ -0,0 +1,356 @@
+"""
+Compact binary capture of scan results, and a client that replays a capture in place of OpenOPC.client.
+
+A capture file is a header followed by a stream of appended records, so recording never rewrites what is already on
+disk and a capture can be read while it is still growing. Two record types exist:
+
+- 'S' (strings): new entries for the file's string table, which is shared by everything after it. Paths, datatypes,
+  qualities, string values and error text are stored once in the table and referred to by index.
+- 'C' (chunk): a block of rows stored column by column - capture time, server time, value, then the string index and
+  integer columns - so columns can be read straight out of a memory-mapped file without unpacking row by row.
+"""
+from array import array
+from datetime import datetime, timezone
+import mmap
+import os
+import struct
+import time
+
+from fake_opc import FakeOPCClient
+
+MAGIC = b'ILCAP\x00\x01\x00'
+STRINGS_RECORD = b'S'
+CHUNK_RECORD = b'C'
+RECORD_HEADER = struct.Struct('<cxxxI')  # Record type, then row/string count
+
+# Value type codes, held in the value_type column
+NONE, BOOL, INT, FLOAT, STR, ERROR = range(6)
+
+# (name, array typecode) of each chunk column, in file order - 8 byte columns first to keep every column aligned
+COLUMNS = [
+    ('capture_time', 'd'),  # Seconds since epoch that the scan was recorded
+    ('server_time', 'd'),  # DataPoint.utc_timestamp, or NaN for errors
+    ('value', 'd'),  # Numeric value, or string table index for STR and ERROR
+    ('path', 'I'),  # String table index
+    ('datatype', 'I'),  # String table index
+    ('quality', 'I'),  # String table index
+    ('conn_status', 'i'),
+    ('required_attempts', 'I'),
+    ('value_type', 'B'),
+]
+
+
+def _padded(size):
+    return (size + 7) & ~7
+
+
+class CaptureWriter:
+    """
+    Appends scan results to a capture file, creating it if necessary. Rows are buffered and written as a chunk every
+    chunk_rows rows, or on flush()/close().
+    """
+
+    def __init__(self, fname, chunk_rows=4096):
+        self.fname = fname
+        self.chunk_rows = chunk_rows
+        self.string_ids = {}
+        if os.path.exists(fname) and os.path.getsize(fname) > 0:
+            with CaptureReader(fname) as reader:  # Continue the existing string table
+                self.string_ids = {string: i for i, string in enumerate(reader.strings)}
+            self.file = open(fname, 'ab')
+        else:
+            self.file = open(fname, 'wb')
+            self.file.write(MAGIC)
+        self._new_strings = []
+        self._columns = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.string_ids)
+            self._new_strings.append(string)
+        return string_id
+
+    def write_scan(self, datapoints, capture_time=None):
+        """Record a scan, given as a mapping of path to DataPoint or error, as returned by OPCScanner.get_datapoints()"""
+        if capture_time is None:
+            capture_time = time.time()
+        columns = self._columns
+        for path, dp in datapoints.items():
+            columns['capture_time'].append(capture_time)
+            columns['path'].append(self._string_id(path))
+            if hasattr(dp, 'utc_timestamp'):  # Anything else is an error
+                value = dp.value
+                if isinstance(value, bool):
+                    value_type, numeric = BOOL, float(value)
+                elif isinstance(value, int):
+                    value_type, numeric = INT, float(value)
+                elif isinstance(value, float):
+                    value_type, numeric = FLOAT, value
+                elif value is None:
+                    value_type, numeric = NONE, 0.0
+                else:
+                    value_type, numeric = STR, float(self._string_id(str(value)))
+                columns['server_time'].append(dp.utc_timestamp)
+                columns['datatype'].append(self._string_id(str(dp.canonical_datatype)))
+                columns['quality'].append(self._string_id(str(dp.quality)))
+                columns['conn_status'].append(dp.conn_status_int)
+                columns['required_attempts'].append(dp.required_attempts)
+            else:
+                value_type, numeric = ERROR, float(self._string_id(str(dp)))
+                columns['server_time'].append(float('nan'))
+                columns['datatype'].append(self._string_id(''))
+                columns['quality'].append(self._string_id('Error'))
+                columns['conn_status'].append(0)
+                columns['required_attempts'].append(0)
+            columns['value'].append(numeric)
+            columns['value_type'].append(value_type)
+
+        if len(columns['path']) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._new_strings:
+            self.file.write(RECORD_HEADER.pack(STRINGS_RECORD, len(self._new_strings)))
+            for string in self._new_strings:
+                encoded = string.encode('utf-8')
+                self.file.write(struct.pack('<I', len(encoded)))
+                self.file.write(encoded)
+            self.file.write(b'\x00' * (_padded(self.file.tell()) - self.file.tell()))
+            self._new_strings = []
+
+        rows = len(self._columns['path'])
+        if rows:
+            self.file.write(RECORD_HEADER.pack(CHUNK_RECORD, rows))
+            for name, typecode in COLUMNS:
+                data = self._columns[name].tobytes()
+                self.file.write(data)
+                self.file.write(b'\x00' * (_padded(len(data)) - len(data)))
+            self._columns = {name: array(typecode) for name, typecode in COLUMNS}
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class CaptureReader:
+    """
+    Memory-maps a capture file. Each entry of chunks is a dict of column name to a memoryview over the mapped file, so
+    column-wise processing costs no copying; rows() and scans() decode rows back into DataPoints.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.strings = []
+        self.chunks = []
+        self._file = open(fname, 'rb')
+        if os.path.getsize(fname) <= len(MAGIC):
+            self._mmap = None
+            return
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{fname} is not a scan capture file")
+        self._view = memoryview(self._mmap)
+        self._index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _index(self):
+        offset, end = len(MAGIC), len(self._mmap)
+        while offset + RECORD_HEADER.size <= end:
+            record_type, count = RECORD_HEADER.unpack_from(self._mmap, offset)
+            offset += RECORD_HEADER.size
+            if record_type == STRINGS_RECORD:
+                for i in range(count):
+                    length, = struct.unpack_from('<I', self._mmap, offset)
+                    self.strings.append(self._mmap[offset + 4:offset + 4 + length].decode('utf-8'))
+                    offset += 4 + length
+                offset = _padded(offset)
+            elif record_type == CHUNK_RECORD:
+                chunk = {}
+                for name, typecode in COLUMNS:
+                    size = count * array(typecode).itemsize
+                    if offset + size > end:
+                        return  # Chunk still being written - ignore it
+                    chunk[name] = self._view[offset:offset + size].cast(typecode)
+                    offset += _padded(size)
+                self.chunks.append(chunk)
+            else:
+                raise ValueError(f"Corrupt capture file {self.fname} at offset {offset}")
+
+    def close(self):
+        for chunk in self.chunks:
+            for column in chunk.values():
+                column.release()
+        self.chunks = []
+        if self._mmap is not None:
+            self._view.release()
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __len__(self):
+        return sum(len(chunk['path']) for chunk in self.chunks)
+
+    @property
+    def paths(self):
+        return sorted({self.strings[path_id] for chunk in self.chunks for path_id in set(chunk['path'])})
+
+    def _value(self, value_type, value):
+        if value_type == FLOAT:
+            return value
+        if value_type == BOOL:
+            return bool(value)
+        if value_type == INT:
+            return int(value)
+        if value_type == STR:
+            return self.strings[int(value)]
+        return None
+
+    def rows(self):
+        """Yield (capture_time, path, result) for every row, where result is a raw tag dict as used by ReplayOPCClient"""
+        strings = self.strings
+        for chunk in self.chunks:
+            for i in range(len(chunk['path'])):
+                value_type = chunk['value_type'][i]
+                if value_type == ERROR:
+                    result = {'error': strings[int(chunk['value'][i])]}
+                else:
+                    result = {
+                        'value': self._value(value_type, chunk['value'][i]),
+                        'quality': strings[chunk['quality'][i]],
+                        'timestamp': format_server_time(chunk['server_time'][i]),
+                        'datatype': strings[chunk['datatype'][i]],
+                        'conn_status': chunk['conn_status'][i],
+                        'required_attempts': chunk['required_attempts'][i],
+                    }
+                yield chunk['capture_time'][i], strings[chunk['path'][i]], result
+
+    def scans(self):
+        """Yield (capture_time, {path: DataPoint or error}) for each recorded scan, in recorded order"""
+        from opc_scanner import DataPoint  # Deferred to avoid a circular import via OPCScanner's replay support
+
+        current_time, scan = None, {}
+        for capture_time, path, result in self.rows():
+            if capture_time != current_time and scan:
+                yield current_time, scan
+                scan = {}
+            current_time = capture_time
+            if 'error' in result:
+                scan[path] = result['error']
+            else:
+                scan[path] = DataPoint(
+                    path, result['datatype'], result['value'], result['quality'], result['timestamp'],
+                    result['conn_status'], result['required_attempts']
+                )
+        if scan:
+            yield current_time, scan
+
+
+def format_server_time(epoch):
+    """Format seconds since epoch the way OpenOPC formats server timestamps"""
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(sep=' ')
+
+
+class ReplayOPCClient(FakeOPCClient):
+    """
+    Stand-in for OpenOPC.client which serves the values from a capture file, for use as OPCScanner's client.
+
+    With speed set, the capture plays against the wall clock (speed=2.0 plays twice as fast as recorded), starting when
+    connect() is called. With speed=None it plays as fast as possible - the next recorded scan is applied as soon as a
+    path already served from the current one is requested again, i.e. once per scan cycle of the reader.
+    Paths recorded as not existing disappear from the server until recorded as readable again. Rows are decoded from
+    the memory-mapped capture as they are needed, so captures of any size can be replayed.
+    """
+
+    def __init__(self, capture_fname, speed=1.0, loop=False, opc_class=None, client_name=None):
+        super().__init__(opc_class, client_name)
+        self.speed = speed
+        self.loop = loop
+        self.reader = CaptureReader(capture_fname)
+        self.replay_time = None  # Capture time of the most recently applied scan
+        self._wall_start = None
+        self._served = set()  # Paths successfully served since the last scan was applied, for speed=None
+        self._restart()
+
+    def _restart(self):
+        self._rows = self.reader.rows()
+        self._next_row = next(self._rows, None)
+        self._first_time = self._next_row[0] if self._next_row else None
+
+    @property
+    def finished(self):
+        return self._next_row is None
+
+    def connect(self, opc_server=None, opc_host='localhost'):
+        super().connect(opc_server, opc_host)
+        if self._wall_start is None:
+            self._wall_start = time.monotonic()
+            self.step()  # Always start with the first recorded scan in place
+
+    def step(self):
+        """Apply the next recorded scan to the served values"""
+        if self.finished:
+            if not self.loop or self._first_time is None:
+                return
+            self._restart()
+            self._wall_start = time.monotonic()
+
+        capture_time = self._next_row[0]
+        while self._next_row is not None and self._next_row[0] == capture_time:
+            _, path, result = self._next_row
+            if 'error' not in result:
+                self.set_value(path, result['value'], result['quality'], result['timestamp'], result['datatype'],
+                               result['conn_status'])
+            elif result['error'] == 'DoesNotExist':
+                self.remove_tag(path)
+            elif path in self.tags:
+                self.tags[path]['quality'] = 'Bad'
+            self._next_row = next(self._rows, None)
+        self.replay_time = capture_time
+        self._served.clear()
+
+    def _advance(self, paths):
+        if self._first_time is None:
+            return
+        if self.speed is None:
+            if not self._served.isdisjoint(paths):
+                self.step()
+            return
+        replay_time = self._first_time + (time.monotonic() - self._wall_start) * self.speed
+        while not self.finished and self._next_row[0] <= replay_time:
+            self.step()
+        if self.finished and self.loop:
+            self.step()
+
+    def properties(self, tags, id=None):
+        paths = [tags] if isinstance(tags, str) else tags
+        if self.connected:
+            self._advance(paths)
+        results = super().properties(tags, id)
+        self._served.update(paths)
+        return results
+
+    def read(self, tags=None, group=None, size=None, pause=0, source='hybrid', update=-1, timeout=5000, sync=False,
+             include_error=False, rebuild=False):
+        if tags is None:
+            paths = self._groups.get(group, [])
+        else:
+            paths = [tags] if isinstance(tags, str) else tags
+        if self.connected:
+            self._advance(paths)
+        results = super().read(tags, group, size, pause, source, update, timeout, sync, include_error, rebuild)
+        self._served.update(paths)
+        return results
@@ -0,0 +1,94 @@
+"""Fixed-deadline scheduling of cyclic scans, allowing different sets of paths to be scanned at different rates"""
+import logging
+import time
+
+DEFAULT_RANK_PERIODS = {0: 250}  # Scan period (ms) by Indication.rank - physical process indications are scanned fast
+DEFAULT_SURROGATE_PERIOD = 1000  # Scan period (ms) for any rank not in the rank periods (i.e. surrogate indications)
+
+
+def indication_period(indication, rank_periods=None, default_period=DEFAULT_SURROGATE_PERIOD):
+    """Determine scan period (ms) for an indication - its own scan_rate if configured, otherwise based on its rank"""
+    if indication.scan_rate is not None:
+        return indication.scan_rate
+    if rank_periods is None:
+        rank_periods = DEFAULT_RANK_PERIODS
+    return rank_periods.get(indication.rank, default_period)
+
+
+class ScanScheduler:
+    """
+    Run scans against a fixed deadline grid of base_period (ms), rather than sleeping a fixed time between scans - so the
+    scan's own duration doesn't stretch the period. Each scheduled key (e.g. an OPC group name) runs every whole number
+    of base periods, with periods rounded down so that nothing is ever scanned slower than requested - except periods
+shorter than the base period, which can only be scanned every base period (with a warning).
+
+    A cycle that finishes after the next deadline is an overrun. Overruns are logged, counted and passed to on_overrun;
+    the deadlines missed are skipped rather than run back-to-back, and anything due in them runs in the next cycle.
+    """
+
+    def __init__(self, base_period, on_overrun=None, clock=time.monotonic, sleep=time.sleep):
+        self.base_period = base_period
+        self.on_overrun = on_overrun  # Called as on_overrun(cycle_duration_s, missed_deadlines)
+        self.clock = clock
+        self.sleep = sleep
+        self.intervals = {}  # key -> number of base periods between scans
+        self.next_ticks = {}  # key -> tick at which key is next due
+        self.tick = 0
+        self.overruns = 0
+        self.missed_deadlines = 0
+        self.last_cycle_duration = None  # Seconds
+        self._stopped = False
+
+    def add(self, key, period):
+        """Schedule key to be scanned every period (ms). Returns the effective period after rounding to the base grid."""
+        if period < self.base_period:  # Can't be scanned faster than the grid
+            logging.warning(f"Scan period {period} ms for {key} is shorter than the {self.base_period} ms base period "
+                            f"- scanning every {self.base_period} ms instead")
+        interval = max(1, int(period // self.base_period))
+        self.intervals[key] = interval
+        self.next_ticks[key] = self.tick  # Due immediately
+        return interval * self.base_period
+
+    def remove(self, key):
+        self.intervals.pop(key, None)
+        self.next_ticks.pop(key, None)
+
+    def due(self):
+        """Keys due on the current tick, in the order they were added. Marks them as scanned."""
+        keys = [key for key, next_tick in self.next_ticks.items() if next_tick <= self.tick]
+        for key in keys:
+            self.next_ticks[key] = self.tick + self.intervals[key]
+        return keys
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self, scan, cycles=None):
+        """Call scan(due_keys) once per base period until stop() is called, or for a set number of cycles"""
+        base_s = self.base_period / 1000
+        deadline = self.clock()
+        completed = 0
+        self._stopped = False
+        while not self._stopped and (cycles is None or completed < cycles):
+            start = self.clock()
+            scan(self.due())
+            finish = self.clock()
+            self.last_cycle_duration = finish - start
+            completed += 1
+
+            deadline += base_s
+            self.tick += 1
+            if finish > deadline:
+                missed = int((finish - deadline) // base_s) + 1
+                deadline += missed * base_s
+                self.tick += missed
+                self.overruns += 1
+                self.missed_deadlines += missed
+                logging.warning(
+                    f"Scan overrun - cycle took {self.last_cycle_duration * 1000:.0f} ms against a "
+                    f"{self.base_period} ms period; skipped {missed} deadline(s)"
+                )
+                if self.on_overrun:
+                    self.on_overrun(self.last_cycle_duration, missed)
+
+            self.sleep(max(0.0, deadline - self.clock()))
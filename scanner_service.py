@@ -0,0 +1,419 @@
+"""
+Headless scanner service, so that one scan of the OPC server can serve any number of GUI viewers.
+
+The service scans the paths of its interlocks as the GUI would, keeping a versioned snapshot of the latest result for
+each path. Viewers connect over a local TCP socket and receive newline-delimited JSON messages:
+
+- {"type": "snapshot", "version": n, "data": {path: result, ...}} - every path, sent first to each new subscriber
+- {"type": "delta", "version": n, "data": {path: result, ...}} - paths changed in version n, relative to version n - 1
+
+where result is {"v": value, "q": quality, "t": server time (epoch seconds), "d": datatype, "c": conn status,
+"a": attempts} for a DataPoint, or {"e": text} for an error. A subscriber too slow to keep up has its backlog replaced
+with a fresh snapshot, so it always converges on the service's state.
+
+Run with:  python scanner_service.py cfg.json interlock1.json [interlock2.json ...]
+"""
+from collections import deque
+import json
+import logging
+import queue
+import socket
+import sys
+import threading
+import time
+
+from connection_manager import ConnectionManager
+from frontend.delta_publisher import dp_signature
+from ilock_config import load_interlocks
+import metrics
+from opc_scanner import DataPoint
+from scan_capture import format_server_time
+from scan_scheduler import ScanScheduler
+from tag_index import TagIndex
+
+DEFAULT_ADDRESS = ('127.0.0.1', 8765)
+
+
+def parse_address(address):
+    """'host:port' (or a (host, port) pair) as a (host, port) tuple"""
+    if isinstance(address, str):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return tuple(address)
+
+
+def _sync_groups(opc, scheduler, groups, wanted):
+    """
+    Bring the scan groups registered through opc, and scheduled in scheduler, into line with wanted (period -> paths).
+    groups (period -> paths registered) is updated in place. Groups whose paths are unchanged are left alone, so their
+    server-side groups and schedule carry on undisturbed. Returns the paths not previously in any group.
+    """
+    before = {path for paths in groups.values() for path in paths}
+    for period in [period for period in groups if period not in wanted]:
+        opc.unregister_group(f"scan @{period}ms")
+        scheduler.remove(f"scan @{period}ms")
+        del groups[period]
+    for period, paths in wanted.items():
+        if groups.get(period) == paths:
+            continue
+        opc.register_group(f"scan @{period}ms", paths, update_rate=period)
+        if period not in groups:
+            scheduler.add(f"scan @{period}ms", period)
+        groups[period] = paths
+    return [path for paths in wanted.values() for path in paths if path not in before]
+
+
+def scan_interlocks(opc, tag_index, run_freq, conn_cfg, on_results, on_cycle_end=None, cycles=None,
+                    metrics_registry=metrics.REGISTRY, reloads=None, on_reload=None):
+    """
+    Cyclically read every path of tag_index through opc (an OPCScanner or ConnectionManager), every run_freq ms.
+    Paths shared between interlocks are read once. Each distinct scan period gets its own OPC group of unique paths,
+    read only on the cycles it is due. on_results(datapoints) receives each group's results, and on_cycle_end() is
+    called once all of a cycle's groups are read. Runs forever unless a number of cycles is given.
+
+    reloads, if given, is a queue.Queue of (old interlock, new interlock) pairs - either may be None, to add or remove
+    an interlock. They are applied between cycles: tag_index is updated and only the scan groups whose paths changed
+    are registered again. on_reload(old, new), if given, is then called from the scan thread.
+
+    Cycle timing and comms integrity are recorded in metrics_registry, which is also written out as a Prometheus text
+    file every METRICS_INTERVAL seconds (default 15) if METRICS_FILE is configured.
+    """
+    rank_periods = {int(rank): period for rank, period in conn_cfg.get("SCAN_RATES_BY_RANK", {}).items()} or None
+    scheduler = ScanScheduler(run_freq)
+    groups = {}  # period -> paths registered for it
+    _sync_groups(opc, scheduler, groups, tag_index.paths_by_period(rank_periods))
+
+    integrity_group = "integrity"
+    opc.register_group(integrity_group, opc.integrity_paths, update_rate=opc.integrity_scan_period)
+    scheduler.add(integrity_group, opc.integrity_scan_period)
+
+    opc.retry_policy.cycle_budget = run_freq / 1000  # Retries must never hold a cycle past its period
+
+    metrics_registry.set('scan_target_period_seconds', run_freq / 1000)
+
+    def collect(registry):
+        registry.set('scan_overruns_total', scheduler.overruns)
+        registry.set('scan_missed_deadlines_total', scheduler.missed_deadlines)
+        if hasattr(opc, 'stats'):  # ConnectionManager
+            stats = opc.stats()
+            registry.set('opc_failovers_total', stats['failovers'])
+            registry.set('opc_outage_seconds', stats['current_outage'] or 0.0)
+
+    metrics_registry.add_collector(collect)
+    writer = None
+    if conn_cfg.get("METRICS_FILE"):
+        writer = metrics.PrometheusFileWriter(metrics_registry, conn_cfg["METRICS_FILE"],
+                                              conn_cfg.get("METRICS_INTERVAL", 15.0))
+        writer.start()
+
+    def apply_reloads():
+        while True:
+            try:
+                old, new = reloads.get_nowait()
+            except queue.Empty:
+                return
+            if old is not None:
+                tag_index.remove_interlock(old)
+            if new is not None:
+                tag_index.add_interlock(new)
+            try:
+                added = _sync_groups(opc, scheduler, groups, tag_index.paths_by_period(rank_periods))
+            except Exception as e:  # Never let a reload stop the scan - the groups are synced again on the next one
+                logging.exception(f"Error applying reload of {(new or old).name}: {e}")
+                added = []
+            for scanner in getattr(opc, 'scanners', [opc]):  # A path may have been created alongside the config
+                for path in added:
+                    scanner.missing_paths.discard(path)
+            logging.info(f"Reloaded {(new or old).name}: now scanning {len(tag_index)} paths in {len(groups)} groups")
+            if on_reload is not None:
+                on_reload(old, new)
+
+    def scan(group_names):
+        if reloads is not None:
+            apply_reloads()
+            group_names = [name for name in group_names if name == integrity_group or name in scheduler.intervals]
+        started = time.perf_counter()
+        with opc.retry_policy.cycle():
+            for group_name in group_names:
+                datapoints = opc.read_group(group_name)
+                if group_name == integrity_group:
+                    opc.update_integrity_markers(datapoints)
+                    try:
+                        integrity_ok = opc.get_comms_integrity()[0]
+                    except Exception:  # Not enough heartbeats collected yet
+                        integrity_ok = False
+                    metrics_registry.set('comms_integrity_ok', int(integrity_ok))
+                else:
+                    on_results(datapoints)
+        if on_cycle_end is not None:
+            on_cycle_end()
+        metrics_registry.observe('scan_cycle_seconds', time.perf_counter() - started)
+
+    try:
+        scheduler.run(scan, cycles)
+    finally:
+        metrics_registry.remove_collector(collect)
+        if writer is not None:
+            writer.stop()
+            writer.write()
+    return scheduler
+
+
+def encode_result(dp):
+    if isinstance(dp, DataPoint):
+        value = dp.value if isinstance(dp.value, (bool, int, float, str, type(None))) else str(dp.value)
+        return {'v': value, 'q': dp.quality, 't': dp.utc_timestamp, 'd': dp.canonical_datatype,
+                'c': dp.conn_status_int, 'a': dp.required_attempts}
+    return {'e': str(dp)}
+
+
+def decode_result(path, result):
+    if 'e' in result:
+        return result['e']
+    return DataPoint(path, result['d'], result['v'], result['q'], format_server_time(result['t']), result['c'],
+                     result['a'])
+
+
+class ChangeEncoder:
+    """Collects the encoded results of paths whose value, quality or conn status changed since they were last staged"""
+
+    def __init__(self):
+        self.signatures = {}  # path -> dp_signature of the last result staged
+        self.changes = {}  # path -> encoded result changed since the last take()
+
+    def stage(self, datapoints):
+        for path, dp in datapoints.items():
+            signature = dp_signature(dp)
+            if self.signatures.get(path, ()) != signature:
+                self.signatures[path] = signature
+                self.changes[path] = encode_result(dp)
+
+    def take(self):
+        changes, self.changes = self.changes, {}
+        return changes
+
+
+class _Subscriber:
+    """One connected viewer, with its own writer thread so a slow viewer never holds up the scan"""
+
+    def __init__(self, service, sock, address):
+        self.service = service
+        self.sock = sock
+        self.address = address
+        self.backlog = deque()  # Encoded messages not yet sent
+        self.ready = threading.Condition()
+        self.closed = False
+        threading.Thread(target=self._write_loop, name=f"subscriber {address}", daemon=True).start()
+
+    def send(self, message, snapshot):
+        """Queue an encoded message - or if the subscriber has fallen behind, replace its backlog with snapshot()"""
+        with self.ready:
+            if len(self.backlog) >= self.service.max_backlog:
+                self.backlog.clear()
+                self.backlog.append(snapshot())
+                self.service.resyncs += 1
+            else:
+                self.backlog.append(message)
+            self.ready.notify()
+
+    def _write_loop(self):
+        try:
+            while True:
+                with self.ready:
+                    while not self.backlog and not self.closed:
+                        self.ready.wait()
+                    if self.closed:
+                        return
+                    message = self.backlog.popleft()
+                self.sock.sendall(message)
+        except OSError as e:
+            logging.info(f"Subscriber {self.address} disconnected: {e}")
+        finally:
+            self.service._drop(self)
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ScannerService:
+    """
+    Scans interlocks through a ConnectionManager (or the given opc) and publishes results to subscribers on address.
+    Use start() to run in background threads, or serve_forever() to block. Port 0 picks a free port - see address.
+    """
+
+    def __init__(self, conn_cfg, interlocks, run_freq=250, address=DEFAULT_ADDRESS, opc=None, max_backlog=100):
+        self.conn_cfg = conn_cfg
+        self.tag_index = TagIndex(interlocks)
+        self.run_freq = run_freq
+        self.opc = opc if opc is not None else ConnectionManager(conn_cfg)
+        self.max_backlog = max_backlog  # Messages queued for a subscriber before it is resynchronised by snapshot
+        self.version = 0
+        self.snapshot = {}  # path -> encoded result, as of self.version
+        self.resyncs = 0
+        self._encoder = ChangeEncoder()
+        self._subscribers = []
+        self._lock = threading.Lock()  # Guards snapshot/version against subscribers joining mid-publish
+        self._listener = socket.create_server(parse_address(address))
+        self.address = self._listener.getsockname()[:2]
+
+    def start(self):
+        try:
+            self.opc.connect()
+        except Exception as e:  # Lost hosts are retried in the background - serve errors until one comes back
+            logging.exception("Exception encountered: " + str(e))
+        self.accept_subscribers()
+        threading.Thread(target=self.scan, name="scanner service scan", daemon=True).start()
+
+    def accept_subscribers(self):
+        """Start accepting subscribers in the background"""
+        threading.Thread(target=self._accept_loop, name="scanner service accept", daemon=True).start()
+
+    def serve_forever(self):
+        self.start()
+        while True:
+            time.sleep(3600)
+
+    def scan(self, cycles=None):
+        return scan_interlocks(self.opc, self.tag_index, self.run_freq, self.conn_cfg, self.stage, self.publish,
+                               cycles)
+
+    def stage(self, datapoints):
+        self._encoder.stage(datapoints)
+
+    def publish(self):
+        """Make the current cycle's changes a new version, and send them to every subscriber"""
+        changes = self._encoder.take()
+        if not changes:
+            return
+        with self._lock:
+            self.version += 1
+            self.snapshot.update(changes)
+            metrics.REGISTRY.set('service_version', self.version)
+            metrics.REGISTRY.set('service_subscribers', len(self._subscribers))
+            metrics.REGISTRY.set('service_resyncs_total', self.resyncs)
+            message = self._encode('delta', changes)
+            snapshot = self._snapshot_encoder()
+            for subscriber in list(self._subscribers):
+                subscriber.send(message, snapshot)
+
+    def _encode(self, kind, data):
+        return (json.dumps({'type': kind, 'version': self.version, 'data': data}) + '\n').encode('utf-8')
+
+    def _snapshot_encoder(self):
+        """Callable encoding the current snapshot on first use only, so that it is built at most once per publish"""
+        encoded = []
+
+        def encode():
+            if not encoded:
+                encoded.append(self._encode('snapshot', self.snapshot))
+            return encoded[0]
+        return encode
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except OSError:
+                return  # Listener closed
+            with self._lock:
+                subscriber = _Subscriber(self, sock, address)
+                snapshot = self._snapshot_encoder()
+                subscriber.send(snapshot(), snapshot)  # Late joiners start from a snapshot
+                self._subscribers.append(subscriber)
+            logging.info(f"Subscriber connected from {address}")
+
+    def _drop(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        subscriber.close()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def close(self):
+        self._listener.close()
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+        self.opc.close()
+
+
+class ScannerSubscriber:
+    """
+    Client of a ScannerService. on_update(results, full) is called from a background thread with a dict of path to
+    DataPoint or error - every path (full=True) after a snapshot, or only changed paths after a delta. If paths is
+    given, only those paths are passed on. The connection is re-established (with a fresh snapshot) if it drops or a
+    version is found to be missing.
+    """
+
+    def __init__(self, address, on_update, paths=None, retry_interval=2.0):
+        self.address = parse_address(address)
+        self.on_update = on_update
+        self.paths = set(paths) if paths is not None else None
+        self.retry_interval = retry_interval
+        self.version = None
+        self.snapshot = {}  # path -> DataPoint or error
+        self._stop = threading.Event()
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="scanner subscriber", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection(self.address) as self._sock:
+                    self._receive(self._sock.makefile('r', encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    logging.warning(f"Lost scanner service at {self.address[0]}:{self.address[1]}: {e}")
+            self.version = None
+            self._stop.wait(self.retry_interval)
+
+    def _receive(self, stream):
+        for line in stream:
+            message = json.loads(line)
+            if message['type'] == 'delta' and self.version is not None and message['version'] != self.version + 1:
+                raise ValueError(f"missed version(s) {self.version + 1}-{message['version'] - 1}")
+            if message['type'] == 'delta' and self.version is None:
+                continue  # Not yet synchronised by a snapshot
+            results = {
+                path: decode_result(path, result) for path, result in message['data'].items()
+                if self.paths is None or path in self.paths
+            }
+            full = message['type'] == 'snapshot'
+            if full:
+                self.snapshot = results
+            else:
+                self.snapshot.update(results)
+            self.version = message['version']
+            if results or full:
+                self.on_update(results, full)
+
+    def close(self):
+        self._stop.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    with open(sys.argv[1], 'r') as fp:
+        cfg = json.load(fp)
+    service = ScannerService(cfg, load_interlocks(sys.argv[2:]), address=cfg.get("SCANNER_SERVICE", DEFAULT_ADDRESS))
+    logging.info(f"Scanner service listening on {service.address[0]}:{service.address[1]}")
+    service.serve_forever()
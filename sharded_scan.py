@@ -0,0 +1,275 @@
+"""
+Sharded scanning: interlocks split across worker processes, each with its own connection to its OPC host(s).
+
+A single scan thread is limited by the GIL and by waiting on one DCOM call at a time. With "SHARDS" or "SHARD_COUNT" in
+the connection configuration, ShardedScanner instead runs one process per shard. Each worker scans its interlocks with
+scan_interlocks() through its own ConnectionManager, and at the end of every cycle sends the paths that changed back to
+the parent over a pipe. The parent merges the workers' cycles into one stream, ordered by the time each cycle ended, and
+restarts any worker that exits or stops reporting.
+
+"SHARDS" lists one dict per shard, of connection settings overriding the top-level ones (e.g. a different "OPC_HOST"
+per plant area) plus optionally "NAME" and "INTERLOCKS", the names of interlocks to scan there. Interlocks not listed
+are balanced across the shards without an "INTERLOCKS" list. "SHARD_COUNT" instead makes that many identical shards of
+the top-level settings, balanced by number of unique paths.
+"""
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import time
+
+from connection_manager import ConnectionManager
+import metrics
+from scanner_service import ChangeEncoder, decode_result, scan_interlocks
+from tag_index import TagIndex
+
+SHARD_KEYS = ("SHARDS", "SHARD_COUNT")  # Top-level settings that are not passed down to the workers
+
+
+def _balance(interlocks, bins):
+    """Add each interlock to whichever of bins ([name, interlocks, paths]) has the fewest unique paths so far"""
+    for interlock in sorted(interlocks, key=lambda il: -len({i.path for i in il.all_indications()})):
+        target = min(bins, key=lambda b: len(b[2]))
+        target[1].append(interlock)
+        target[2].update(indication.path for indication in interlock.all_indications())
+
+
+def plan_shards(conn_cfg, interlocks):
+    """
+    Split interlocks into shards according to conn_cfg's SHARDS or SHARD_COUNT, returning a list of
+    (name, shard conn_cfg, interlocks) with empty shards left out. Raises ValueError for an unusable plan.
+    """
+    base_cfg = {key: value for key, value in conn_cfg.items() if key not in SHARD_KEYS}
+    if conn_cfg.get("SHARDS"):
+        by_name = {interlock.name: interlock for interlock in interlocks}
+        plans, unassigned_bins, assigned = [], [], set()
+        for n, shard in enumerate(conn_cfg["SHARDS"]):
+            name = str(shard.get("NAME", f"shard{n}"))
+            overrides = {key: value for key, value in shard.items() if key not in ("NAME", "INTERLOCKS")}
+            shard_cfg = {**base_cfg, **overrides}
+            plan = [name, [], set(), shard_cfg]
+            plans.append(plan)
+            if "INTERLOCKS" not in shard:
+                unassigned_bins.append(plan)
+                continue
+            for interlock_name in shard["INTERLOCKS"]:
+                if interlock_name not in by_name:
+                    raise ValueError(f"Shard {name} lists interlock {interlock_name!r}, which is not loaded")
+                if interlock_name in assigned:
+                    raise ValueError(f"Interlock {interlock_name!r} is listed by more than one shard")
+                assigned.add(interlock_name)
+                plan[1].append(by_name[interlock_name])
+                plan[2].update(indication.path for indication in by_name[interlock_name].all_indications())
+        unassigned = [interlock for interlock in interlocks if interlock.name not in assigned]
+        if unassigned and not unassigned_bins:
+            raise ValueError(f"Interlocks {[il.name for il in unassigned]} are not listed by any shard, and every "
+                             f"shard has an INTERLOCKS list")
+        if unassigned:
+            _balance(unassigned, unassigned_bins)
+    else:
+        count = int(conn_cfg.get("SHARD_COUNT", 1))
+        if count < 1:
+            raise ValueError(f"SHARD_COUNT must be at least 1, not {count}")
+        plans = [[f"shard{n}", [], set(), base_cfg] for n in range(count)]
+        _balance(interlocks, plans)
+
+    shards = []
+    for name, shard_interlocks, _, shard_cfg in plans:
+        if not shard_interlocks:
+            continue
+        shard_cfg = {key: value for key, value in shard_cfg.items() if key != "METRICS_FILE"}  # Parent exports
+        if shard_cfg.get("HISTORY_FILE"):  # One history file per process
+            shard_cfg["HISTORY_FILE"] = f"{shard_cfg['HISTORY_FILE']}.{name}"
+        shards.append((name, shard_cfg, shard_interlocks))
+    return shards
+
+
+def _scan_worker(conn, shard, generation, conn_cfg, interlocks, run_freq, client_factory):
+    """
+    Worker process: scan one shard forever, sending (shard, generation, seq, end of cycle time, {path: encoded result})
+    over conn after every cycle - even with nothing changed, which doubles as a heartbeat. The first message of a
+    generation carries every path, so a restarted worker resynchronises the parent.
+    """
+    opc = ConnectionManager(conn_cfg, client_factory)
+    try:
+        opc.connect()
+    except Exception as e:  # Lost hosts are retried in the background
+        logging.exception(f"Shard {shard}: exception encountered: {e}")
+    encoder = ChangeEncoder()
+    seq = 0
+
+    def send():
+        nonlocal seq
+        conn.send((shard, generation, seq, time.time(), encoder.take()))
+        seq += 1
+
+    try:
+        scan_interlocks(opc, TagIndex(interlocks), run_freq, conn_cfg, encoder.stage, send)
+    except (BrokenPipeError, EOFError, KeyboardInterrupt):  # Parent gone, or stopping
+        pass
+    finally:
+        opc.close()
+
+
+class _Shard:
+    __slots__ = ('name', 'conn_cfg', 'interlocks', 'process', 'conn', 'generation', 'last_seen', 'last_seq',
+                 'restarts', 'cycles')
+
+    def __init__(self, name, conn_cfg, interlocks):
+        self.name = name
+        self.conn_cfg = conn_cfg
+        self.interlocks = interlocks
+        self.process = None
+        self.conn = None
+        self.generation = 0
+        self.last_seen = None  # clock() at the last message, or at the last (re)start
+        self.last_seq = -1
+        self.restarts = 0
+        self.cycles = 0
+
+
+class ShardedScanner:
+    """
+    Runs a worker process per shard of plan_shards() and merges their results. Call start(), then poll() repeatedly
+    (or run() to do both until stop()). A worker that exits, or sends nothing for health_timeout seconds, is restarted.
+
+    client_factory(use_alt_host), if given, is passed to each worker's ConnectionManager; with the spawn start method it
+    must be picklable. context is a multiprocessing context, defaulting to the platform's.
+    """
+
+    def __init__(self, conn_cfg, interlocks, run_freq=250, client_factory=None, health_timeout=30.0, context=None,
+                 clock=time.monotonic):
+        self.run_freq = run_freq
+        self.client_factory = client_factory
+        self.health_timeout = health_timeout
+        self.context = context if context is not None else multiprocessing.get_context()
+        self.clock = clock
+        self.shards = [_Shard(*plan) for plan in plan_shards(conn_cfg, interlocks)]
+        self.snapshot = {}  # path -> latest DataPoint or error, merged from every shard
+        self.lost_cycles = 0  # Cycles missing from a worker's sequence, e.g. when it was restarted
+        self._stop = False
+
+    def start(self):
+        for shard in self.shards:
+            self._start_worker(shard)
+
+    def _start_worker(self, shard):
+        receiver, sender = self.context.Pipe(duplex=False)
+        shard.generation += 1
+        shard.process = self.context.Process(
+            target=_scan_worker, name=f"scan {shard.name}", daemon=True,
+            args=(sender, shard.name, shard.generation, shard.conn_cfg, shard.interlocks, self.run_freq,
+                  self.client_factory),
+        )
+        shard.process.start()
+        sender.close()  # Only the worker writes; the parent sees EOF if it dies
+        shard.conn = receiver
+        shard.last_seen = self.clock()
+        shard.last_seq = -1
+
+    def _stop_worker(self, shard):
+        if shard.process is not None and shard.process.is_alive():
+            shard.process.terminate()
+            shard.process.join(timeout=5)
+        if shard.conn is not None:
+            shard.conn.close()
+        shard.process = shard.conn = None
+
+    def poll(self, timeout=None):
+        """
+        Wait up to timeout seconds for workers' cycles, returning them merged in order of the time each ended, as a
+        list of (shard name, {path: DataPoint or error}) with only changed paths included. Updates self.snapshot.
+        """
+        by_conn = {shard.conn: shard for shard in self.shards if shard.conn is not None}
+        messages = []
+        for conn in wait(list(by_conn), timeout):
+            shard = by_conn[conn]
+            try:
+                while conn.poll():
+                    messages.append(conn.recv())
+            except (EOFError, OSError):  # Worker died; check_health() restarts it
+                conn.close()
+                shard.conn = None
+        messages.sort(key=lambda message: (message[3], message[0]))
+
+        shards = {shard.name: shard for shard in self.shards}
+        merged = []
+        now = self.clock()
+        for name, generation, seq, _, changes in messages:
+            shard = shards[name]
+            if generation != shard.generation:  # Left over from a worker since replaced
+                continue
+            self.lost_cycles += seq - shard.last_seq - 1
+            shard.last_seq = seq
+            shard.last_seen = now
+            shard.cycles += 1
+            datapoints = {path: decode_result(path, result) for path, result in changes.items()}
+            self.snapshot.update(datapoints)
+            merged.append((name, datapoints))
+        return merged
+
+    def check_health(self):
+        """Restart workers that have exited or gone silent, returning the names of those restarted"""
+        restarted = []
+        now = self.clock()
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            if shard.process.is_alive() and shard.conn is not None:
+                if now - shard.last_seen < self.health_timeout:
+                    continue
+                reason = f"no results for {now - shard.last_seen:.1f} s"
+            else:
+                reason = f"worker exited with code {shard.process.exitcode}"
+            logging.warning(f"Restarting scan shard {shard.name}: {reason}")
+            self._stop_worker(shard)
+            self._start_worker(shard)
+            shard.restarts += 1
+            restarted.append(shard.name)
+        return restarted
+
+    def health(self):
+        now = self.clock()
+        return {
+            shard.name: {
+                'alive': shard.process is not None and shard.process.is_alive(),
+                'pid': shard.process.pid if shard.process is not None else None,
+                'interlocks': [interlock.name for interlock in shard.interlocks],
+                'cycles': shard.cycles,
+                'restarts': shard.restarts,
+                'silent_for': now - shard.last_seen if shard.last_seen is not None else None,
+            }
+            for shard in self.shards
+        }
+
+    def collect_metrics(self, registry):
+        now = self.clock()
+        for shard in self.shards:
+            alive = shard.process is not None and shard.process.is_alive()
+            registry.set('shard_up', int(alive), shard=shard.name)
+            registry.set('shard_restarts_total', shard.restarts, shard=shard.name)
+            registry.set('shard_silent_seconds', now - shard.last_seen if shard.last_seen is not None else 0.0,
+                         shard=shard.name)
+        registry.set('shard_lost_cycles_total', self.lost_cycles)
+
+    def run(self, on_results, on_cycle_end=None, metrics_registry=metrics.REGISTRY):
+        """
+        Start the workers and pass each merged shard cycle's changes to on_results(datapoints), calling on_cycle_end()
+        after every batch of cycles received together, until stop() is called.
+        """
+        metrics_registry.add_collector(self.collect_metrics)
+        self.start()
+        try:
+            while not self._stop:
+                for _, datapoints in self.poll(timeout=self.run_freq / 1000):
+                    on_results(datapoints)
+                if on_cycle_end is not None:
+                    on_cycle_end()
+                self.check_health()
+        finally:
+            metrics_registry.remove_collector(self.collect_metrics)
+            self.stop()
+
+    def stop(self):
+        self._stop = True
+        for shard in self.shards:
+            self._stop_worker(shard)
@@ -0,0 +1,52 @@
+"""Shared index of OPC paths across many interlocks, so that a path used by several of them is only read once"""
+from scan_scheduler import DEFAULT_SURROGATE_PERIOD, indication_period
+
+
+class TagIndex:
+    """
+    Maps each unique OPC path to every (interlock, indication) pair using it. Scanning is driven from the unique paths,
+    and each result is then fanned out to all of the path's subscribers.
+    """
+
+    def __init__(self, interlocks=()):
+        self.interlocks = []
+        self.subscribers = {}  # path -> [(interlock, indication), ...]
+        for interlock in interlocks:
+            self.add_interlock(interlock)
+
+    def add_interlock(self, interlock):
+        self.interlocks.append(interlock)
+        for indication in interlock.all_indications():
+            self.subscribers.setdefault(indication.path, []).append((interlock, indication))
+
+    def remove_interlock(self, interlock):
+        self.interlocks.remove(interlock)
+        for indication in interlock.all_indications():
+            subscribers = self.subscribers.get(indication.path, [])
+            subscribers[:] = [(i, ind) for i, ind in subscribers if ind is not indication]
+            if not subscribers:
+                self.subscribers.pop(indication.path, None)
+
+    @property
+    def paths(self):
+        return list(self.subscribers)
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def paths_by_period(self, rank_periods=None, default_period=DEFAULT_SURROGATE_PERIOD):
+        """
+        Split unique paths into lists sharing the same scan period (ms), as a dict of period -> paths. A path shared by
+        indications wanting different periods is scanned at the fastest of them.
+        """
+        by_period = {}
+        for path, subscribers in self.subscribers.items():
+            period = min(indication_period(indication, rank_periods, default_period) for _, indication in subscribers)
+            by_period.setdefault(period, []).append(path)
+        return by_period
+
+    def fan_out(self, datapoints):
+        """Yield (interlock, indication, result) for every subscriber of each path in a path -> result mapping"""
+        for path, dp in datapoints.items():
+            for interlock, indication in self.subscribers.get(path, ()):
+                yield interlock, indication, dp
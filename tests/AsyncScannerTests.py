@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from async_scanner import INTEGRITY_GROUP, AsyncOPCScanner, merge_scans
+from fake_opc import FakeOPCClient
+from opc_scanner import DataPoint
+from tests.helpers import FAILOVER_CONN_CFG as CONN_CFG
+
+PATHS = [f"XV-{n}/CLOSED.CV" for n in range(8)]
+SLOW_PATH = PATHS[0]
+
+
+class SlowClient(FakeOPCClient):
+    """Takes delay seconds to answer any call involving SLOW_PATH"""
+    delay = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_on = threading.current_thread()
+        self.closed_on = None
+
+    def properties(self, tags, id=None):
+        if SLOW_PATH in ([tags] if isinstance(tags, str) else tags):
+            time.sleep(self.delay)
+        return super().properties(tags, id)
+
+    def close(self, del_object=True):
+        self.closed_on = threading.current_thread()
+        super().close(del_object)
+
+
+class AsyncScannerTests(unittest.TestCase):
+    def setUp(self):
+        self.clients = []
+        self.client_lock = threading.Lock()
+
+    def make_client(self, use_alt_host, delay=0.0):
+        client = SlowClient()
+        client.delay = delay
+        for n, path in enumerate(PATHS):
+            client.set_value(path, n)
+        client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        with self.client_lock:
+            self.clients.append(client)
+        return client
+
+    def run_async(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+    def test_get_datapoints_on_separate_connections(self):
+        async def read():
+            async with AsyncOPCScanner(CONN_CFG, client_factory=self.make_client, max_workers=4) as opc:
+                return await opc.get_datapoints(PATHS), await opc.get_datapoint(PATHS[3]), len(opc.scanners)
+
+        results, single, connections = self.run_async(read())
+        self.assertEqual([dp.value for dp in results.values()], list(range(len(PATHS))))
+        self.assertEqual(single.value, 3)
+        self.assertLessEqual(connections, 4)  # Only as many as were needed at once
+
+    def test_slow_path_times_out_alone(self):
+        async def read():
+            opc = AsyncOPCScanner(CONN_CFG, client_factory=lambda alt: self.make_client(alt, delay=1.0), timeout=0.2)
+            started = time.monotonic()
+            results = await opc.get_datapoints(PATHS)
+            elapsed = time.monotonic() - started
+            opc.close()
+            return results, elapsed
+
+        results, elapsed = self.run_async(read())
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(results[SLOW_PATH], "Timed out after 0.2 s")
+        self.assertTrue(all(isinstance(results[path], DataPoint) for path in PATHS[2:]))
+
+    def test_hung_read_ties_up_one_worker(self):
+        async def read():
+            opc = AsyncOPCScanner(CONN_CFG, client_factory=lambda alt: self.make_client(alt, delay=1.0), max_workers=2)
+            hung = [await opc.get_datapoint(SLOW_PATH, timeout=0.05) for _ in range(4)]
+            busy = opc._pending[:]
+            started = time.monotonic()
+            results = await opc.get_datapoints(PATHS[1:], timeout=0.5)
+            elapsed = time.monotonic() - started
+            opc.close()
+            return hung, busy, results, elapsed
+
+        hung, busy, results, elapsed = self.run_async(read())
+        self.assertEqual(hung, ["Timed out after 0.05 s"] * 4)
+        self.assertEqual(sorted(busy), [0, 1])  # Later reads waited on the first, rather than resubmitting
+        self.assertLess(elapsed, 0.5)
+        self.assertTrue(all(isinstance(dp, DataPoint) for dp in results.values()))
+
+    def test_closed_on_creating_thread(self):
+        async def read():
+            opc = AsyncOPCScanner(CONN_CFG, client_factory=self.make_client, max_workers=2)
+            await asyncio.gather(opc.get_datapoints(PATHS), opc.update_integrity_markers())
+            return opc
+
+        opc = self.run_async(read())
+        opc.close(wait=True)
+        self.assertGreaterEqual(len(self.clients), 2)
+        for client in self.clients:
+            self.assertIs(client.closed_on, client.created_on)
+            self.assertIsNot(client.closed_on, threading.main_thread())
+
+    def test_scan_groups_and_integrity_concurrently(self):
+        groups = {"fast": (PATHS[:4], 10), "slow": (PATHS[4:], 50)}
+
+        async def scan():
+            seen = []
+            async with AsyncOPCScanner(CONN_CFG, client_factory=self.make_client) as opc:
+                async for result in opc.scan(groups):
+                    seen.append(result.group)
+                    if seen.count("slow") == 2 and INTEGRITY_GROUP in seen:
+                        break
+                return seen, opc.get_comms_integrity()
+
+        seen, integrity = self.run_async(scan())
+        self.assertGreater(seen.count("fast"), seen.count("slow"))
+        self.assertFalse(integrity[0])  # Heartbeat never changes in the fake
+        self.assertIn("heartbeat", integrity[1])
+
+    def test_merge_hosts(self):
+        async def scan():
+            primary = AsyncOPCScanner(CONN_CFG, client_factory=self.make_client)
+            alternate = AsyncOPCScanner(CONN_CFG, use_alt_host=True, client_factory=self.make_client)
+            hosts = set()
+            try:
+                async for result in merge_scans(primary.scan({"g": (PATHS, 10)}), alternate.scan({"g": (PATHS, 10)})):
+                    hosts.add(result.host)
+                    if len(hosts) == 2:
+                        break
+            finally:
+                primary.close()
+                alternate.close()
+            return hosts
+
+        self.assertEqual(self.run_async(scan()), {"fake-host", "fake-host-alt"})
+
+
+if __name__ == '__main__':
+    unittest.main()
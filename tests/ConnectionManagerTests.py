@@ -0,0 +1,158 @@
+from datetime import datetime, timezone
+import threading
+import unittest
+
+from connection_manager import ConnectionManager
+from fake_opc import FakeOPCClient
+from retry_policy import RetryPolicy
+from tests.helpers import FAILOVER_CONN_CFG
+
+CONN_CFG = dict(FAILOVER_CONN_CFG, OPC_HOST="primary", OPC_HOST_ALT="alternate")
+PATHS = [f"XV-{n}/CLOSED.CV" for n in range(3)]
+
+
+class ConnectionManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.clients = {False: FakeOPCClient(), True: FakeOPCClient()}
+        for client in self.clients.values():
+            for path in PATHS:
+                client.set_value(path, False)
+            client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        self.now = 0.0
+        self.manager = ConnectionManager(CONN_CFG, client_factory=self.clients.get, reconnect_interval=3600,
+                                         retry_policy=RetryPolicy(max_attempts=2, initial_delay=0),
+                                         clock=lambda: self.now)
+        self.manager.connect()
+        self.manager.register_group('ilock', PATHS)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def lose_primary(self):
+        self.clients[False].drop_connection()
+        self.clients[False].refuse_connections = True
+
+    def test_groups_warm_on_both_hosts(self):
+        self.assertEqual(self.manager.active.opc_host, 'primary')
+        for client in self.clients.values():
+            self.assertIn('ilock', client.groups())
+
+    def test_failover_within_the_same_read(self):
+        self.manager.read_group('ilock')
+        self.lose_primary()
+        self.now = 1.0
+        results = self.manager.read_group('ilock')
+        self.assertEqual(self.manager.active.opc_host, 'alternate')
+        self.assertEqual([dp.value for dp in results.values()], [False] * len(PATHS))
+        stats = self.manager.stats()
+        self.assertEqual((stats['failovers'], stats['hosts_down'], stats['current_outage']), (1, ['primary'], None))
+        self.assertEqual((stats['failover_times'], stats['outage_times']), ([0.0], [0.0]))
+
+    def test_failback_after_primary_reconnects(self):
+        self.lose_primary()
+        self.manager.read_group('ilock')
+        self.manager.reconnect()  # Still refused
+        self.assertEqual(self.manager.active.opc_host, 'alternate')
+        self.clients[False].refuse_connections = False
+        self.manager.reconnect()
+        self.assertEqual(self.manager.active.opc_host, 'primary')
+        self.assertIn('ilock', self.clients[False].groups())  # Groups re-registered on reconnect
+
+    def test_groups_changed_while_host_down(self):
+        self.lose_primary()
+        self.manager.read_group('ilock')
+        calls = []
+        self.clients[False].read = lambda *args, **kwargs: calls.append(args)
+        self.clients[False].remove = lambda *args, **kwargs: calls.append(args)
+        self.manager.register_group('g2', PATHS[:1])
+        self.manager.unregister_group('ilock')
+        self.assertEqual(calls, [])  # The down host's client is left alone until it reconnects
+        del self.clients[False].read, self.clients[False].remove
+        self.clients[False].refuse_connections = False
+        self.manager.reconnect()
+        self.assertIn('g2', self.clients[False].groups())
+        self.assertEqual(self.manager.read_group('g2')[PATHS[0]].value, False)
+
+    def test_outage_measured_when_no_host_available(self):
+        self.lose_primary()
+        self.clients[True].drop_connection()
+        self.clients[True].refuse_connections = True
+        self.manager.read_group('ilock')
+        self.now = 5.0
+        self.assertEqual(self.manager.stats()['current_outage'], 5.0)
+        self.clients[True].refuse_connections = False
+        self.manager.reconnect()
+        self.now = 7.5
+        self.manager.read_group('ilock')
+        self.assertEqual(self.manager.outage_times, [7.5])
+
+    def test_failover_on_bad_integrity(self):
+        for n in range(2):
+            for client in self.clients.values():
+                client.set_value(CONN_CFG["HEARTBEAT_PATH"], n,
+                                 timestamp=client.timestamp_str(datetime.now(timezone.utc)))
+            self.manager.update_integrity_markers()
+            self.now += 1.0  # Standby checks are rate limited
+        self.assertEqual(self.manager.active.opc_host, 'primary')
+        self.clients[False].set_value(CONN_CFG["LANDMARK_PATH"], 0)  # Primary serving wrong data
+        self.manager.update_integrity_markers()
+        self.assertEqual(self.manager.active.opc_host, 'alternate')
+        self.assertEqual(self.manager.stats()['hosts_down'], [])  # Kept connected as the standby
+
+
+    def test_standby_checked_by_group_read_and_rate_limited(self):
+        self.manager.register_group('integrity', self.manager.integrity_paths)
+        standby = self.clients[True]
+        for client in self.clients.values():
+            client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        properties = standby.calls['properties']
+        reads = standby.calls['read']
+        for _ in range(4):  # Four integrity cycles within one check interval
+            self.manager.update_integrity_markers()
+            self.now += 0.2
+        self.assertEqual(standby.calls['properties'], properties)
+        self.assertEqual(standby.calls['read'], reads + 1)
+
+
+class ConnectionThreadingTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeOPCClient()
+        for path in PATHS:
+            self.client.set_value(path, False)
+        self.client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        self.client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        self.now = 0.0
+        cfg = {key: value for key, value in CONN_CFG.items() if key != "OPC_HOST_ALT"}
+        self.manager = ConnectionManager(cfg, client_factory=lambda alt: self.client, reconnect_interval=3600,
+                                         retry_policy=RetryPolicy(max_attempts=2, initial_delay=0),
+                                         clock=lambda: self.now)
+        self.manager.connect()
+        self.manager.register_group('ilock', PATHS)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_down_host_left_to_reconnector(self):
+        self.client.drop_connection()
+        self.client.refuse_connections = True
+        self.manager.read_group('ilock')
+        self.assertEqual(self.manager.stats()['hosts_down'], ['primary'])
+        calls = sum(self.client.calls.values())
+        results = self.manager.read_group('ilock')
+        self.manager.update_integrity_markers()
+        self.assertEqual(sum(self.client.calls.values()), calls)  # Client untouched outside the reconnect thread
+        self.assertEqual(set(results.values()), {"primary is down - reconnecting"})
+
+        self.client.refuse_connections = False
+        self.manager.reconnect()
+        self.assertEqual([dp.value for dp in self.manager.read_group('ilock').values()], [False] * len(PATHS))
+
+    def test_retry_cycles_kept_per_thread(self):
+        policy = RetryPolicy(cycle_budget=1.0, clock=lambda: self.now)
+        seen = []
+        with policy.cycle():
+            thread = threading.Thread(target=lambda: seen.append(policy._cycle.deadline))
+            thread.start()
+            thread.join()
+            self.assertEqual(policy._cycle.deadline, 1.0)
+        self.assertEqual(seen, [None])  # Another thread's reads aren't bound by this cycle's budget
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+from fake_opc import FakeOPCClient
+from opc_scanner import DataPoint, OPCScanner, parse_opc_timestamp
+from tests.helpers import CONN_CFG, make_dp
+
+
+class TimestampTests(unittest.TestCase):
+    def tearDown(self):
+        DataPoint.set_timezone(None)
+
+    def test_parse(self):
+        self.assertEqual(parse_opc_timestamp('2021-03-04 05:06:07+00:00', timezone.utc), datetime(2021, 3, 4, 5, 6, 7))
+        self.assertEqual(parse_opc_timestamp('2021-03-04 05:06:07', timezone.utc), datetime(2021, 3, 4, 5, 6, 7))
+        self.assertEqual(parse_opc_timestamp('2021-03-04 05:06:07+01:00', timezone.utc), datetime(2021, 3, 4, 4, 6, 7))
+
+    def test_zone_conversion_follows_daylight_saving(self):
+        DataPoint.set_timezone('America/Chicago')
+        winter = make_dp('XV-1/CLOSED.CV', True, timestamp='2021-01-15 12:00:00+00:00')
+        summer = make_dp('XV-1/CLOSED.CV', True, timestamp='2021-07-15 12:00:00+00:00')
+        self.assertEqual(winter.timestamp, datetime(2021, 1, 15, 6))  # CST
+        self.assertEqual(summer.timestamp, datetime(2021, 7, 15, 7))  # CDT
+
+    def test_utc_timestamp_independent_of_zone(self):
+        expected = datetime(2021, 7, 15, 12, tzinfo=timezone.utc).timestamp()
+        for zone in (None, 'America/Chicago', 'Pacific/Auckland'):
+            DataPoint.set_timezone(zone)
+            dp = make_dp('XV-1/CLOSED.CV', True, timestamp='2021-07-15 12:00:00+00:00')
+            self.assertEqual(dp.utc_timestamp, expected)
+            dp.timestamp  # Once parsed into the presentation zone
+            self.assertEqual(dp.utc_timestamp, expected)
+
+
+class IntegrityTests(unittest.TestCase):
+    def tearDown(self):
+        DataPoint.set_timezone(None)
+
+    def check_integrity(self, conn_cfg, heartbeat_age=0.0):
+        client = FakeOPCClient()
+        client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        opc = OPCScanner(conn_cfg, client=client)
+        opc.connect()
+        for value in (0, 1):
+            stamp = datetime.now(timezone.utc) - timedelta(seconds=heartbeat_age)
+            client.set_value(CONN_CFG["HEARTBEAT_PATH"], value, timestamp=client.timestamp_str(stamp))
+            opc.update_integrity_markers()
+        return opc.get_comms_integrity()
+
+    def test_good_in_any_zone(self):
+        for zone in ('UTC', 'America/Chicago', 'Pacific/Auckland'):
+            with self.subTest(zone=zone):
+                self.assertEqual(self.check_integrity(dict(CONN_CFG, TIMEZONE=zone)), (True, 'Good'))
+
+    def test_stale_heartbeat(self):
+        ok, status = self.check_integrity(dict(CONN_CFG, TIMEZONE='Pacific/Auckland'), heartbeat_age=60)
+        self.assertFalse(ok)
+        self.assertIn("too long since last recorded heartbeat values 60", status)
+
+
+if __name__ == '__main__':
+    unittest.main()
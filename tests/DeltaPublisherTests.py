@@ -0,0 +1,50 @@
+import unittest
+
+from frontend.delta_publisher import DeltaPublisher
+from interlock import Indication
+from tests.helpers import make_dp
+
+
+class DeltaPublisherTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.events = []
+        self.publisher = DeltaPublisher(lambda key, value: self.events.append(value), clock=lambda: self.now)
+        self.indications = [Indication(0, f"XV-{n}/CLOSED.CV", '', 'initiator', False, True) for n in range(3)]
+
+    def cycle(self, values):
+        for indication, value in zip(self.indications, values):
+            self.publisher.stage(indication, make_dp(indication.path, value))
+        return self.publisher.flush()
+
+    def test_one_event_per_cycle_with_only_changes(self):
+        self.assertEqual(self.cycle([False, False, False]), 3)
+        self.assertEqual(self.cycle([False, False, False]), 0)
+        self.assertEqual(self.cycle([False, True, False]), 1)
+        self.assertEqual(len(self.events), 2)
+        self.assertEqual([(i.path, dp.value) for i, dp in self.events[1]], [(self.indications[1].path, True)])
+
+    def test_errors_compared_too(self):
+        self.cycle([False, False, False])
+        self.publisher.stage(self.indications[0], 'DoesNotExist')
+        self.publisher.stage(self.indications[1], make_dp(self.indications[1].path, False, quality='Bad'))
+        self.assertEqual(self.publisher.flush(), 2)
+
+    def test_rate_limit_coalesces(self):
+        self.publisher.min_interval = 1.0
+        self.cycle([False, False, False])
+        self.now = 0.25
+        self.assertEqual(self.cycle([True, False, False]), 0)  # Held back
+        self.now = 0.5
+        self.assertEqual(self.cycle([True, True, False]), 0)
+        self.now = 1.0
+        self.assertEqual(self.cycle([True, True, False]), 2)
+        self.assertEqual(len(self.events), 2)
+
+    def test_change_reverted_before_send_is_dropped(self):
+        self.publisher.min_interval = 1.0
+        self.cycle([False, False, False])
+        self.now = 0.25
+        self.cycle([True, False, False])
+        self.now = 1.0
+        self.assertEqual(self.cycle([False, False, False]), 0)
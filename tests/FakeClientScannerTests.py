@@ -0,0 +1,198 @@
+import unittest
+
+import OpenOPC
+
+from fake_opc import FakeOPCClient
+from opc_scanner import DataPoint, OPCScanner
+from retry_policy import NegativeCache, RetryPolicy
+from tests.helpers import FAILOVER_CONN_CFG as CONN_CFG
+
+PATHS = [f"XV-{n}/CLOSED.CV" for n in range(5)]
+
+
+class FakeClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeOPCClient()
+        for path in PATHS:
+            self.client.set_value(path, False)
+        self.client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        self.client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        self.opc = OPCScanner(CONN_CFG, client=self.client, retry_policy=RetryPolicy(max_attempts=3, initial_delay=0))
+        self.opc.connect()
+
+    def tearDown(self):
+        self.opc.close()
+
+
+class FailingClient(FakeOPCClient):
+    """Fails any properties() call involving a path in failing, with that path's error; records the paths requested"""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+        self.requested = []
+
+    def properties(self, tags, id=None):
+        paths = [tags] if isinstance(tags, str) else list(tags)
+        self.requested.append(paths)
+        for path in paths:
+            if path in self.failing:
+                self.calls['properties'] += 1
+                raise OpenOPC.OPCError(self.failing[path])
+        return super().properties(tags, id)
+
+
+class BatchedReadTests(FakeClientTestCase):
+    def test_one_call_for_many_paths(self):
+        paths = [f"FIC-{n}/PV.CV" for n in range(200)]
+        for n, path in enumerate(paths):
+            self.client.set_value(path, float(n))
+        results = self.opc.get_datapoints(paths + paths[:10])  # Duplicates are read once
+        self.assertEqual(self.client.calls['properties'], 1)
+        self.assertEqual(list(results), paths)
+        self.assertEqual([dp.value for dp in results.values()], [float(n) for n in range(200)])
+
+    def test_missing_paths_not_requested(self):
+        client = FailingClient({})
+        for path in PATHS:
+            client.set_value(path, False)
+        opc = OPCScanner(CONN_CFG, client=client, retry_policy=RetryPolicy(max_attempts=3, initial_delay=0))
+        opc.connect()
+        opc.missing_paths.add('GONE/PV.CV')
+        results = opc.get_datapoints(['GONE/PV.CV'] + PATHS)
+        self.assertEqual(results['GONE/PV.CV'], 'DoesNotExist')
+        self.assertEqual(client.requested, [PATHS])
+
+    def test_per_path_errors(self):
+        client = FailingClient({PATHS[1]: "properties: Timeout waiting for server"})
+        for path in PATHS:
+            client.set_value(path, False)
+        client.set_value(PATHS[2], False, quality='Bad')
+        opc = OPCScanner(CONN_CFG, client=client, retry_policy=RetryPolicy(max_attempts=2, initial_delay=0))
+        opc.connect()
+        results = opc.get_datapoints(PATHS + ['NOT/A.PATH'])
+        self.assertEqual(client.requested[0], PATHS + ['NOT/A.PATH'])  # The batch, then individual reads
+        self.assertIn("Timeout waiting for server", str(results[PATHS[1]]))
+        self.assertEqual(results[PATHS[2]], "Item quality not good on final pass")
+        self.assertEqual(results['NOT/A.PATH'], 'DoesNotExist')
+        self.assertTrue(all(isinstance(results[path], DataPoint) for path in (PATHS[0], *PATHS[3:])))
+
+    def test_single_call_for_all_paths(self):
+        results = self.opc.get_datapoints(PATHS + self.opc.integrity_paths)
+        self.assertEqual(self.client.calls['properties'], 1)
+        self.assertEqual(list(results), PATHS + self.opc.integrity_paths)
+        self.assertTrue(all(isinstance(dp, DataPoint) for dp in results.values()))
+
+    def test_bad_path_isolated(self):
+        results = self.opc.get_datapoints(PATHS + ['NOT/A.PATH'])
+        self.assertEqual(results['NOT/A.PATH'], 'DoesNotExist')
+        self.assertTrue(all(isinstance(results[path], DataPoint) for path in PATHS))
+
+    def test_only_bad_quality_paths_retried(self):
+        self.client.set_value(PATHS[0], False, quality='Bad')
+        results = self.opc.get_datapoints(PATHS)
+        self.assertEqual(self.client.calls['properties'], self.opc.retry_policy.max_attempts)
+        self.assertNotIsInstance(results[PATHS[0]], DataPoint)
+        self.assertEqual(results[PATHS[1]].required_attempts, 1)
+
+
+class RetryPolicyTests(FakeClientTestCase):
+    def test_nonexistent_path_fails_fast_and_is_cached(self):
+        self.assertEqual(self.opc.get_datapoint('NOT/A.PATH'), 'DoesNotExist')
+        self.assertEqual(self.client.calls['properties'], 1)
+        self.assertEqual(self.opc.get_datapoints(['NOT/A.PATH', PATHS[0]])['NOT/A.PATH'], 'DoesNotExist')
+        self.assertEqual(self.client.calls['properties'], 2)  # Only the good path was requested
+
+    def test_negative_cache_expires(self):
+        now = [0.0]
+        cache = NegativeCache(ttl=10, clock=lambda: now[0])
+        cache.add('NOT/A.PATH')
+        self.assertIn('NOT/A.PATH', cache)
+        now[0] = 10.0
+        self.assertNotIn('NOT/A.PATH', cache)
+
+    def test_exponential_backoff(self):
+        sleeps = []
+        policy = RetryPolicy(max_attempts=5, initial_delay=0.01, multiplier=2, max_delay=0.03, sleep=sleeps.append)
+        self.assertEqual(list(policy.attempts()), [1, 2, 3, 4, 5])
+        self.assertEqual(sleeps, [0.01, 0.02, 0.03, 0.03])
+
+    def test_cycle_budget_limits_retries(self):
+        now = [0.0]
+        policy = RetryPolicy(max_attempts=100, initial_delay=0.1, multiplier=1, cycle_budget=0.25,
+                             clock=lambda: now[0], sleep=lambda delay: now.__setitem__(0, now[0] + delay))
+        with policy.cycle():
+            self.assertEqual(len(list(policy.attempts())), 3)
+            self.assertEqual(len(list(policy.attempts())), 1)  # Budget is shared by everything in the cycle
+
+    def test_required_attempts_reported(self):
+        self.client.set_value(PATHS[0], False, quality='Bad')
+        self.client.calls.clear()
+        self.opc.retry_policy = RetryPolicy(max_attempts=5, initial_delay=0, sleep=lambda delay: (
+            self.client.set_value(PATHS[0], True) if self.client.calls['properties'] == 2 else None))
+        self.assertEqual(self.opc.get_datapoint(PATHS[0]).required_attempts, 3)
+
+
+class GroupScanTests(FakeClientTestCase):
+    def test_cyclic_reads_do_not_resolve_items(self):
+        self.opc.register_group('ilock', PATHS)
+        properties_calls = self.client.calls['properties']
+        for i in range(3):
+            results = self.opc.read_group('ilock')
+        self.assertEqual(self.client.calls['properties'], properties_calls)
+        self.assertEqual(results[PATHS[0]].canonical_datatype, 'VT_BOOL')
+
+    def test_conn_status_refreshed(self):
+        self.opc.register_group('ilock', PATHS)
+        self.client.set_value(PATHS[0], False, quality='Bad', conn_status=1)
+        self.assertNotIsInstance(self.opc.read_group('ilock')[PATHS[0]], DataPoint)
+        self.client.set_value(PATHS[0], False, conn_status=2)  # Comes good again with a new status
+        self.assertEqual(self.opc.read_group('ilock')[PATHS[0]].conn_status_int, 2)
+
+        self.client.set_value(PATHS[1], False, conn_status=3)  # Changed without quality ever going bad
+        self.assertEqual(self.opc.read_group('ilock')[PATHS[1]].conn_status_int, 0)
+        self.opc.group_meta_max_age = 0
+        self.assertEqual(self.opc.read_group('ilock')[PATHS[1]].conn_status_int, 3)
+
+    def test_reregistered_after_reconnect(self):
+        self.opc.register_group('ilock', PATHS)
+        self.client.drop_connection()
+        self.assertNotIsInstance(self.opc.read_group('ilock')[PATHS[0]], DataPoint)
+        self.opc.connect()
+        self.assertIn('ilock', self.client.groups())
+        self.client.set_value(PATHS[0], True)
+        self.assertTrue(self.opc.read_group('ilock')[PATHS[0]].value)
+
+    def test_server_change_callbacks(self):
+        changes = []
+        self.opc.register_group('ilock', PATHS)
+        self.opc.subscribe_group('ilock', lambda path, dp: changes.append((path, dp.value)))
+        self.client.set_value(PATHS[1], True)
+        self.assertEqual(changes, [(PATHS[1], True)])
+
+        self.client.drop_connection()
+        self.opc.connect()  # Callback should survive the reconnect
+        self.client.set_value(PATHS[2], True)
+        self.assertEqual(changes[-1], (PATHS[2], True))
+
+    def test_emulated_change_callbacks(self):
+        self.client.supports_callbacks = False
+        changes = []
+        self.opc.register_group('ilock', PATHS)
+        self.opc.subscribe_group('ilock', lambda path, dp: changes.append(path))
+        self.opc.read_group('ilock')
+        self.assertEqual(changes, PATHS)  # Initial values count as changes
+        self.client.set_value(PATHS[3], True)
+        self.opc.read_group('ilock')
+        self.assertEqual(changes[len(PATHS):], [PATHS[3]])
+
+    def test_group_reads_recorded_in_history(self):
+        opc = OPCScanner(dict(CONN_CFG, HISTORY_CAPACITY=16), client=self.client)
+        opc.register_group('ilock', PATHS)
+        opc.connect()
+        opc.read_group('ilock')
+        self.client.set_value(PATHS[0], True)
+        opc.read_group('ilock')
+        self.assertEqual(sorted(opc.history.paths), sorted(PATHS))
+        self.assertEqual([s.value for s in opc.history.query(PATHS[0])], [False, True])
+        self.assertEqual(len(opc.history.query(PATHS[1])), 1)
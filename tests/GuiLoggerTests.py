@@ -0,0 +1,48 @@
+import logging
+import unittest
+
+from frontend.gui_logger import GuiHandler, gui_log_formatter
+
+
+class GuiHandlerTests(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.now = 0.0
+        self.handler = GuiHandler(logging.INFO, lambda key, text: self.events.append(text), max_queue=5,
+                                  coalesce_window=10, clock=lambda: self.now, start=False)
+        self.handler.setFormatter(gui_log_formatter)
+        self.logger = logging.getLogger('gui-logger-test')
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_batched_into_one_event(self):
+        self.logger.warning("first")
+        self.logger.error("second")
+        self.assertEqual(self.events, [])  # Nothing sent from the logging thread
+        self.assertEqual(self.handler.drain(), 2)
+        self.assertEqual(self.events, ["WARNING: first\nERROR: second"])
+
+    def test_repeats_coalesced(self):
+        for i in range(3):
+            self.logger.warning("XV-1/ZSC.CV: DoesNotExist")
+            self.handler.drain()
+        self.now = 10
+        self.handler.drain()
+        self.assertEqual(self.events, [
+            "WARNING: XV-1/ZSC.CV: DoesNotExist",
+            "WARNING: XV-1/ZSC.CV: DoesNotExist (x2 in last 10s)",
+        ])
+        self.logger.warning("XV-1/ZSC.CV: DoesNotExist")  # New window - shown again
+        self.handler.drain()
+        self.assertEqual(len(self.events), 3)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        for i in range(8):
+            self.logger.warning(f"message {i}")
+        self.handler.drain()
+        lines = self.events[0].split('\n')
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[-1], "WARNING: 3 log records dropped - logging faster than the display can keep up")
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from history_store import HistoryStore
+from tests.helpers import START, make_dp
+
+BASE = START.timestamp()
+
+
+class HistoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.store = HistoryStore(capacity=4, max_paths=2)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_only_changes_recorded(self):
+        self.assertTrue(self.store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', False, 0)))
+        self.assertFalse(self.store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', False, 0)))
+        self.assertTrue(self.store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', True, 5)))
+        self.assertEqual([s.value for s in self.store.query('XV-1/ZSC.CV')], [False, True])
+
+    def test_ring_keeps_latest_samples(self):
+        for n in range(6):
+            self.store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', n, n))
+        self.assertEqual([s.value for s in self.store.query('XV-1/ZSC.CV')], [2, 3, 4, 5])
+        self.assertEqual(self.store.latest('XV-1/ZSC.CV').value, 5)
+
+    def test_range_query_and_changes(self):
+        for n, value in enumerate([0, 1, 1, 0]):
+            self.store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', value, n * 10))
+        self.store.record('XV-1/ZSC.CV', 'Item quality not good', record_time=BASE + 35)
+        window = self.store.query('XV-1/ZSC.CV', BASE + 10, BASE + 35)
+        self.assertEqual([(s.time - BASE, s.quality) for s in window], [(10, 'Good'), (30, 'Good'), (35, 'Error')])
+        changes = self.store.changes('XV-1/ZSC.CV', BASE + 5, BASE + 40)
+        self.assertEqual([(s.time - BASE, s.value) for s in changes], [(10, 1), (30, 0)])
+
+    def test_string_values(self):
+        for n, value in enumerate(['OPEN', 'CLOSED', 'OPEN']):
+            self.store.record('XV-1/STATE.CV', make_dp('XV-1/STATE.CV', value, n))
+        self.assertEqual([s.value for s in self.store.changes('XV-1/STATE.CV')], ['OPEN', 'CLOSED', 'OPEN'])
+        self.assertEqual(self.store.latest('XV-1/STATE.CV').value, 'OPEN')
+
+    def test_path_table_full(self):
+        for n in range(3):
+            self.store.record(f"P-{n}", make_dp(f"P-{n}", True, 0))
+        self.assertEqual(self.store.paths, ['P-0', 'P-1'])
+
+    def test_persisted_across_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fname = os.path.join(directory, 'history.ilhist')
+            with HistoryStore(capacity=8, fname=fname) as store:
+                store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', False, 0))
+                store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', True, 1))
+            with HistoryStore(capacity=100, fname=fname) as store:  # File's own capacity is kept
+                self.assertEqual(store.capacity, 8)
+                self.assertEqual([s.value for s in store.query('XV-1/ZSC.CV')], [False, True])
+                store.record('XV-1/ZSC.CV', make_dp('XV-1/ZSC.CV', False, 2))
+                self.assertEqual(len(store.query('XV-1/ZSC.CV')), 3)
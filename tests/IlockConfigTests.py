@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import unittest
+
+import ilock_config
+from ilock_config import ConfigError, ConfigWatcher, InterlockLoader, diff_interlocks
+from interlock import Component, Indication, Interlock
+
+CONFIG = {
+    "name": "IL-1",
+    "desc": "High pressure",
+    "components": [
+        {"name": "PSHH-1", "desc": "Switch", "role": "initiator", "indications": [
+            {"rank": 0, "path": "PSHH-1/PV_D.CV", "desc": "Switch", "role": "initiator",
+             "expected_val_pre": 0, "expected_val_post": 1, "scan_rate": None},
+        ]},
+        {"name": "XV-1", "desc": "Valve", "indications": [
+            {"rank": 1, "path": "XV-1/ZSC.CV", "desc": "Closed", "role": "final_element",
+             "expected_val_pre": False, "expected_val_post": True, "scan_rate": 1000},
+        ]},
+    ],
+}
+
+
+class IlockConfigTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.dir.name, 'il1.json')
+        self.write(CONFIG)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, data):
+        with open(self.fname, 'w') as f:
+            json.dump(data, f)
+
+    def test_parse_matches_constructed(self):
+        expected = Interlock('IL-1', [
+            Component('PSHH-1', [Indication(0, 'PSHH-1/PV_D.CV', 'Switch', 'initiator', 0, 1)], 'Switch'),
+            Component('XV-1', [Indication(1, 'XV-1/ZSC.CV', 'Closed', 'final_element', False, True, 1000)], 'Valve'),
+        ], 'High pressure')
+        self.assertEqual(repr(ilock_config.parse_interlock(CONFIG)), repr(expected))
+
+    def test_validation_reports_location(self):
+        bad = json.loads(json.dumps(CONFIG))
+        bad['components'][1]['indications'][0]['role'] = 'sensor'
+        with self.assertRaisesRegex(ConfigError, r"components\[1\]\.indications\[0\]\.role"):
+            ilock_config.parse_interlock(bad)
+        del bad['components'][0]['indications'][0]['path']
+        with self.assertRaisesRegex(ConfigError, r"components\[0\]\.indications\[0\]: missing required field 'path'"):
+            ilock_config.parse_interlock(bad)
+        with self.assertRaisesRegex(ConfigError, "may not be empty"):
+            ilock_config.parse_interlock(dict(CONFIG, components=[{"name": "C", "indications": []}]))
+
+    def test_cache_reused_until_file_changes(self):
+        cache_dir = os.path.join(self.dir.name, 'cache')
+        first = InterlockLoader(cache_dir=cache_dir).load(self.fname)
+        loader = InterlockLoader(cache_dir=cache_dir)
+        second = loader.load(self.fname)
+        self.assertEqual(loader.parsed, 0)  # Came from the binary cache
+        self.assertEqual(repr(first), repr(second))
+        self.assertIs(loader.load(self.fname), second)
+
+        self.write(dict(CONFIG, name='IL-2'))
+        self.assertEqual(loader.load(self.fname).name, 'IL-2')
+        self.assertEqual(loader.parsed, 1)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)  # Stale entry removed
+        self.assertEqual(sorted(os.listdir(self.dir.name)), ['cache', 'il1.json'])  # Nothing beside the config
+        self.assertEqual(len(loader.loaded), 1)  # Only the latest version kept in memory
+
+    def test_same_name_in_different_directories(self):
+        cache_dir = os.path.join(self.dir.name, 'cache')
+        other = os.path.join(self.dir.name, 'other', 'il1.json')
+        os.makedirs(os.path.dirname(other))
+        with open(other, 'w') as f:
+            json.dump(dict(CONFIG, name='IL-2'), f)
+        loader = InterlockLoader(cache_dir=cache_dir)
+        self.assertEqual([loader.load(fname).name for fname in (self.fname, other)], ['IL-1', 'IL-2'])
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertEqual(InterlockLoader(cache_dir=cache_dir).load(self.fname).name, 'IL-1')
+
+    def test_invalid_json(self):
+        with open(self.fname, 'w') as f:
+            f.write('{"name": ')
+        with self.assertRaisesRegex(ConfigError, "not valid JSON"):
+            InterlockLoader(cache=False).load(self.fname)
+
+
+class ConfigReloadTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.dir.name, 'il1.json')
+        self.loader = InterlockLoader(cache=False)
+        self.changes = []
+        self.write(CONFIG)
+        self.watcher = ConfigWatcher({self.fname: self.loader.load(self.fname)},
+                                     lambda *change: self.changes.append(change), loader=self.loader)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, data, mtime=None):
+        with open(self.fname, 'w') as f:
+            json.dump(data, f)
+        if mtime is not None:  # Filesystem timestamps may be too coarse to tell quick successive writes apart
+            os.utime(self.fname, ns=(mtime, mtime))
+
+    def edited(self):
+        data = json.loads(json.dumps(CONFIG))
+        data['components'][0]['indications'][0]['expected_val_post'] = 2
+        data['components'][1]['indications'].append(
+            {"rank": 1, "path": "XV-1/ZSO.CV", "desc": "Open", "role": "final_element",
+             "expected_val_pre": True, "expected_val_post": False})
+        return data
+
+    def test_diff(self):
+        old = ilock_config.parse_interlock(CONFIG)
+        new = ilock_config.parse_interlock(self.edited())
+        diff = diff_interlocks(old, new)
+        self.assertEqual([indication.path for indication in diff.added], ["XV-1/ZSO.CV"])
+        self.assertEqual(diff.removed, [])
+        self.assertEqual([new_ind.path for _, new_ind in diff.changed], ["PSHH-1/PV_D.CV"])
+        self.assertEqual([(old_ind.path, new_ind.path) for old_ind, new_ind in diff.kept],
+                         [("XV-1/ZSC.CV", "XV-1/ZSC.CV")])
+        self.assertEqual(diff_interlocks(new, old).removed, diff.added)
+
+    def test_watcher_reports_changes_only(self):
+        self.assertEqual(self.watcher.check(), [])
+        old = self.watcher.interlocks[self.fname]
+        self.write(CONFIG, mtime=1_000_000_000)  # Touched, content unchanged
+        self.assertEqual(self.watcher.check(), [])
+
+        self.write(self.edited(), mtime=2_000_000_000)
+        self.assertEqual(self.watcher.check(), [self.fname])
+        (fname, previous, new, diff), = self.changes
+        self.assertIs(previous, old)
+        self.assertIs(self.watcher.interlocks[self.fname], new)
+        self.assertEqual(len(diff.added), 1)
+
+    def test_watcher_keeps_last_good_config(self):
+        old = self.watcher.interlocks[self.fname]
+        with open(self.fname, 'w') as f:
+            f.write('{"name": ')
+        os.utime(self.fname, ns=(3_000_000_000, 3_000_000_000))
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(self.watcher.check(), [])
+        self.assertIs(self.watcher.interlocks[self.fname], old)
+        self.assertEqual(self.changes, [])
@@ -0,0 +1,54 @@
+import unittest
+
+from interlock import Component, Indication, Interlock
+from interlock_eval import CompiledInterlocks
+from tests.helpers import make_dp
+
+
+class InterlockEvalTests(unittest.TestCase):
+    def setUp(self):
+        self.interlock = Interlock('IL-1', [
+            Component('PSHH-1', [Indication(0, 'PT-1/HI_ACT.CV', '', 'initiator', 0, 1)]),
+            Component('XV-1', [
+                Indication(0, 'XV-1/ZSC.CV', '', 'final_element', 0, 1),
+                Indication(1, 'XV-1/SP_D.CV', '', 'final_element', 1, 0),
+            ]),
+        ], '')
+        self.other = Interlock('IL-2', [
+            Component('HS-2', [Indication(0, 'HS-2/PV_D.CV', '', 'both', 0, 1)]),
+        ], '')
+        self.compiled = CompiledInterlocks([self.interlock, self.other])
+
+    def snapshot(self, values, quality='Good'):
+        return {path: make_dp(path, value, quality=quality) for path, value in zip(self.compiled.paths, values)}
+
+    def test_ready(self):
+        result = self.compiled.evaluate(self.snapshot([0, 0, 1, 0]))
+        self.assertTrue(result.interlocks[0].ready)
+        self.assertFalse(result.interlocks[0].tripped)
+        self.assertEqual([ready for _, ready, _, _ in result.components], [True, True, True])
+
+    def test_tripped_but_not_proven(self):
+        result = self.compiled.evaluate(self.snapshot([1, 0, 0, 0]))
+        status = result.interlocks[0]
+        self.assertTrue(status.tripped)
+        self.assertFalse(status.proven)
+        self.assertEqual(status.roles['initiator'], {'ready': False, 'tripped': True, 'proven': True})
+        self.assertFalse(status.roles['final_element']['proven'])
+        self.assertFalse(result.interlocks[1].tripped)
+
+    def test_proven(self):
+        result = self.compiled.evaluate(self.snapshot([1, 1, 0, 1]))
+        self.assertTrue(result.interlocks[0].proven)
+        self.assertEqual(result.interlocks[0].state, 'proven')
+        self.assertTrue(result.interlocks[1].proven)  # 'both' role trips and proves itself
+
+    def test_bad_reads_are_unknown(self):
+        snapshot = self.snapshot([0, 0, 1, 0])
+        snapshot['XV-1/ZSC.CV'] = make_dp('XV-1/ZSC.CV', 0, quality='Bad')
+        del snapshot['HS-2/PV_D.CV']
+        result = self.compiled.evaluate(snapshot)
+        self.assertFalse(result.interlocks[0].ready)
+        self.assertEqual(result.interlocks[0].state, 'not ready')
+        states = [state for _, state in result.indication_states()]
+        self.assertEqual(states, ['pre', 'unknown', 'pre', 'unknown'])
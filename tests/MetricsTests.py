@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from fake_opc import FakeOPCClient
+from interlock import Component, Indication, Interlock
+from metrics import HISTOGRAM, MetricsRegistry
+from opc_scanner import OPCScanner
+from retry_policy import RetryPolicy
+from scanner_service import scan_interlocks
+from tag_index import TagIndex
+from tests.helpers import CONN_CFG
+
+
+class FlakyClient(FakeOPCClient):
+    """Serves path 'FLAKY/PV.CV' with bad quality on its first read only"""
+
+    def __init__(self):
+        super().__init__()
+        self.flaky_reads = 0
+
+    def _lookup(self, path):
+        tag = super()._lookup(path)
+        if path == 'FLAKY/PV.CV' and tag is not None:
+            self.flaky_reads += 1
+            if self.flaky_reads == 1:
+                return dict(tag, quality='Bad')
+        return tag
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.describe('read_seconds', HISTOGRAM, "Read latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            registry.observe('read_seconds', value, host='a')
+        registry.inc('retries_total', 2, path='X"Y')
+        registry.set('integrity_ok', 1)
+        self.assertEqual(registry.to_prometheus().splitlines(), [
+            '# TYPE integrity_ok gauge',
+            'integrity_ok 1',
+            '# HELP read_seconds Read latency',
+            '# TYPE read_seconds histogram',
+            'read_seconds_bucket{host="a",le="0.1"} 1',
+            'read_seconds_bucket{host="a",le="1.0"} 2',
+            'read_seconds_bucket{host="a",le="+Inf"} 3',
+            'read_seconds_sum{host="a"} 5.55',
+            'read_seconds_count{host="a"} 3',
+            '# TYPE retries_total counter',
+            'retries_total{path="X\\"Y"} 2',
+        ])
+        self.assertEqual(registry.stats()['read_seconds']['{host="a"}']['count'], 3)
+
+
+class ScanInstrumentationTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.client = FlakyClient()
+        self.client.set_value('FLAKY/PV.CV', 1)
+        self.client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        self.client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        self.opc = OPCScanner(CONN_CFG, client=self.client, metrics_registry=self.registry,
+                              retry_policy=RetryPolicy(max_attempts=3, initial_delay=0))
+        self.opc.connect()
+
+    def test_retries_and_latency_recorded(self):
+        self.opc.get_datapoints(['FLAKY/PV.CV'])
+        self.opc.get_datapoint('MISSING/PV.CV')
+        self.assertEqual(self.registry.get('opc_path_retries_total', path='FLAKY/PV.CV'), 1)
+        self.assertEqual(self.registry.get('opc_read_seconds', host='fake-host', read='properties_batch').count, 2)
+        self.assertEqual(self.registry.get('opc_path_failures_total', host='fake-host'), 1)
+
+    def test_scan_loop_metrics_and_file(self):
+        interlock = Interlock('IL-1', [Component('C', [Indication(0, 'FLAKY/PV.CV', '', 'initiator', 0, 1)])], '')
+        with tempfile.TemporaryDirectory() as directory:
+            fname = os.path.join(directory, 'interlockvis.prom')
+            scan_interlocks(self.opc, TagIndex([interlock]), 1, dict(CONN_CFG, METRICS_FILE=fname), lambda dps: None,
+                            cycles=3, metrics_registry=self.registry)
+            with open(fname) as f:
+                text = f.read()
+        self.assertIn('scan_cycle_seconds_count 3', text)
+        self.assertIn('scan_target_period_seconds 0.001', text)
+        self.assertIn('comms_integrity_ok 0', text)  # A single heartbeat is not enough to prove comms
+        self.assertIn('opc_read_seconds_count{host="fake-host",read="scan @250ms"} 1', text)  # Due on first cycle only
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import time
+import unittest
+
+from fake_opc import FakeOPCClient
+from interlock import Component, Indication, Interlock
+from namespace_index import NamespaceIndex
+
+PATHS = [
+    "XV-101/CLOSED.CV", "XV-101/OPENED.CV", "XV-102/CLOSED.CV", "XV-102/OPENED.CV",
+    "PT-201/PV.CV", "PT-201/PV.ST", "LSHH-301/PV_D.CV",
+]
+
+
+class NamespaceIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeOPCClient()
+        for path in PATHS:
+            self.client.set_value(path, 0)
+        self.client.connect()
+        self.index = NamespaceIndex('fake-host')
+        self.index.crawl(self.client)
+
+    def test_crawl_finds_every_path(self):
+        self.assertEqual(len(self.index), len(PATHS))
+        self.assertIn("xv-101/closed.cv", self.index)
+        self.assertNotIn("XV-103/CLOSED.CV", self.index)
+
+    def test_prefix_and_fuzzy_search(self):
+        self.assertEqual(self.index.search("xv-10"), sorted(p for p in PATHS if p.startswith("XV")))
+        self.assertEqual(self.index.search("PT-201/PV.", limit=1), ["PT-201/PV.CV"])
+        self.assertEqual(self.index.fuzzy("LSH-301/PV_D.CV")[0], "LSHH-301/PV_D.CV")
+        self.assertEqual(self.index.fuzzy("NOTHING-LIKE-IT"), [])
+
+    def test_refresh_only_named_branches(self):
+        self.client.set_value("XV-101/FAILED.CV", 0)
+        self.client.set_value("PT-201/HI_LIM.CV", 0)
+        self.client.calls.clear()
+        self.index.refresh(self.client, branches=["XV-101"])
+        self.assertIn("XV-101/FAILED.CV", self.index)
+        self.assertNotIn("PT-201/HI_LIM.CV", self.index)
+        self.assertEqual(self.client.calls['list'], 4)  # XV-101, then its CLOSED, OPENED and FAILED branches
+
+    def test_refresh_stale_branches(self):
+        self.client.set_value("PT-201/HI_LIM.CV", 0)
+        self.assertEqual(self.index.refresh(self.client, max_age=3600), 0)
+        self.index.branches["PT-201"] = (time.time() - 7200, [])
+        self.index.refresh(self.client, max_age=3600)
+        self.assertIn("PT-201/HI_LIM.CV", self.index)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'index.json')
+            self.index.save(fname)
+            loaded = NamespaceIndex.load(fname)
+        self.assertEqual(loaded.host, 'fake-host')
+        self.assertEqual(loaded.search(''), self.index.search(''))
+
+    def test_check_interlocks(self):
+        interlock = Interlock('IL-1', [Component('XV-101', [
+            Indication(0, "XV-101/CLOSED.CV", '', 'final_element', False, True),
+            Indication(1, "XV-101/CLOSD.CV", '', 'final_element', False, True),
+        ])], '')
+        unknown = self.index.check_interlocks([interlock])
+        self.assertEqual([u.indication.path for u in unknown], ["XV-101/CLOSD.CV"])
+        self.assertEqual(unknown[0].suggestions[0], "XV-101/CLOSED.CV")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from frontend.paged_view import COMPONENT, INDICATION, INTERLOCK, UNSCANNED, IndicationPager, PagedIndicationView
+from interlock import Component, Indication, Interlock
+from tests.helpers import make_dp
+
+
+def make_interlock(components=10, indications=10):
+    return Interlock('IL-1', [
+        Component(f"XV-{c}", [
+            Indication(0, f"XV-{c}/IND{i}.CV", '', 'initiator' if i == 0 else 'final_element', False, True)
+            for i in range(indications)
+        ], f"valve {c}")
+        for c in range(components)
+    ], '')
+
+
+class IndicationPagerTests(unittest.TestCase):
+    def setUp(self):
+        self.interlock = make_interlock()
+        self.pager = IndicationPager([self.interlock], page_size=20)
+
+    def test_pages_of_rows(self):
+        self.assertEqual(len(self.pager.rows), 1 + 10 * 11)
+        self.assertEqual(self.pager.pages, 6)
+        self.assertEqual([row[0] for row in self.pager.visible()[:3]], [INTERLOCK, COMPONENT, INDICATION])
+        self.pager.turn(10)
+        self.assertEqual(self.pager.page, 5)
+        self.assertEqual(len(self.pager.visible()), 11)
+
+    def test_filters(self):
+        self.pager.set_filter(text='xv-3/')
+        self.assertEqual([row[0] for row in self.pager.rows], [INTERLOCK, COMPONENT] + [INDICATION] * 10)
+        self.pager.set_filter(text='', role='initiator')
+        self.assertEqual(sum(row[0] == INDICATION for row in self.pager.rows), 10)
+        self.pager.set_filter(text='nothing matches')
+        self.assertEqual(self.pager.rows, [])
+        self.assertEqual(self.pager.pages, 1)
+
+    def test_collapse_and_summary(self):
+        comp = self.interlock.components[0]
+        self.pager.toggle(comp)
+        self.assertEqual(self.pager.rows[2][0], COMPONENT)
+        self.pager.update(comp.indications[0], make_dp(comp.indications[0].path, True))
+        self.pager.update(comp.indications[1], make_dp(comp.indications[1].path, False))
+        self.assertEqual(self.pager.row_text(self.pager.rows[1]),
+                         ("+ XV-0 (valve 0)", "pre 1/10", "post 1/10, 8 unread"))
+        self.assertEqual(self.pager.row_text((INDICATION, self.interlock, comp, comp.indications[2]))[1:],
+                         (UNSCANNED, UNSCANNED))
+
+    def test_replace_interlock_keeps_results(self):
+        comp = self.interlock.components[0]
+        self.pager.toggle(self.interlock.components[1])
+        self.pager.update(comp.indications[0], make_dp(comp.indications[0].path, True))
+        new = make_interlock(components=3)
+        self.pager.replace_interlock(self.interlock, new)
+        self.assertEqual(len(self.pager.rows), 1 + 3 + 10 * 2)
+        self.assertEqual(self.pager.values[new.components[0].indications[0]].value, True)
+        self.assertIn(new.components[1], self.pager.collapsed)
+        self.pager.update(comp.indications[1], make_dp(comp.indications[1].path, True))  # Sent before the reload
+        self.assertNotIn(comp.indications[1], self.pager.values)
+
+
+class PagedIndicationViewTests(unittest.TestCase):
+    def setUp(self):
+        self.interlock = make_interlock(components=50)
+        self.view = PagedIndicationView([self.interlock], page_size=20)
+        self.updates = []
+        for i, slot in enumerate(self.view.slots):
+            for element in slot:
+                element.update = lambda *args, key=element.key, **kwargs: self.updates.append(key)
+        self.view.page_label.update = lambda text: None
+        self.view.render()
+        self.updates.clear()
+
+    def test_only_visible_rows_redrawn(self):
+        on_page = self.interlock.components[0].indications[0]
+        off_page = self.interlock.components[40].indications[0]
+        self.view.update(off_page, make_dp(off_page.path, True))
+        self.assertEqual(self.updates, [])
+        self.view.update(on_page, make_dp(on_page.path, True))
+        # The indication's pre and post, and its component summary's post count - its pre count is still 0
+        self.assertEqual(sorted(self.updates), ['-VIEW-1.post', '-VIEW-2.post', '-VIEW-2.pre'])
+
+    def test_interlock_state_shown(self):
+        self.view.set_state(self.interlock, 'tripped')
+        self.assertEqual(self.view.shown[0][1], ('IL-1', 'tripped', ''))
+        self.assertEqual(self.updates, ['-VIEW-0.pre'])
+        self.view.set_state(self.interlock, 'tripped')  # Unchanged
+        self.assertEqual(self.updates, ['-VIEW-0.pre'])
+
+    def test_slots_reused_when_paging(self):
+        slots = list(self.view.slots)
+        self.view.handle('-VIEW-next', {})
+        self.assertEqual(self.view.slots, slots)
+        self.assertEqual(self.view.pager.page, 1)
+        self.assertEqual(self.view.shown[0][0], self.view.pager.rows[20])
+        self.assertFalse(self.view.handle('Exit', {}))
+
+    def test_click_component_to_collapse(self):
+        self.view.handle('-VIEW-1.name', {})
+        self.assertIn(self.interlock.components[0], self.view.pager.collapsed)
+        self.assertEqual(self.view.shown[2][0][0], COMPONENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from interlock import Component, Indication, Interlock
+from proof_analytics import ProofTestAnalysis, main
+from scan_capture import CaptureWriter
+from tests.helpers import CONN_CFG, START, make_dp
+
+SWITCH, VALVE, PUMP = "PSHH-1/PV_D.CV", "XV-1/CLOSED.CV", "P-1/RUNNING.CV"
+
+
+class ProofAnalyticsTests(unittest.TestCase):
+    def setUp(self):
+        self.interlock = Interlock('IL-1', [
+            Component('PSHH-1', [Indication(0, SWITCH, '', 'initiator', False, True)]),
+            Component('XV-1', [Indication(0, VALVE, '', 'final_element', False, True)]),
+            Component('P-1', [Indication(0, PUMP, '', 'final_element', True, False)]),
+        ], '')
+        fd, self.fname = tempfile.mkstemp(suffix='.ilcap')
+        os.close(fd)
+        os.remove(self.fname)
+
+    def tearDown(self):
+        if os.path.exists(self.fname):
+            os.remove(self.fname)
+
+    def record(self, values_by_second):
+        """values_by_second: {second: {path: value, or an error string}}, scanned once a second with integrity paths"""
+        with CaptureWriter(self.fname, chunk_rows=7) as writer:
+            for t in range(max(values_by_second) + 1):
+                scan = {path: value if isinstance(value, str) else make_dp(path, value, t)
+                        for path, value in values_by_second.get(t, {}).items()}
+                scan[CONN_CFG["LANDMARK_PATH"]] = make_dp(CONN_CFG["LANDMARK_PATH"], 42, t)
+                heartbeat = t // 2 if t < 20 or t > 30 else 10  # Stuck for 10 s
+                scan[CONN_CFG["HEARTBEAT_PATH"]] = make_dp(CONN_CFG["HEARTBEAT_PATH"], heartbeat, t)
+                writer.write_scan(scan, capture_time=START.timestamp() + t)
+
+    def analyse(self, trip_window=60.0):
+        analysis = ProofTestAnalysis([self.interlock], CONN_CFG, trip_window)
+        analysis.add_capture(self.fname)
+        return analysis.summary()
+
+    def test_trip_response_times(self):
+        normal = {SWITCH: False, VALVE: False, PUMP: True}
+        self.record({
+            0: normal, 1: normal,
+            2: {SWITCH: True, VALVE: False, PUMP: True},  # Trip
+            3: {SWITCH: True, VALVE: False, PUMP: False},
+            5: {SWITCH: True, VALVE: True, PUMP: False},
+            8: normal,
+            10: {SWITCH: True, VALVE: True, PUMP: True},  # Second trip - valve responds in the same scan, pump never
+            40: normal,
+        })
+        summary = self.analyse(trip_window=20)
+        self.assertEqual(summary['trips'], {'IL-1': {'count': 2, 'incomplete': 1}})
+        by_element = summary['response_times_by_final_element']
+        self.assertEqual(by_element[f"IL-1: {VALVE}"]['distribution']['count'], 2)
+        self.assertEqual(by_element[f"IL-1: {VALVE}"]['distribution']['max_s'], 3.0)
+        self.assertEqual(by_element[f"IL-1: {PUMP}"]['distribution']['max_s'], 1.0)
+        self.assertEqual(by_element[f"IL-1: {PUMP}"]['no_response'], 1)
+        self.assertEqual(summary['never_reached_post'], [])
+
+    def test_never_reached_and_read_failures(self):
+        self.record({0: {SWITCH: False, VALVE: False, PUMP: "DoesNotExist"}, 1: {SWITCH: False, VALVE: False}})
+        summary = self.analyse()
+        self.assertEqual(summary['never_reached_post'], [f"IL-1: {p}" for p in (SWITCH, VALVE, PUMP)])
+        self.assertEqual(summary['never_reached_pre'], [f"IL-1: {PUMP}"])
+        self.assertEqual(summary['read_failures'], {f"IL-1: {PUMP}": {'errors': 1, 'bad_quality': 0}})
+
+    def test_integrity_degradation(self):
+        self.record({40: {SWITCH: False}})
+        integrity = self.analyse()['integrity']
+        self.assertEqual(integrity['scans'], 41)
+        self.assertEqual(integrity['degraded_episodes'], 1)  # Heartbeat unchanged from 20 s, so stale from 26 s to 31 s
+        self.assertEqual(integrity['degraded_scans'], 5)
+        self.assertEqual(integrity['degraded_s'], 5.0)
+
+    def test_command_line(self):
+        self.record({0: {SWITCH: False, VALVE: False, PUMP: True}})
+        with tempfile.TemporaryDirectory() as tmp:
+            il_fname = os.path.join(tmp, 'il.json')
+            with open(il_fname, 'w') as f:
+                f.write('{"name": "IL-1", "desc": "", "components": [{"name": "XV-1", "indications": ['
+                        f'{{"rank": 0, "path": "{VALVE}", "role": "final_element", "expected_val_pre": false, '
+                        '"expected_val_post": true}]}]}')
+            report = os.path.join(tmp, 'report.txt')
+            self.assertEqual(main(['--interlocks', il_fname, '--captures', self.fname, '--report', report]), 0)
+            with open(report) as f:
+                text = f.read()
+        self.assertIn(f"  IL-1: {VALVE}", text)
+        self.assertIn("Comms integrity: not analysed", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from fake_opc import FakeOPCClient
+from opc_scanner import DataPoint, OPCScanner
+from retry_policy import RetryPolicy
+from scan_capture import CaptureReader, CaptureWriter, ReplayOPCClient
+from tests.helpers import CONN_CFG
+
+
+class ScanCaptureTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.fname = tempfile.mkstemp(suffix='.ilcap')
+        os.close(fd)
+        os.remove(self.fname)
+        self.client = FakeOPCClient()
+        self.client.set_value('XV-1/CLOSED.CV', False)
+        self.client.set_value('FT-1/PV.CV', 12.5)
+        self.client.set_value('HS-1/MODE.TEXT', 'AUTO')
+        self.opc = OPCScanner(CONN_CFG, client=self.client, retry_policy=RetryPolicy(max_attempts=1))
+        self.opc.connect()
+        self.paths = ['XV-1/CLOSED.CV', 'FT-1/PV.CV', 'HS-1/MODE.TEXT', 'NOT/A.PATH']
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def record(self, scans):
+        with CaptureWriter(self.fname, chunk_rows=5) as writer:
+            for i in range(scans):
+                self.client.set_value('FT-1/PV.CV', 12.5 + i)
+                writer.write_scan(self.opc.get_datapoints(self.paths), capture_time=1000.0 + i)
+
+    def test_round_trip(self):
+        self.record(3)
+        with CaptureReader(self.fname) as reader:
+            scans = list(reader.scans())
+        self.assertEqual([capture_time for capture_time, _ in scans], [1000.0, 1001.0, 1002.0])
+        last = scans[-1][1]
+        self.assertEqual(last['FT-1/PV.CV'].value, 14.5)
+        self.assertIs(last['XV-1/CLOSED.CV'].value, False)
+        self.assertEqual(last['HS-1/MODE.TEXT'].value, 'AUTO')
+        self.assertEqual(last['NOT/A.PATH'], 'DoesNotExist')
+        original = self.opc.get_datapoint('FT-1/PV.CV')
+        self.assertEqual(last['FT-1/PV.CV'].timestamp, original.timestamp)
+
+    def test_append_keeps_existing_data(self):
+        self.record(2)
+        self.record(2)
+        with CaptureReader(self.fname) as reader:
+            self.assertEqual(len(reader), 16)
+            self.assertEqual(len(reader.strings), len(set(reader.strings)))
+
+    def test_replay_through_scanner(self):
+        self.record(3)
+        replay = OPCScanner(CONN_CFG, client=ReplayOPCClient(self.fname, speed=None),
+                            retry_policy=RetryPolicy(max_attempts=1))
+        replay.connect()
+        values = [replay.get_datapoints(self.paths) for i in range(3)]
+        self.assertEqual([scan['FT-1/PV.CV'].value for scan in values], [12.5, 13.5, 14.5])  # One scan per cycle
+        self.assertEqual(values[-1]['NOT/A.PATH'], 'DoesNotExist')
+        self.assertIsInstance(values[-1]['XV-1/CLOSED.CV'], DataPoint)
+        self.assertTrue(replay.client.finished)
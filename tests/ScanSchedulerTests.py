@@ -0,0 +1,67 @@
+import unittest
+
+from interlock import Indication
+from scan_scheduler import ScanScheduler, indication_period
+
+
+class FakeClock:
+    """Manually advanced clock, with scan durations injected via advance()"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class ScanSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = ScanScheduler(250, clock=self.clock, sleep=self.clock.advance)
+        self.scans = []
+
+    def scan(self, keys, duration=0.01):
+        self.scans.append((self.clock.now, keys))
+        self.clock.advance(duration)
+
+    def test_fixed_deadline_does_not_drift(self):
+        self.scheduler.add('fast', 250)
+        self.scheduler.run(self.scan, cycles=8)
+        self.assertEqual([round(t, 6) for t, _ in self.scans], [i * 0.25 for i in range(8)])
+
+    def test_rates_rounded_down_to_base_period(self):
+        self.assertEqual(self.scheduler.add('fast', 250), 250)
+        self.assertEqual(self.scheduler.add('slow', 1100), 1000)
+        self.scheduler.run(self.scan, cycles=8)
+        slow_cycles = [i for i, (_, keys) in enumerate(self.scans) if 'slow' in keys]
+        self.assertEqual(slow_cycles, [0, 4])
+        self.assertTrue(all('fast' in keys for _, keys in self.scans))
+
+    def test_period_shorter_than_base_period_warned(self):
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertEqual(self.scheduler.add('faster', 100), 250)
+        self.assertIn("Scan period 100 ms for faster is shorter than the 250 ms base period", logs.output[0])
+        with self.assertNoLogs(level='WARNING'):
+            self.scheduler.add('fast', 250)
+
+    def test_overrun_reported_and_missed_deadlines_skipped(self):
+        overruns = []
+        self.scheduler.on_overrun = lambda duration, missed: overruns.append(missed)
+        self.scheduler.add('fast', 250)
+        self.scheduler.add('slow', 500)
+        self.scheduler.run(lambda keys: self.scan(keys, duration=0.6 if not self.scans else 0.01), cycles=3)
+        self.assertEqual(overruns, [2])
+        self.assertEqual(self.scheduler.overruns, 1)
+        self.assertEqual(round(self.scans[1][0], 6), 0.75)  # Back on the deadline grid
+        self.assertIn('slow', self.scans[1][1])  # Due during the overrun, so scanned at the next opportunity
+
+    def test_period_by_rank_and_override(self):
+        indications = [
+            Indication(0, 'A', '', 'initiator', 1, 0),
+            Indication(1, 'B', '', 'initiator', 1, 0),
+            Indication(1, 'C', '', 'final_element', 1, 0, scan_rate=250),
+        ]
+        self.assertEqual([indication_period(i, {0: 250}, default_period=2000) for i in indications], [250, 2000, 250])
+        self.assertEqual(indication_period(indications[0]), 250)  # DEFAULT_RANK_PERIODS
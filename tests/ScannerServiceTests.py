@@ -0,0 +1,188 @@
+import queue
+import unittest
+
+from fake_opc import FakeOPCClient
+from interlock import Component, Indication, Interlock
+from metrics import MetricsRegistry
+from opc_scanner import DataPoint, OPCScanner
+from scanner_service import ScannerService, ScannerSubscriber, scan_interlocks
+from tag_index import TagIndex
+from tests.helpers import CONN_CFG
+
+PATHS = [f"XV-{n}/CLOSED.CV" for n in range(3)]
+
+
+class ScannerServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeOPCClient()
+        for path in PATHS:
+            self.client.set_value(path, False)
+        self.client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        self.client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        opc = OPCScanner(CONN_CFG, client=self.client)
+        opc.connect()
+        interlock = Interlock('IL-1', [
+            Component('XV', [Indication(0, path, '', 'final_element', False, True) for path in PATHS])
+        ], '')
+        self.service = ScannerService(CONN_CFG, [interlock], run_freq=1, address=('127.0.0.1', 0), opc=opc)
+        self.service.accept_subscribers()
+        self.subscribers = []
+
+    def tearDown(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.service.close()
+
+    def subscribe(self, paths=None):
+        updates = queue.Queue()
+        subscriber = ScannerSubscriber(self.service.address, lambda results, full: updates.put((results, full)),
+                                       paths=paths, retry_interval=0.05)
+        subscriber.start()
+        self.subscribers.append(subscriber)
+        return updates
+
+    def test_snapshot_then_deltas(self):
+        updates = self.subscribe()
+        self.assertEqual(updates.get(timeout=5), ({}, True))  # Nothing scanned yet
+        self.service.scan(cycles=1)
+        results, full = updates.get(timeout=5)
+        self.assertFalse(full)
+        self.assertEqual(sorted(results), sorted(PATHS))
+        self.assertIsInstance(results[PATHS[0]], DataPoint)
+
+        self.client.set_value(PATHS[1], True)
+        self.service.scan(cycles=1)
+        results, full = updates.get(timeout=5)
+        self.assertEqual({path: dp.value for path, dp in results.items()}, {PATHS[1]: True})
+        self.assertEqual(self.service.version, 2)
+
+    def test_late_joiner_gets_full_snapshot(self):
+        self.client.set_value(PATHS[2], True)
+        self.service.scan(cycles=2)
+        updates = self.subscribe(paths=PATHS[1:])
+        results, full = updates.get(timeout=5)
+        self.assertTrue(full)
+        self.assertEqual({path: dp.value for path, dp in results.items()}, {PATHS[1]: False, PATHS[2]: True})
+
+    def test_one_scan_serves_every_viewer(self):
+        viewers = [self.subscribe() for _ in range(3)]
+        for updates in viewers:
+            updates.get(timeout=5)
+        self.client.calls.clear()
+        self.service.scan(cycles=1)
+        for updates in viewers:
+            self.assertEqual(len(updates.get(timeout=5)[0]), len(PATHS))
+        self.assertEqual(self.client.calls['read'], 4)  # Registering and reading one scan group and integrity, only
+
+
+class RecordingScanner(OPCScanner):
+    """OPCScanner noting every group (un)registered, to show which groups a reload touches"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.registrations = []
+
+    def register_group(self, name, paths, update_rate=None):
+        self.registrations.append(('register', name))
+        super().register_group(name, paths, update_rate)
+
+    def unregister_group(self, name):
+        self.registrations.append(('unregister', name))
+        super().unregister_group(name)
+
+
+class ScanReloadTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeOPCClient()
+        for n in range(4):
+            self.client.set_value(f"XV-{n}/CLOSED.CV", False)
+        self.client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+        self.client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+        self.opc = RecordingScanner(CONN_CFG, client=self.client)
+        self.opc.connect()
+
+    @staticmethod
+    def interlock(scan_rates):
+        return Interlock('IL-1', [Component('XV', [
+            Indication(0, f"XV-{n}/CLOSED.CV", '', 'final_element', False, True, scan_rate)
+            for n, scan_rate in scan_rates.items()
+        ])], '')
+
+    def test_only_changed_groups_registered_again(self):
+        old = self.interlock({0: 1, 1: 1, 2: 2})
+        new = self.interlock({0: 1, 1: 1, 3: 3})
+        self.opc.missing_paths.add("XV-3/CLOSED.CV")  # e.g. tried before the tag was downloaded to the controller
+        tag_index = TagIndex([old])
+        reloads, reloaded = queue.Queue(), []
+        after_reload = {}  # path -> latest result read after the reload
+        cycles = 0
+
+        def on_results(datapoints):
+            if cycles >= 2:
+                after_reload.update(datapoints)
+
+        def on_cycle_end():
+            nonlocal cycles
+            cycles += 1
+            if cycles == 2:
+                self.opc.registrations.clear()
+                reloads.put((old, new))
+
+        scan_interlocks(self.opc, tag_index, 1, CONN_CFG, on_results, on_cycle_end, cycles=6,
+                        metrics_registry=MetricsRegistry(), reloads=reloads,
+                        on_reload=lambda *pair: reloaded.append(pair))
+
+        self.assertEqual(self.opc.registrations, [('unregister', 'scan @2ms'), ('register', 'scan @3ms')])
+        self.assertEqual(reloaded, [(old, new)])
+        self.assertEqual(tag_index.interlocks, [new])
+        self.assertEqual(sorted(self.opc.groups), ['integrity', 'scan @1ms', 'scan @3ms'])
+        self.assertEqual(sorted(after_reload), ["XV-0/CLOSED.CV", "XV-1/CLOSED.CV", "XV-3/CLOSED.CV"])
+        self.assertIsInstance(after_reload["XV-3/CLOSED.CV"], DataPoint)  # No longer skipped as missing
+
+    def test_changed_group_rebuilt_on_server(self):
+        old = self.interlock({0: 1, 1: 1})
+        new = self.interlock({0: 1, 3: 1})  # Same period, so the same group name with different paths
+        reloads = queue.Queue()
+        after_reload = {}
+        cycles = 0
+
+        def on_results(datapoints):
+            if cycles >= 2:
+                after_reload.update(datapoints)
+
+        def on_cycle_end():
+            nonlocal cycles
+            cycles += 1
+            if cycles == 1:
+                reloads.put((old, new))
+
+        scan_interlocks(self.opc, TagIndex([old]), 1, CONN_CFG, on_results, on_cycle_end, cycles=4,
+                        metrics_registry=MetricsRegistry(), reloads=reloads)
+
+        self.assertEqual(sorted(after_reload), ["XV-0/CLOSED.CV", "XV-3/CLOSED.CV"])
+
+    def test_reload_while_host_down(self):
+        old = self.interlock({0: 1, 1: 1})
+        new = self.interlock({0: 1, 3: 1})
+        reloads = queue.Queue()
+        after_reload = {}
+        cycles = 0
+
+        def on_results(datapoints):
+            if cycles >= 3:
+                after_reload.update(datapoints)
+
+        def on_cycle_end():
+            nonlocal cycles
+            cycles += 1
+            if cycles == 1:
+                self.client.drop_connection()
+                reloads.put((old, new))
+            elif cycles == 2:
+                self.opc.connect()
+
+        scan_interlocks(self.opc, TagIndex([old]), 1, CONN_CFG, on_results, on_cycle_end, cycles=5,
+                        metrics_registry=MetricsRegistry(), reloads=reloads)
+
+        self.assertEqual(sorted(after_reload), ["XV-0/CLOSED.CV", "XV-3/CLOSED.CV"])
+        self.assertTrue(all(isinstance(dp, DataPoint) for dp in after_reload.values()))
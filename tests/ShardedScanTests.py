@@ -0,0 +1,99 @@
+from functools import partial
+import os
+import signal
+import time
+import unittest
+
+from fake_opc import FakeOPCClient
+from interlock import Component, Indication, Interlock
+from opc_scanner import DataPoint
+from sharded_scan import ShardedScanner, plan_shards
+from tests.helpers import CONN_CFG
+
+
+def make_interlock(name, paths):
+    return Interlock(name, [Component('XV', [Indication(0, path, '', 'final_element', False, True) for path in paths])],
+                     '')
+
+
+def make_client(values, use_alt_host):
+    """Top level, so the factory can be pickled for worker processes"""
+    client = FakeOPCClient()
+    for path, value in values.items():
+        client.set_value(path, value)
+    client.set_value(CONN_CFG["LANDMARK_PATH"], 42)
+    client.set_value(CONN_CFG["HEARTBEAT_PATH"], 0)
+    return client
+
+
+class PlanShardsTests(unittest.TestCase):
+    def setUp(self):
+        self.interlocks = [
+            make_interlock('IL-1', [f"A-{n}/PV.CV" for n in range(4)]),
+            make_interlock('IL-2', [f"B-{n}/PV.CV" for n in range(3)]),
+            make_interlock('IL-3', [f"C-{n}/PV.CV" for n in range(2)]),
+        ]
+
+    def test_shard_count_balances_by_paths(self):
+        shards = plan_shards({**CONN_CFG, "SHARD_COUNT": 2}, self.interlocks)
+        self.assertEqual([[il.name for il in interlocks] for _, _, interlocks in shards], [['IL-1'], ['IL-2', 'IL-3']])
+        self.assertNotIn("SHARD_COUNT", shards[0][1])
+
+    def test_shards_by_host_with_listed_interlocks(self):
+        cfg = {**CONN_CFG, "METRICS_FILE": "m.prom", "SHARDS": [
+            {"NAME": "area1", "OPC_HOST": "host-1", "INTERLOCKS": ["IL-2"]},
+            {"NAME": "area2", "OPC_HOST": "host-2"},
+        ]}
+        shards = plan_shards(cfg, self.interlocks)
+        self.assertEqual([(name, shard_cfg["OPC_HOST"], [il.name for il in interlocks])
+                          for name, shard_cfg, interlocks in shards],
+                         [('area1', 'host-1', ['IL-2']), ('area2', 'host-2', ['IL-1', 'IL-3'])])
+        self.assertNotIn("METRICS_FILE", shards[0][1])
+
+    def test_unplaceable_interlocks(self):
+        with self.assertRaises(ValueError):
+            plan_shards({**CONN_CFG, "SHARDS": [{"INTERLOCKS": ["IL-1"]}]}, self.interlocks)
+        with self.assertRaises(ValueError):
+            plan_shards({**CONN_CFG, "SHARDS": [{"INTERLOCKS": ["IL-9"]}, {}]}, self.interlocks)
+
+
+class ShardedScannerTests(unittest.TestCase):
+    def setUp(self):
+        self.paths = [f"XV-{n}/CLOSED.CV" for n in range(6)]
+        interlocks = [make_interlock(f"IL-{n}", self.paths[n * 2:n * 2 + 2]) for n in range(3)]
+        values = {path: n for n, path in enumerate(self.paths)}
+        self.scanner = ShardedScanner({**CONN_CFG, "SHARD_COUNT": 3}, interlocks, run_freq=20,
+                                      client_factory=partial(make_client, values), health_timeout=5)
+
+    def tearDown(self):
+        self.scanner.stop()
+
+    def poll_until(self, condition, timeout=15):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out waiting for shards")
+            self.scanner.poll(timeout=0.1)
+            self.scanner.check_health()
+
+    def test_results_merged_from_every_shard(self):
+        self.scanner.start()
+        self.poll_until(lambda: len(self.scanner.snapshot) == len(self.paths))
+        self.assertEqual({path: dp.value for path, dp in self.scanner.snapshot.items()},
+                         {path: n for n, path in enumerate(self.paths)})
+        self.assertTrue(all(isinstance(dp, DataPoint) for dp in self.scanner.snapshot.values()))
+        self.assertEqual(len({health['pid'] for health in self.scanner.health().values()}), 3)
+
+    def test_dead_worker_restarted(self):
+        self.scanner.start()
+        self.poll_until(lambda: len(self.scanner.snapshot) == len(self.paths))
+        victim = self.scanner.shards[0]
+        victim_paths = {indication.path for il in victim.interlocks for indication in il.all_indications()}
+        os.kill(victim.process.pid, signal.SIGKILL)
+        victim.process.join(timeout=5)
+        self.scanner.snapshot.clear()
+        self.poll_until(lambda: victim.restarts == 1 and set(self.scanner.snapshot) >= victim_paths)
+        self.assertTrue(self.scanner.health()[victim.name]['alive'])
+
+
+if __name__ == '__main__':
+    unittest.main()
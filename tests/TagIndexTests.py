@@ -0,0 +1,34 @@
+import unittest
+
+from interlock import Component, Indication, Interlock
+from tag_index import TagIndex
+
+
+def make_interlock(name, paths, rank=0):
+    indications = [Indication(rank, path, '', 'initiator', False, True) for path in paths]
+    return Interlock(name, [Component(f"{name}-comp", indications)], '')
+
+
+class TagIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.first = make_interlock('IL-1', ['SHARED/PV.CV', 'A/PV.CV'])
+        self.second = make_interlock('IL-2', ['SHARED/PV.CV', 'B/PV.CV'], rank=1)
+        self.index = TagIndex([self.first, self.second])
+
+    def test_unique_paths(self):
+        self.assertEqual(self.index.paths, ['SHARED/PV.CV', 'A/PV.CV', 'B/PV.CV'])
+        self.assertEqual(len(self.index.subscribers['SHARED/PV.CV']), 2)
+
+    def test_shared_path_scanned_at_fastest_period(self):
+        self.assertEqual(self.index.paths_by_period({0: 250}, default_period=1000),
+                         {250: ['SHARED/PV.CV', 'A/PV.CV'], 1000: ['B/PV.CV']})
+
+    def test_fan_out_to_all_subscribers(self):
+        fanned = [(interlock.name, indication.path, dp) for interlock, indication, dp in
+                  self.index.fan_out({'SHARED/PV.CV': 'dp'})]
+        self.assertEqual(fanned, [('IL-1', 'SHARED/PV.CV', 'dp'), ('IL-2', 'SHARED/PV.CV', 'dp')])
+
+    def test_remove_interlock(self):
+        self.index.remove_interlock(self.second)
+        self.assertEqual(self.index.paths, ['SHARED/PV.CV', 'A/PV.CV'])
+        self.assertEqual(len(self.index.subscribers['SHARED/PV.CV']), 1)
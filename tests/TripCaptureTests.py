@@ -0,0 +1,100 @@
+import unittest
+
+from fake_opc import FakeOPCClient
+from interlock import Component, Indication, Interlock
+from opc_scanner import OPCScanner
+from tests.helpers import CONN_CFG, START, server_time
+from trip_capture import ARMED, COMPLETE, TRIGGERED, TripCapture, capture_trip
+
+
+class TripCaptureTests(unittest.TestCase):
+    def setUp(self):
+        self.interlock = Interlock('IL-1', [
+            Component('PSHH-1', [Indication(0, 'PSHH-1/PV_D.CV', '', 'initiator', 0, 1)]),
+            Component('XV-1', [Indication(0, 'XV-1/ZSC.CV', '', 'final_element', False, True)]),
+            Component('XV-2', [Indication(0, 'XV-2/ZSC.CV', '', 'final_element', False, True)]),
+        ], 'High pressure')
+        self.client = FakeOPCClient()
+        self.set('PSHH-1/PV_D.CV', 0, 0)
+        self.set('XV-1/ZSC.CV', False, 0)
+        self.set('XV-2/ZSC.CV', False, 0)
+        self.opc = OPCScanner(CONN_CFG, client=self.client)
+        self.opc.connect()
+        self.now = 0.0
+        self.capture = TripCapture(self.interlock, post_trigger_timeout=5, clock=lambda: self.now)
+        self.opc.register_group('ilock', self.capture.paths)
+
+    def tearDown(self):
+        self.capture.close()
+
+    def set(self, path, value, seconds):
+        self.client.set_value(path, value, timestamp=server_time(seconds))
+
+    def scan(self):
+        return self.capture.observe(self.opc.read_group('ilock'))
+
+    def test_sequence_of_events(self):
+        self.assertEqual(self.scan(), ARMED)
+        self.set('PSHH-1/PV_D.CV', 1, 10)
+        self.set('XV-2/ZSC.CV', True, 10.4)  # Both change within one normal scan period
+        self.assertEqual(self.scan(), TRIGGERED)
+        self.assertEqual(self.capture.scan_period, 50)
+        self.set('XV-1/ZSC.CV', True, 11.25)
+        self.assertEqual(self.scan(), COMPLETE)
+
+        report = self.capture.report
+        self.assertTrue(report.complete)
+        self.assertEqual([(e.indication.path, round(e.elapsed, 3), e.state) for e in report.events], [
+            ('PSHH-1/PV_D.CV', -10.0, 'pre'), ('XV-1/ZSC.CV', -10.0, 'pre'), ('XV-2/ZSC.CV', -10.0, 'pre'),
+            ('PSHH-1/PV_D.CV', 0.0, 'post'), ('XV-2/ZSC.CV', 0.4, 'post'), ('XV-1/ZSC.CV', 1.25, 'post'),
+        ])
+        self.assertEqual([(c.name, round(elapsed, 3)) for c, _, elapsed in report.final_elements],
+                         [('XV-1', 1.25), ('XV-2', 0.4)])
+        self.assertIn('XV-1/ZSC.CV: reached tripped state after 1.250 s', report.to_text())
+
+    def test_timeout_reports_incomplete(self):
+        self.set('PSHH-1/PV_D.CV', 1, 10)
+        self.assertEqual(self.scan(), TRIGGERED)
+        self.now = 6
+        self.assertEqual(self.scan(), COMPLETE)
+        self.assertFalse(self.capture.report.complete)
+        self.assertIn('XV-1/ZSC.CV: DID NOT reach tripped state', self.capture.report.to_text())
+
+    def test_string_values(self):
+        interlock = Interlock('IL-2', [
+            Component('PSHH-2', [Indication(0, 'PSHH-2/STATE.CV', '', 'initiator', 'NORMAL', 'HIGH')]),
+            Component('XV-3', [Indication(0, 'XV-3/STATE.CV', '', 'final_element', 'OPEN', 'CLOSED')]),
+        ], 'High pressure')
+        self.set('PSHH-2/STATE.CV', 'NORMAL', 0)
+        self.set('XV-3/STATE.CV', 'OPEN', 0)
+        capture = TripCapture(interlock, post_trigger_timeout=5, clock=lambda: self.now)
+        self.addCleanup(capture.close)
+        self.opc.register_group('strings', capture.paths)
+        self.assertEqual(capture.observe(self.opc.read_group('strings')), ARMED)
+        self.set('PSHH-2/STATE.CV', 'HIGH', 10)
+        self.assertEqual(capture.observe(self.opc.read_group('strings')), TRIGGERED)
+        self.set('XV-3/STATE.CV', 'CLOSED', 12)
+        self.assertEqual(capture.observe(self.opc.read_group('strings')), COMPLETE)
+
+        report = capture.report
+        self.assertTrue(report.complete)
+        self.assertEqual(report.trigger_time, START.timestamp() + 10)
+        self.assertEqual([(e.value, e.state) for e in report.events],
+                         [('NORMAL', 'pre'), ('OPEN', 'pre'), ('HIGH', 'post'), ('CLOSED', 'post')])
+        self.assertIn('XV-3/STATE.CV: reached tripped state after 2.000 s', report.to_text())
+
+    def test_capture_trip_bursts_after_trigger(self):
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                self.set('PSHH-1/PV_D.CV', 1, 10)
+            elif len(sleeps) == 3:
+                self.set('XV-1/ZSC.CV', True, 10.5)
+                self.set('XV-2/ZSC.CV', True, 10.6)
+
+        report = capture_trip(self.opc, self.capture, scan_period=250, sleep=sleep)
+        self.assertEqual(sleeps, [0.25, 0.25, 0.05])
+        self.assertTrue(report.complete)
+        self.assertNotIn('trip capture IL-1', self.opc.groups)
@@ -0,0 +1,24 @@
+"""Connection configuration and DataPoint construction shared by the test modules"""
+from datetime import datetime, timezone
+
+from opc_scanner import DataPoint
+from scan_capture import format_server_time
+
+CONN_CFG = {
+    "OPC_HOST": "fake-host",
+    "LANDMARK_PATH": "LANDMARK/PV.CV",
+    "EXPECTED_LANDMARK_VAL": 42,
+    "HEARTBEAT_PATH": "HEARTBEAT/PV.CV",
+}
+FAILOVER_CONN_CFG = dict(CONN_CFG, OPC_HOST_ALT="fake-host-alt")  # With a standby host, for ConnectionManager
+START = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def server_time(seconds=0):
+    """Server timestamp, formatted as OpenOPC does, of seconds after START"""
+    return format_server_time(START.timestamp() + seconds)
+
+
+def make_dp(path, value, seconds=0, quality='Good', timestamp=None):
+    """A VT_BOOL DataPoint read seconds after START, or at the given server timestamp string"""
+    return DataPoint(path, 'VT_BOOL', value, quality, server_time(seconds) if timestamp is None else timestamp, 0, 1)
@@ -0,0 +1,181 @@
+"""
+Trip capture: watch an interlock until it trips, then record and report the sequence of events.
+
+While armed, every indication's changes are kept in a small ring buffer, so the moments before a trip are available once
+it happens. When any initiating indication leaves its expected_val_pre the capture triggers, and scanning switches to a
+fast burst period until every final element reaches its expected_val_post (or a timeout passes). The report then lists
+every change in time order by server timestamp, with elapsed times measured from the first initiator to change.
+"""
+from datetime import datetime
+import time
+
+from history_store import HistoryStore
+from opc_scanner import DataPoint
+
+ARMED, TRIGGERED, COMPLETE = 'armed', 'triggered', 'complete'
+
+
+class SequenceEvent:
+    __slots__ = ('time', 'component', 'indication', 'value', 'state', 'elapsed')
+
+    def __init__(self, time, component, indication, value, state, elapsed):
+        self.time = time  # Server timestamp, seconds since epoch
+        self.component = component
+        self.indication = indication
+        self.value = value
+        self.state = state  # 'pre', 'post' or 'other', comparing value against the indication's expected values
+        self.elapsed = elapsed  # Seconds since the first initiator changed; negative for changes leading up to it
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.time!r}, {self.component.name!r}, {self.indication.path!r}, " \
+               f"{self.value!r}, {self.state!r}, {self.elapsed!r})"
+
+
+def format_time(epoch):
+    """Server time in DataPoint's display zone, to the millisecond"""
+    return datetime.fromtimestamp(epoch, DataPoint.tz).replace(tzinfo=None).isoformat(sep=' ', timespec='milliseconds')
+
+
+class TripReport:
+    """Sequence of events for one trip, and how long each final element took to reach its tripped state"""
+
+    def __init__(self, interlock, trigger_time, events, final_elements, complete):
+        self.interlock = interlock
+        self.trigger_time = trigger_time  # Server time at which the first initiator changed
+        self.events = events  # [SequenceEvent], in time order
+        self.final_elements = final_elements  # [(component, indication, elapsed seconds, or None if never reached)]
+        self.complete = complete  # False if the capture timed out before every final element reached post
+
+    def to_text(self):
+        lines = [
+            f"Trip report: {self.interlock.name} ({self.interlock.desc})",
+            f"Triggered at {format_time(self.trigger_time)}"
+            + ('' if self.complete else " - TIMED OUT before all final elements reached their tripped state"),
+            '',
+            f"{'Server time':<24} {'Elapsed (s)':>11}  {'Component':<16} {'Role':<14} {'Path':<32} {'Value':<8} State",
+        ]
+        for event in self.events:
+            lines.append(
+                f"{format_time(event.time):<24} {event.elapsed:>11.3f}  {event.component.name:<16} "
+                f"{event.indication.role:<14} {event.indication.path:<32} {str(event.value):<8} {event.state}"
+            )
+        lines += ['', "Final elements:"]
+        for component, indication, elapsed in self.final_elements:
+            if elapsed is None:
+                outcome = "DID NOT reach tripped state"
+            else:
+                outcome = f"reached tripped state after {elapsed:.3f} s"
+            lines.append(f"  {component.name} {indication.path}: {outcome}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, fname):
+        with open(fname, 'w') as f:
+            f.write(self.to_text())
+
+
+class TripCapture:
+    """
+    Feed each scan of an interlock's paths to observe(). pre_trigger_samples changes are kept per indication while
+    armed, and changes from up to pre_trigger_seconds before the trigger are included in the report. After triggering,
+    the capture completes once all final elements are at expected_val_post, or after post_trigger_timeout seconds.
+    """
+
+    def __init__(self, interlock, pre_trigger_samples=64, post_trigger_samples=192, pre_trigger_seconds=10.0,
+                 post_trigger_timeout=30.0, burst_period=50, clock=time.monotonic):
+        self.interlock = interlock
+        self.pre_trigger_seconds = pre_trigger_seconds
+        self.post_trigger_timeout = post_trigger_timeout
+        self.burst_period = burst_period  # Scan period (ms) to use once triggered
+        self.clock = clock
+        self.members = [(comp, indication) for comp in interlock.components for indication in comp.indications]
+        self.initiators = [(c, i) for c, i in self.members if i.role in ('initiator', 'both')]
+        self.final_elements = [(c, i) for c, i in self.members if i.role in ('final_element', 'both')]
+        self.paths = list(dict.fromkeys(indication.path for _, indication in self.members))
+        self.history = HistoryStore(capacity=pre_trigger_samples + post_trigger_samples, max_paths=len(self.paths))
+        self.state = ARMED
+        self.trigger_time = None
+        self.report = None
+        self._triggered_at = None  # self.clock() at the trigger, for the timeout
+
+    def observe(self, datapoints):
+        """Record one scan (a mapping of path to DataPoint or error), returning the capture's state afterwards"""
+        if self.state == COMPLETE:
+            return self.state
+        for path in self.paths:
+            if path in datapoints:
+                self.history.record(path, datapoints[path])
+
+        if self.state == ARMED:
+            tripped = [
+                datapoints[indication.path].utc_timestamp for _, indication in self.initiators
+                if isinstance(datapoints.get(indication.path), DataPoint)
+                and datapoints[indication.path].value != indication.expected_val_pre
+            ]
+            if tripped:
+                self.state, self.trigger_time, self._triggered_at = TRIGGERED, min(tripped), self.clock()
+
+        if self.state == TRIGGERED:
+            finished = all(
+                self.history.latest(indication.path) is not None
+                and self.history.latest(indication.path).quality == 'Good'
+                and self.history.latest(indication.path).value == indication.expected_val_post
+                for _, indication in self.final_elements
+            )
+            if finished or self.clock() - self._triggered_at >= self.post_trigger_timeout:
+                self.state = COMPLETE
+                self.report = self.build_report(complete=finished)
+        return self.state
+
+    @property
+    def scan_period(self):
+        """Burst period once triggered, else None to leave the scan rate alone"""
+        return self.burst_period if self.state == TRIGGERED else None
+
+    def build_report(self, complete=True):
+        window_start = self.trigger_time - self.pre_trigger_seconds
+        changes = {path: self.history.changes(path, window_start) for path in self.paths}
+
+        # Elapsed times are measured from the earliest initiator change into the trip, within the window
+        initiator_times = [
+            sample.time for _, indication in self.initiators for sample in changes[indication.path]
+            if sample.value != indication.expected_val_pre
+        ]
+        start = min(initiator_times, default=self.trigger_time)
+
+        events = []
+        for component, indication in self.members:
+            for sample in changes[indication.path]:
+                state = 'pre' if sample.value == indication.expected_val_pre else \
+                    'post' if sample.value == indication.expected_val_post else 'other'
+                events.append(SequenceEvent(sample.time, component, indication, sample.value, state,
+                                            sample.time - start))
+        events.sort(key=lambda event: (event.time, event.indication.rank))
+
+        final_elements = []
+        for component, indication in self.final_elements:
+            reached = [event.elapsed for event in events
+                       if event.indication is indication and event.state == 'post' and event.elapsed >= 0]
+            final_elements.append((component, indication, reached[0] if reached else None))
+        return TripReport(self.interlock, start, events, final_elements, complete)
+
+    def close(self):
+        self.history.close()
+
+
+def capture_trip(opc, capture, scan_period=250, sleep=time.sleep):
+    """
+    Scan the capture's paths through a dedicated group of opc (a connected OPCScanner) every scan_period ms, switching
+    to the burst period once triggered, until the capture completes. Returns the TripReport.
+    """
+    group = f"trip capture {capture.interlock.name}"
+    opc.register_group(group, capture.paths, update_rate=capture.burst_period)
+    try:
+        while capture.state != COMPLETE:
+            started = capture.clock()
+            capture.observe(opc.read_group(group))
+            period = (capture.scan_period or scan_period) / 1000
+            if capture.state != COMPLETE:
+                sleep(max(0.0, period - (capture.clock() - started)))
+    finally:
+        opc.unregister_group(group)
+    return capture.report